@@ -123,12 +123,21 @@ class Camera:
                     self.moveAmplitude * (1 / self.current_scale)
             )
             self.speed += friction
+            if (
+                self.accelerateCommander.is_zero()
+                and self.speed.magnitude() * self.current_scale < 0.05
+            ):
+                # 在屏幕上每帧移动不到0.05像素，已经看不出来了，直接停下，不然摩擦力要很久才能让它真正停下
+                self.speed = NumberVector.zero()
 
             self.location += self.speed
 
             # 让 current_scale 逐渐靠近 target_scale
             if self.is_scale_animation_open:
                 self.current_scale += (self.target_scale - self.current_scale) / 10
+                # 已经非常接近时直接对齐，否则要很久才能真正停下来，缩放比例每一帧都在微小地变化
+                if abs(self.target_scale - self.current_scale) <= self.target_scale * 1e-4:
+                    self.current_scale = self.target_scale
 
             # 彩蛋，《微观尽头》——刘慈欣
 
@@ -142,6 +151,21 @@ class Camera:
             traceback.print_exc()
             print(e)
 
+    @property
+    def is_animating(self) -> bool:
+        """
+        相机是否还在运动：还有速度、正按着移动键、或者缩放动画还没结束
+        不在运动时画面不会因为相机而变化，不需要重绘
+        """
+        return (
+            not self.speed.is_zero()
+            or not self.accelerateCommander.is_zero()
+            or (
+                self.is_scale_animation_open
+                and self.current_scale != self.target_scale
+            )
+        )
+
     @property
     def cover_world_rectangle(self) -> Rectangle:
         """
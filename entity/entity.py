@@ -25,6 +25,7 @@ class Entity(Paintable, metaclass=ABCMeta):
         :return:
         """
         self.body_shape.location_left_top += d_location
+        self._on_body_shape_changed()
 
     def move_to(self, location: NumberVector):
         """
@@ -33,6 +34,24 @@ class Entity(Paintable, metaclass=ABCMeta):
         :return:
         """
         self.body_shape.location_left_top = location
+        self._on_body_shape_changed()
+
+    def _translate(self, d_location: NumberVector):
+        """
+        所在的整个子树一起平移时使用，只移动本体，不通知任何人，
+        由发起平移的文件夹负责维护受影响的缓存
+        :param d_location:
+        :return:
+        """
+        self.body_shape.location_left_top = (
+            self.body_shape.location_left_top + d_location
+        )
+
+    def _on_body_shape_changed(self):
+        """
+        本体的位置或大小变化之后调用，子类据此让依赖于位置的缓存失效
+        :return:
+        """
 
     def collide_with(self, other: "Entity"):
         # 如果发生了碰撞，则计算两个矩形的几何中心，被撞的矩形按照几何中心连线，根据这个连线继续判断
@@ -17,6 +17,10 @@ class EntityFile(Entity):
     文件矩形
     """
 
+    # 矩形比这还小时放不下名字，就不写名字了（按文件大小排列时会有很小的文件）
+    NAME_MIN_WIDTH = 24
+    NAME_MIN_HEIGHT = 30
+
     def __init__(
         self, location_left_top: NumberVector, full_path: str, parent: "EntityFolder"  # type: ignore
     ):
@@ -39,6 +43,8 @@ class EntityFile(Entity):
         self.file_name = file_name
 
         self.parent = parent  # parent是EntityFolder 但会循环引入，这里就没有写类型
+        # 文件大小（字节），只有扫描时顺带拿到了stat结果才有值
+        self.file_size: int | None = None
         pass
 
     def move(self, d_location: NumberVector):
@@ -76,15 +82,29 @@ class EntityFile(Entity):
             raise ValueError("读取的文件名不匹配", data["name"], self.file_name)
 
         self.body_shape.read_data(data["bodyShape"])
+        self._on_body_shape_changed()
+
+    def _on_body_shape_changed(self):
+        if self.parent is not None:
+            self.parent.on_child_shape_changed(self)
 
     def __repr__(self):
         return f"({self.file_name})"
 
+    @property
+    def name(self) -> str:
+        return self.file_name
+
     def get_components(self) -> List[Paintable]:
         return []
 
     def paint(self, context: PaintContext) -> None:
         context.painter.paint_rect(self.body_shape)
+        if (
+            self.body_shape.width < self.NAME_MIN_WIDTH
+            or self.body_shape.height < self.NAME_MIN_HEIGHT
+        ):
+            return
         context.painter.paint_text(
             Text(self.body_shape.location_left_top + NumberVector(5, 5), self.file_name)
         )
@@ -1,3 +1,6 @@
+import math
+import os
+from concurrent.futures import Executor
 from typing import List, Optional, Any
 
 from data_struct.number_vector import NumberVector
@@ -6,19 +9,24 @@ from data_struct.text import Text
 from entity.entity import Entity
 from entity.entity_file import EntityFile
 from exclude_manager import EXCLUDE_MANAGER
+from paint.folder_paint_cache import FolderPaintCache
 from paint.paintables import PaintContext, Paintable
-from tools.gitignore_parser import parse_gitignore
-from tools.rectangle_packing import (
-    sort_rectangle_all_files,
-    sort_rectangle_greedy,
-    sort_rectangle_many_files_less_folders,
+from tools.cancel_token import CancelToken, raise_if_cancelled
+from tools.dir_scanner import DirListing, scan_dir
+from tools.free_space import FreeSpace
+from tools.gitignore_parser import (
+    CompiledGitignore,
+    is_ignored_by_stack,
+    parse_gitignore,
 )
-from tools.string_tools import get_width_by_file_name
-
-# 提高递归深度限制
-import sys
-
-sys.setrecursionlimit(10_0000)
+from tools.layout_memo import LAYOUT_MEMO, pack_locations
+from tools.open_progress import OpenProgress
+from tools.parallel_layout import layout_flat_tree
+from tools.scan_cache import ScanCache
+from tools.spatial_index import Box, SpatialIndex
+from tools.string_tools import format_file_size, get_width_by_file_name
+from tools.tree_walk import iter_postorder, iter_preorder, max_depth
+from tools.treemap import squarify
 
 
 class EntityFolder(Entity):
@@ -27,6 +35,17 @@ class EntityFolder(Entity):
     """
 
     PADDING = 50
+    # 第一层子项少于这个数量时直接逐个判断，比查询空间索引更快
+    SPATIAL_INDEX_MIN_CHILDREN = 32
+    # 查询空间索引时区域向外扩大的余量，兜住整体平移累计的浮点误差，最终结果仍以精确判断为准
+    SPATIAL_INDEX_TOLERANCE = 1e-3
+    # 按文件大小排列时，整棵树平均每个实体分到的面积，决定了根文件夹有多大
+    TREEMAP_AREA_PER_ENTITY = 400 * 400
+    # 按文件大小排列时，文件夹很小的话内边距也跟着缩小，不超过边长的这个比例
+    TREEMAP_PADDING_RATIO = 0.1
+    # 增量重新排列时，第一层新增（或者变大后需要挪位置）的子项超过这个数量，就直接重新排列整个第一层，
+    # 一次放太多个时，逐个塞进空位或者摆在外面反而不如整体重新排列紧凑
+    INCREMENTAL_MAX_PLACED_CHILDREN = 64
 
     # 通用排除的文件夹
     exclusion_list = [
@@ -51,24 +70,86 @@ class EntityFolder(Entity):
         # 属性节点关系
         self.parent: Optional["EntityFolder"] = None
         self.children: "list[EntityFolder | EntityFile]" = []
+        # 子节点名字 -> 子节点，和 children 保持同步，只能通过 add_child 等方法修改
+        self._children_by_name: "dict[str, EntityFolder | EntityFile]" = {}
 
         # 是否隐藏内部内容，用于观看宏观的时候防止绘制太多细节而卡顿
         self.is_hide_inner = False
 
+        # 按需扫描时，超出扫描深度的文件夹先不列出内容，等到需要显示内部时再在后台扫描
+        self.is_lazy_pending = False
+
+        # 内部所有文件的总大小（字节），只有按文件大小排列过才有值，有值时显示在名字后面
+        self.total_size: int | None = None
+        # 按文件大小排列时切分面积用的权重，只有按文件大小排列过才有值（见 adjust_tree_treemap）
+        self.treemap_weight: int | None = None
+
+        # 上一次列出目录时目录自身的修改时间和inode，用于增量更新时判断是否需要重新列出
+        self.dir_mtime_ns: int | None = None
+        self.dir_inode: int | None = None
+
+        # 对子项生效的.gitignore规则栈，由外层到内层，是父文件夹的规则栈再加上自己的.gitignore
+        self.gitignore_stack: tuple[CompiledGitignore, ...] = ()
+        # 规则栈中每个.gitignore的 (路径, 修改时间)，用于判断规则有没有变化
+        self.gitignore_signature: tuple[tuple[str, int], ...] = ()
+        # 没有挂在树上、单独扫描（比如按需扫描在后台扫描）时，代替父文件夹提供要继承的规则栈和签名
+        self._detached_inherited_gitignore: (
+            tuple[tuple[CompiledGitignore, ...], tuple[tuple[str, int], ...]] | None
+        ) = None
+        # 上一次列出目录时继承到的父文件夹的规则栈签名
+        self._inherited_gitignore_signature: tuple[tuple[str, int], ...] = ()
+        # 自己目录下的.gitignore的解析结果和修改时间，文件没有变化就不再重新解析
+        self._local_gitignore: CompiledGitignore | None = None
+        self._local_gitignore_mtime_ns: int | None = None
+
+        # 第一层子项的空间索引和建索引时的子项列表，索引中的下标对应这个列表
+        # 子项增删、移动、大小变化时置为None，下次查询时重建；整个文件夹平移时只平移索引
+        self._spatial_index: (
+            tuple[SpatialIndex, "list[EntityFolder | EntityFile]"] | None
+        ) = None
+        # 第一层的绘制缓存，由负责绘制的样式录制，和空间索引同时失效、同时平移
+        self.paint_cache: FolderPaintCache | None = None
+
+        # 第一层的空位，增量重新排列时新增的子项放在这里，第一层整体重新排列时作废，需要时再建
+        self._free_space: FreeSpace | None = None
+        # 重新列出目录时第一层有增删，需要增量重新排列（见 relayout_dirty_folders）
+        self.is_layout_dirty = False
+        # 重新列出目录时新增的、还没有放到合适位置的第一层子项
+        self._unplaced_children: "list[EntityFolder | EntityFile]" = []
+        # 内容被整体替换（比如懒加载接上了内容）、在原处变大的第一层子文件夹，
+        # 增量重新排列时和兄弟节点挤在一起的才挪走
+        self._resized_children: "list[EntityFolder]" = []
+        # 更深的地方有需要增量重新排列的文件夹，增量重新排列时只沿着这些文件夹往下找
+        self._has_dirty_descendant = False
+
         # 这个矩形有点麻烦，它可能应该是一个动态变化的东西，不应该变的是它的左上角位置，变得是他的大小
         self.adjust()
 
     def output_data(self) -> dict[str, Any]:
         """
-        递归的输出数据，最终返回一个字典
+        输出整棵树的数据，最终返回一个字典
         :return:
         """
-        return {
-            "kind": "directory",
-            "name": self.folder_name,
-            "bodyShape": self.body_shape.output_data(),
-            "children": [child.output_data() for child in self.children],
-        }
+        result: dict[str, Any] = {}
+        # 文件夹 -> 它输出的数据里的 children 列表
+        children_data_of: dict[EntityFolder, list] = {}
+        for entity in iter_preorder(self, get_entity_children):
+            if isinstance(entity, EntityFolder):
+                data = {
+                    "kind": "directory",
+                    "name": entity.folder_name,
+                    "bodyShape": entity.body_shape.output_data(),
+                    "children": [],
+                }
+                children_data_of[entity] = data["children"]
+            else:
+                data = entity.output_data()
+            if entity is self:
+                result = data
+            else:
+                # 先序遍历，父文件夹一定已经输出过了
+                children_data_of[entity.parent].append(data)
+        return result
 
     def read_data(self, data: dict[str, Any]):
         """
@@ -76,44 +157,44 @@ class EntityFolder(Entity):
         :param data:
         :return:
         """
-        if data["kind"] != "directory":
-            raise ValueError("kind should be directory")
-        if data["name"] != self.folder_name:
-            raise ValueError("读取的文件名不匹配", data["name"], self.folder_name)
-        # 可以是先序遍历
-        # 先更新内容
-        self.body_shape.read_data(data["bodyShape"])
-        # ===
-        for child in self.children:
-            if isinstance(child, EntityFolder):
-                for data_child in data["children"]:
-                    if child.folder_name == data_child["name"]:
+        stack: list[tuple[EntityFolder, dict[str, Any]]] = [(self, data)]
+        while stack:
+            folder, folder_data = stack.pop()
+            if folder_data["kind"] != "directory":
+                raise ValueError("kind should be directory")
+            if folder_data["name"] != folder.folder_name:
+                raise ValueError(
+                    "读取的文件名不匹配", folder_data["name"], folder.folder_name
+                )
+            # 可以是先序遍历
+            # 先更新内容
+            folder.body_shape.read_data(folder_data["bodyShape"])
+            folder._on_body_shape_changed()
+            # ===
+            # 先按名字建好索引，避免每个子节点都把布局数据扫一遍
+            data_children = {
+                data_child["name"]: data_child for data_child in folder_data["children"]
+            }
+            for child in folder.children:
+                data_child = data_children.get(child.name)
+                if data_child is not None and data_child["kind"] == (
+                        "directory" if isinstance(child, EntityFolder) else "file"
+                ):
+                    if isinstance(child, EntityFolder):
+                        stack.append((child, data_child))
+                    else:
                         child.read_data(data_child)
-                        break
                 else:
                     # 没找到，说明有布局文件缺失，或者文件是新增的。
                     # 将这个对齐到当前的左上角
-                    child.move_to(self.body_shape.location_left_top)
-                    pass
-            elif isinstance(child, EntityFile):
-                for data_child in data["children"]:
-                    if child.file_name == data_child["name"]:
-                        child.read_data(data_child)
-                        break
-                else:
-                    child.move_to(self.body_shape.location_left_top)
-                    pass
-
-        pass
+                    child.move_to(folder.body_shape.location_left_top)
 
     def move(self, d_location: NumberVector):
         # 不仅，要让文件夹这个框框本身移动
         super().move(d_location)
         # 还要，移动文件夹内所有实体也移动
-        for child in self.children:
-            # 移动自己内部所有实体的时候，也不能用move函数本身，会炸开花。
-            # child.move(d_location)
-            child.move_to(child.body_shape.location_left_top + d_location)
+        # 移动自己内部所有实体的时候，也不能用move函数本身，会炸开花。
+        self._translate_inner(d_location)
 
         # 推移其他同层的矩形框
         if not self.parent:
@@ -136,130 +217,571 @@ class EntityFolder(Entity):
         :param location_left_top:
         :return:
         """
-        # 移动文件夹内所有实体
-        for child in self.children:
-            relative_location = (
-                    child.body_shape.location_left_top - self.body_shape.location_left_top
-            )
-            # 这本身实际上是一个递归函数了
-            child.move_to(location_left_top + relative_location)
+        # 移动文件夹内所有层级的实体，相对位置保持不变
+        self._translate_inner(location_left_top - self.body_shape.location_left_top)
         # 移动文件夹本身
         super().move_to(location_left_top)
 
+    def _translate_inner(self, d_location: NumberVector):
+        """
+        内部所有层级的实体整体平移，相对位置保持不变，所以各层的空间索引和绘制缓存也只需要平移
+        :param d_location:
+        :return:
+        """
+        for entity in iter_preorder(self, get_entity_children):
+            if entity is not self:
+                entity._translate(d_location)
+        self._translate_children_caches(d_location)
+
+    def _translate(self, d_location: NumberVector):
+        super()._translate(d_location)
+        self._translate_children_caches(d_location)
+
+    def _translate_children_caches(self, d_location: NumberVector):
+        spatial_index = self._spatial_index
+        if spatial_index is not None:
+            spatial_index[0].translate(d_location.x, d_location.y)
+        paint_cache = self.paint_cache
+        if paint_cache is not None:
+            paint_cache.translate(d_location.x, d_location.y)
+        free_space = self._free_space
+        if free_space is not None:
+            free_space.translate(d_location.x, d_location.y)
+
+    def _on_body_shape_changed(self):
+        if self.parent is not None:
+            self.parent.on_child_shape_changed(self)
+
+    def invalidate_children_caches(self):
+        """
+        第一层整体变化（比如重新排列、整体替换）时调用，空间索引、绘制缓存和空位都作废，下次用到时重建
+        :return:
+        """
+        self._spatial_index = None
+        self.paint_cache = None
+        self._free_space = None
+
+    def on_child_shape_changed(self, child: "EntityFolder | EntityFile"):
+        """
+        第一层的某个子项移动了或者大小变化了，空间索引和绘制缓存作废，它现在占的地方不再是空位
+        :param child:
+        :return:
+        """
+        self._spatial_index = None
+        self.paint_cache = None
+        # 还没放好的新增子项只是临时放在某处，等放进空位时才真正占住地方
+        if self._free_space is not None and child not in self._unplaced_children:
+            self._free_space.occupy(_get_box(child))
+
+    def get_children_in_rectangle(
+            self, rectangle: Rectangle
+    ) -> "list[EntityFolder | EntityFile]":
+        """
+        获取第一层中和矩形区域相交的子项，保持在 children 中的先后顺序
+        :param rectangle: 世界坐标中的矩形区域
+        :return:
+        """
+        return [
+            child
+            for child in self._get_children_candidates(
+                rectangle.left(), rectangle.top(), rectangle.right(), rectangle.bottom()
+            )
+            if child.body_shape.is_collision(rectangle)
+        ]
+
+    def get_children_at_location(
+            self, location: NumberVector
+    ) -> "list[EntityFolder | EntityFile]":
+        """
+        获取第一层中包含某个点的子项（点在边上也算），保持在 children 中的先后顺序
+        :param location: 世界坐标中的点
+        :return:
+        """
+        return [
+            child
+            for child in self._get_children_candidates(
+                location.x, location.y, location.x, location.y
+            )
+            if child.body_shape.is_contain_point(location)
+        ]
+
+    def _get_children_candidates(
+            self, left: float, top: float, right: float, bottom: float
+    ) -> "list[EntityFolder | EntityFile]":
+        """
+        粗筛出第一层中可能和区域相交的子项，保持在 children 中的先后顺序，
+        调用者还需要再精确判断一次
+        """
+        spatial_index = self.get_spatial_index()
+        if spatial_index is None:
+            return self.children
+        index, indexed_children = spatial_index
+        tolerance = self.SPATIAL_INDEX_TOLERANCE
+        return [
+            indexed_children[i]
+            for i in index.query(
+                left - tolerance, top - tolerance, right + tolerance, bottom + tolerance
+            )
+        ]
+
+    def get_spatial_index(
+            self,
+    ) -> "tuple[SpatialIndex, list[EntityFolder | EntityFile]] | None":
+        """
+        获取第一层子项的空间索引，需要时重建
+        只要第一层有任何变化，得到的就是一个新的对象，所以调用者可以用它判断之前的查询结果是否还有效
+        :return: (索引, 索引中的下标对应的子项列表)，子项太少不值得建索引时为None
+        """
+        if len(self.children) < self.SPATIAL_INDEX_MIN_CHILDREN:
+            return None
+        spatial_index = self._spatial_index
+        if spatial_index is None:
+            # 在本地变量上建好再一次性赋值，建索引期间子项列表被整体替换也不会错位
+            children = list(self.children)
+            spatial_index = (
+                SpatialIndex(
+                    [
+                        (
+                            child.body_shape.left(),
+                            child.body_shape.top(),
+                            child.body_shape.right(),
+                            child.body_shape.bottom(),
+                        )
+                        for child in children
+                    ]
+                ),
+                children,
+            )
+            self._spatial_index = spatial_index
+        return spatial_index
+
     def _is_have_child(self, child_name: str):
         """
         判断自身文件夹内部第一层是否含有某个子文件或文件夹
         :param child_name:
         :return:
         """
-        for child in self.children:
-            if isinstance(child, EntityFolder):
-                if child.folder_name == child_name:
-                    return True
-            elif isinstance(child, EntityFile):
-                if child.file_name == child_name:
-                    return True
-            else:
-                raise ValueError("子节点类型错误", child)
-        return False
+        return child_name in self._children_by_name
+
+    def get_child(self, child_name: str) -> "EntityFolder | EntityFile | None":
+        """
+        按名字获取第一层的子节点，没有则返回None
+        :param child_name:
+        :return:
+        """
+        return self._children_by_name.get(child_name)
+
+    def add_child(self, child: "EntityFolder | EntityFile"):
+        """
+        添加一个子节点，同时更新名字索引
+        :param child:
+        :return:
+        """
+        self.children.append(child)
+        self._children_by_name[child.name] = child
+        # 新增的子项之后要么放进空位，要么整个第一层重新排列，所以空位还有效
+        self._spatial_index = None
+        self.paint_cache = None
+
+    def remove_child(self, child: "EntityFolder | EntityFile"):
+        """
+        移除一个子节点，同时更新名字索引
+        :param child:
+        :return:
+        """
+        self.remove_children([child])
+
+    def remove_children(self, removed: "list[EntityFolder | EntityFile]"):
+        """
+        一次移除若干个子节点，同时更新名字索引，它们原来占的地方留作空位
+        :param removed:
+        :return:
+        """
+        removed_set = set(removed)
+        self.children = [child for child in self.children if child not in removed_set]
+        self._spatial_index = None
+        self.paint_cache = None
+        free_space = self._get_free_space()
+        unplaced_set = set(self._unplaced_children)
+        for child in removed:
+            del self._children_by_name[child.name]
+            free_space.release(
+                _get_box(child), self._get_neighbor_boxes(child, unplaced_set)
+            )
+
+    def set_children(self, children: "list[EntityFolder | EntityFile]"):
+        """
+        整体替换子节点列表，同时重建名字索引
+        :param children:
+        :return:
+        """
+        self.children = children
+        self._children_by_name = {child.name: child for child in children}
+        self.invalidate_children_caches()
 
     def count_deep_level(self) -> int:
         """
         计算文件夹的深度
         :return:
         """
-        if not self.children:
-            return 1
-        max_deep_level = 1
-        for child in self.children:
-            if isinstance(child, EntityFolder):
-                deep_level = child.count_deep_level() + 1
-                max_deep_level = max(max_deep_level, deep_level)
-        return max_deep_level
+        return max_depth(self, get_sub_folders)
 
-    def update_tree_content(self):
+    def scan_entries(
+            self,
+            stat: os.stat_result | None = None,
+            scan_cache: ScanCache | None = None,
+            is_size_needed: bool = False,
+    ) -> DirListing:
         """
-        更新文件夹树结构内容，不更新显示位置大小
-        但是是递归的
+        列出自身第一层中没有被排除的子项
+        不会修改树结构，所以可以放在其他线程里并行调用
+        :param stat: 调用者已经拿到的目录自身的stat，没有则在这里获取
+        :param scan_cache: 扫描缓存，目录没有变化时直接用缓存中的结果，列出后也会记录进去
+        :param is_size_needed: 是否需要每个文件的大小，需要时在列目录的同时获取。
+        文件内容变化不会改变目录的修改时间，缓存里的大小可能已经过时，所以这时不查缓存，只记录
+        :return:
+        """
+        inherited_stack, inherited_signature = self._get_inherited_gitignore()
+        try:
+            if stat is None:
+                stat = os.stat(self.full_path)
+            if scan_cache is not None and not is_size_needed:
+                cached = scan_cache.lookup(self.full_path, stat, inherited_signature)
+                if cached is not None:
+                    # 子文件夹还要继承规则栈，所以命中缓存时也要把规则栈准备好
+                    self._update_gitignore_stack(
+                        inherited_stack, inherited_signature, cached.gitignore_mtime_ns
+                    )
+                    return DirListing(stat, cached.entries)
+            # 一次 scandir 就拿到了所有子项的名字和类型，不再对每一项单独 isdir
+            entries = scan_dir(self.full_path, is_size_needed)
+        except (PermissionError, FileNotFoundError, NotADirectoryError):
+            # 权限不足，或者扫描途中被删掉了，跳过
+            # 这里或许未来可以加一种禁止访问的矩形，显示成灰色
+            return DirListing(stat, None)
+
+        # 自己目录下的.gitignore的修改时间，没有则为None
+        gitignore_mtime_ns = None
+        if EXCLUDE_MANAGER.is_local_exclude:
+            # 在遍历之前先看看是否有.gitignore文件，直接从列表里找，省一次exists
+            for entry in entries:
+                if entry.name == ".gitignore" and not entry.is_dir:
+                    try:
+                        gitignore_mtime_ns = os.stat(entry.full_path).st_mtime_ns
+                    except OSError:
+                        pass
+                    break
+        self._update_gitignore_stack(
+            inherited_stack, inherited_signature, gitignore_mtime_ns
+        )
+        gitignore_stack = self.gitignore_stack
+
+        result = []
+        for entry in entries:
+            # 全局排除
+            if EXCLUDE_MANAGER.is_file_in_global_exclude(entry.full_path, entry.is_dir):
+                continue
+            # 局部排除，自己和所有上层的.gitignore，被排除的文件夹不会再向下扫描
+            if gitignore_stack and is_ignored_by_stack(
+                    gitignore_stack, entry.full_path, entry.is_dir
+            ):
+                continue
+            result.append(entry)
+        if scan_cache is not None:
+            scan_cache.store(
+                self.full_path, stat, gitignore_mtime_ns, inherited_signature, result
+            )
+        return DirListing(stat, result)
+
+    def _get_inherited_gitignore(
+            self,
+    ) -> tuple[tuple[CompiledGitignore, ...], tuple[tuple[str, int], ...]]:
+        """
+        获取从父文件夹继承的规则栈和它的签名
+        :return:
+        """
+        if not EXCLUDE_MANAGER.is_local_exclude:
+            return (), ()
+        if self.parent is None:
+            return self._detached_inherited_gitignore or ((), ())
+        return self.parent.gitignore_stack, self.parent.gitignore_signature
+
+    def set_inherited_gitignore(self, parent_folder: "EntityFolder"):
+        """
+        单独扫描一个不在树上的文件夹时，让它继承 parent_folder 的规则栈，但不挂到 parent_folder 上
+        :param parent_folder:
+        :return:
+        """
+        self._detached_inherited_gitignore = (
+            parent_folder.gitignore_stack,
+            parent_folder.gitignore_signature,
+        )
+
+    def _update_gitignore_stack(
+            self,
+            inherited_stack: tuple[CompiledGitignore, ...],
+            inherited_signature: tuple[tuple[str, int], ...],
+            gitignore_mtime_ns: int | None,
+    ):
+        """
+        用继承来的规则栈和自己的.gitignore组成新的规则栈
+        自己的.gitignore只有修改时间变了才会重新解析
+        :param inherited_stack:
+        :param inherited_signature:
+        :param gitignore_mtime_ns: 自己目录下.gitignore的修改时间，没有则为None
+        :return:
+        """
+        self._inherited_gitignore_signature = inherited_signature
+        if gitignore_mtime_ns is None:
+            self._local_gitignore = None
+            self._local_gitignore_mtime_ns = None
+            self.gitignore_stack = inherited_stack
+            self.gitignore_signature = inherited_signature
+            return
+        gitignore_path = f"{self.full_path}/.gitignore"
+        if gitignore_mtime_ns != self._local_gitignore_mtime_ns:
+            try:
+                self._local_gitignore = parse_gitignore(gitignore_path)
+            except UnicodeDecodeError:
+                # 这个不会再发生了，因为已经将这个第三方库放到本地并修改了代码了
+                print(f"文件{gitignore_path}编码错误，跳过")
+                self._local_gitignore = None
+            except OSError:
+                self._local_gitignore = None
+            self._local_gitignore_mtime_ns = gitignore_mtime_ns
+        if self._local_gitignore is None:
+            self.gitignore_stack = inherited_stack
+            self.gitignore_signature = inherited_signature
+        else:
+            self.gitignore_stack = inherited_stack + (self._local_gitignore,)
+            self.gitignore_signature = inherited_signature + (
+                (gitignore_path, gitignore_mtime_ns),
+            )
+
+    def is_gitignore_changed(self) -> bool:
+        """
+        上一次列出目录之后，对自己生效的.gitignore规则是否发生了变化
+        .gitignore 原地修改不会改变目录的修改时间，所以要单独检查
         :return:
         """
+        if self._get_inherited_gitignore()[1] != self._inherited_gitignore_signature:
+            return True
+        if self._local_gitignore_mtime_ns is None:
+            # 新建.gitignore会改变目录的修改时间，不用在这里检查
+            return False
+        try:
+            return (
+                    os.stat(f"{self.full_path}/.gitignore").st_mtime_ns
+                    != self._local_gitignore_mtime_ns
+            )
+        except OSError:
+            return True
 
-        import os
+    def apply_entries(self, listing: DirListing) -> list["EntityFolder"]:
+        """
+        把 scan_entries 的结果合并到自身的子节点中，不递归
+        已经不存在（或者新被排除）的子节点会被移除
+        :param listing:
+        :return: 还需要继续向下扫描的子文件夹（包括新增的和原有的）
+        """
+        entries = listing.entries
+        if entries is None:
+            # 没能列出目录，保持原样
+            return []
+        # 第一次列出时整个文件夹都是新的，由上层负责排列；重新列出时的增删才需要增量重新排列
+        is_relisting = self.dir_mtime_ns is not None
+        if listing.stat is not None:
+            self.dir_mtime_ns = listing.stat.st_mtime_ns
+            self.dir_inode = listing.stat.st_ino
 
         # 如果是一个文件夹，往右放
         # 如果是一个文件，往下放
 
         # 放置点位
         put_location = self.body_shape.location_left_top + NumberVector(0, 100)
-        try:
-            # 输入一个匹配函数，如果匹配则返回True，否则返回False
-            matches_function = lambda _: False
+        sub_folders = []
+        for entry in entries:
+            file_name_sub = entry.name
+            full_path_sub = entry.full_path
 
-            if EXCLUDE_MANAGER.is_local_exclude:
-                # 在遍历之前先看看是否有.gitignore文件
-                gitignore_file_path = os.path.join(
-                    self.full_path, ".gitignore"
-                ).replace("\\", "/")
+            exist_child = self.get_child(file_name_sub)
+            if exist_child is not None and entry.is_dir != isinstance(
+                    exist_child, EntityFolder
+            ):
+                # 文件变成了同名文件夹，或者反过来，当作删除之后再新增
+                self.remove_child(exist_child)
+                exist_child = None
+                if is_relisting:
+                    self.mark_layout_dirty()
 
-                if os.path.exists(gitignore_file_path):
-                    try:
-                        matches_function = parse_gitignore(gitignore_file_path)
-                    except UnicodeDecodeError:
-                        # 这个不会再发生了，因为已经将这个第三方库放到本地并修改了代码了
-                        print(f"文件{gitignore_file_path}编码错误，跳过")
-
-            # 遍历文件夹内所有文件
-            for file_name_sub in os.listdir(self.full_path):
-                full_path_sub = os.path.join(self.full_path, file_name_sub).replace(
-                    "\\", "/"
-                )
-                # 全局排除
-                if EXCLUDE_MANAGER.is_file_in_global_exclude(full_path_sub):
-                    continue
-                # 局部排除
-                if matches_function(full_path_sub):
+            # 开始添加
+            if entry.is_dir:
+                if exist_child is not None:
+                    # 还要继续深入检查这个文件夹内部是否有更新
+                    if isinstance(exist_child, EntityFolder):
+                        # 找到这个原有的子文件夹，交给调用者继续深入
+                        sub_folders.append(exist_child)
+                else:
+                    # 新增了一个文件夹
+                    child_folder = EntityFolder(put_location, full_path_sub)
+                    put_location += NumberVector(500, 0)  # 往右放
+
+                    child_folder.parent = self
+                    child_folder.deep_level = self.deep_level + 1
+
+                    self.add_child(child_folder)
+                    sub_folders.append(child_folder)
+                    if is_relisting:
+                        self._unplaced_children.append(child_folder)
+                        self.mark_layout_dirty()
+            else:
+                if exist_child is not None:
                     continue
+                # 是一个文件
+                child_file = EntityFile(put_location, full_path_sub, self)
+                put_location = NumberVector(0, 120)  # 往下放
 
-                is_have = self._is_have_child(file_name_sub)
-
-                # 开始添加
-                if os.path.isdir(full_path_sub):
-                    if is_have:
-                        # 还要继续深入检查这个文件夹内部是否有更新
-                        for chile in self.children:
-                            if (
-                                    isinstance(chile, EntityFolder)
-                                    and chile.folder_name == file_name_sub
-                            ):
-                                # 找到这个原有的子文件夹并递归下去
-                                chile.update_tree_content()
-                                break
-                    else:
-                        # 新增了一个文件夹
-                        child_folder = EntityFolder(put_location, full_path_sub)
-                        put_location += NumberVector(500, 0)  # 往右放
+                child_file.parent = self
+                child_file.deep_level = self.deep_level + 1
+                # 扫描时已经拿到的stat结果就顺手留下，不再额外请求
+                child_file.file_size = entry.size
 
-                        child_folder.parent = self
-                        child_folder.deep_level = self.deep_level + 1
+                self.add_child(child_file)
+                if is_relisting:
+                    self._unplaced_children.append(child_file)
+                    self.mark_layout_dirty()
 
-                        self.children.append(child_folder)
-                        child_folder.update_tree_content()  # 递归调用
-                else:
-                    if is_have:
-                        continue
-                    # 是一个文件
-                    child_file = EntityFile(put_location, full_path_sub, self)
-                    put_location = NumberVector(0, 120)  # 往下放
-
-                    child_file.parent = self
-                    child_file.deep_level = self.deep_level + 1
-
-                    self.children.append(child_file)
-        except PermissionError:
-            # 权限不足，跳过
-            # 这里或许未来可以加一种禁止访问的矩形，显示成灰色
-            pass
-        pass
+        # 每一项都对应唯一一个子节点，数量对不上说明有子节点已经被删除了
+        if len(self.children) != len(entries):
+            entry_names = {entry.name for entry in entries}
+            self.remove_children(
+                [child for child in self.children if child.name not in entry_names]
+            )
+            if is_relisting:
+                self.mark_layout_dirty()
+        return sub_folders
+
+    def mark_layout_dirty(self):
+        """
+        标记第一层有增删，并让所有上层文件夹知道下面有需要增量重新排列的文件夹
+        :return:
+        """
+        self.is_layout_dirty = True
+        folder = self.parent
+        while folder is not None and not folder._has_dirty_descendant:
+            folder._has_dirty_descendant = True
+            folder = folder.parent
+
+    def mark_child_resized(self, child: "EntityFolder"):
+        """
+        第一层的某个子文件夹在原处变大了，增量重新排列时它和兄弟节点挤在一起才挪走，其余都不动
+        :param child:
+        :return:
+        """
+        self._resized_children.append(child)
+        self.mark_layout_dirty()
+
+    def update_tree_content(self, scan_cache: ScanCache | None = None):
+        """
+        更新文件夹树结构内容，不更新显示位置大小
+        会深入到所有子文件夹
+        需要并行扫描的时候使用 tree_walker.TreeWalker
+        :param scan_cache: 扫描缓存
+        :return:
+        """
+        stack: list[EntityFolder] = [self]
+        while stack:
+            folder = stack.pop()
+            listing = folder.scan_entries(scan_cache=scan_cache)
+            stack.extend(folder.apply_entries(listing))
+
+    def update_self_content(self) -> list["EntityFolder"]:
+        """
+        只重新列出自身第一层，原有的子文件夹不再深入
+        新增的子文件夹会完整扫描，用于已经明确知道是哪个目录发生变化的情况
+        :return: 新增的子文件夹
+        """
+        new_folders = [
+            child_folder
+            for child_folder in self.apply_entries(self.scan_entries())
+            # 从没列出过，是新增的文件夹（按需扫描中还没轮到扫描的不算）
+            if child_folder.dir_mtime_ns is None and not child_folder.is_lazy_pending
+        ]
+        for child_folder in new_folders:
+            child_folder.update_tree_content()
+        return new_folders
+
+    def adopt_content(self, loaded_folder: "EntityFolder"):
+        """
+        把另一个同路径文件夹（在后台单独扫描、排列好的）的内容整体接过来，替换自己的子节点
+        内容保持排列好的样子，整体对齐到自己的左上角，之后自己的大小会变，
+        父文件夹被标记为需要增量重新排列，之后调用 relayout_dirty_folders
+        :param loaded_folder:
+        :return:
+        """
+        offset = (
+                self.body_shape.location_left_top
+                - loaded_folder.body_shape.location_left_top
+        )
+        for child in loaded_folder.children:
+            child.move_to(child.body_shape.location_left_top + offset)
+            child.parent = self
+        self.set_children(loaded_folder.children)
+        loaded_folder.set_children([])
+
+        self.take_listing_state(loaded_folder)
+        self.is_lazy_pending = False
+        self.adjust(is_generating=True)
+        if self.parent is not None:
+            self.parent.mark_child_resized(self)
+
+    def take_listing_state(self, source_folder: "EntityFolder"):
+        """
+        同路径的另一个文件夹（在别处扫描的）的子节点交给自己时，列目录的状态也要一起接过来，
+        否则之后增量更新时会把自己当作从没列出过，子文件夹重新列出时也会丢掉这里的.gitignore规则
+        :param source_folder:
+        :return:
+        """
+        self.dir_mtime_ns = source_folder.dir_mtime_ns
+        self.dir_inode = source_folder.dir_inode
+        self.gitignore_stack = source_folder.gitignore_stack
+        self.gitignore_signature = source_folder.gitignore_signature
+        self._inherited_gitignore_signature = (
+            source_folder._inherited_gitignore_signature
+        )
+        self._local_gitignore = source_folder._local_gitignore
+        self._local_gitignore_mtime_ns = source_folder._local_gitignore_mtime_ns
+
+    def update_tree_content_incremental(self):
+        """
+        增量更新文件夹树结构内容，不更新显示位置大小
+        每个目录只做一次stat，只有修改时间或inode变化了（或者生效的.gitignore变化了）的目录才会重新列出，
+        从没列出过的（新增的）文件夹会完整扫描，已删除的文件和文件夹会被移除
+        按需扫描中还没轮到扫描的文件夹保持原样
+        第一层有增删的文件夹会被标记出来，之后调用 relayout_dirty_folders 增量重新排列
+        :return:
+        """
+        stack: list[EntityFolder] = [self]
+        while stack:
+            folder = stack.pop()
+            if folder.is_lazy_pending:
+                continue
+            try:
+                stat = os.stat(folder.full_path)
+            except OSError:
+                # 目录已经不在了，它的父文件夹修改时间也变了，会在那里被移除
+                continue
+            if (
+                    folder.dir_mtime_ns == stat.st_mtime_ns
+                    and folder.dir_inode == stat.st_ino
+                    and not folder.is_gitignore_changed()
+            ):
+                # 第一层没有变化，但更深的地方可能有变化
+                stack.extend(
+                    child for child in folder.children if isinstance(child, EntityFolder)
+                )
+            else:
+                stack.extend(folder.apply_entries(folder.scan_entries(stat)))
 
     def adjust(self, is_generating=False):
         """
@@ -306,6 +828,7 @@ class EntityFolder(Entity):
         )
         self.body_shape.width = right_bound - left_bound + self.PADDING * 2
         self.body_shape.height = bottom_bound - top_bound + self.PADDING * 2
+        self._on_body_shape_changed()
         if not self.parent:
             return
 
@@ -326,59 +849,329 @@ class EntityFolder(Entity):
             self.parent.adjust()
         pass
 
-    def adjust_tree_location(self):
+    def adjust_tree_location(
+            self,
+            cancel_token: CancelToken | None = None,
+            progress: OpenProgress | None = None,
+            executor: Executor | None = None,
+    ):
         """
         提供给外界调用
+        :param cancel_token: 每排列完一个文件夹检查一次，被取消时抛出 OperationCancelled
+        :param progress: 每排列完一个文件夹累加一次
+        :param executor: 进程池，传入时互不相交的子树在各个进程里同时排列，结果和串行排列一样
         :return:
         """
-        self._adjust_tree_dfs(self)
+        if executor is not None:
+            self._adjust_tree_location_parallel(executor, cancel_token, progress)
+            return
+        # 后序遍历，排列一个文件夹时它的子文件夹内部都已经排列好了
+        for folder in iter_postorder(self, get_sub_folders):
+            raise_if_cancelled(cancel_token)
+            self._pack_children(folder, cancel_token)
+            if progress is not None:
+                progress.add_laid_out()
 
-    def _adjust_tree_dfs(self, folder: "EntityFolder"):
+    def _adjust_tree_location_parallel(
+            self,
+            executor: Executor,
+            cancel_token: CancelToken | None = None,
+            progress: OpenProgress | None = None,
+    ):
         """
-        递归调整文件夹树形结构位置
-        应该是一个后根遍历的过程，tips：这种多叉树不存在中序遍历，只有先序和后序。
-        :param folder:
+        把整棵树展开成只有大小的扁平列表交给 tools.parallel_layout 排列，
+        再按排列结果一次性把每个实体放到最终位置，不需要像串行排列那样一层层地整体平移子树
+        """
+        entities = list(iter_preorder(self, get_entity_children))
+        indexes = {entity: i for i, entity in enumerate(entities)}
+        parents = [-1] + [indexes[entity.parent] for entity in entities[1:]]
+        widths = [entity.body_shape.width for entity in entities]
+        heights = [entity.body_shape.height for entity in entities]
+        on_packed = None
+        if progress is not None:
+            on_packed = progress.add_laid_out
+            # 空文件夹不需要排列，直接算作排列完了
+            progress.add_laid_out(
+                sum(
+                    1
+                    for entity in entities
+                    if isinstance(entity, EntityFolder) and not entity.children
+                )
+            )
+        offsets_x, offsets_y = layout_flat_tree(
+            parents,
+            widths,
+            heights,
+            self.PADDING,
+            self.PADDING,
+            executor,
+            cancel_token=cancel_token,
+            on_packed=on_packed,
+            memo=LAYOUT_MEMO,
+        )
+
+        xs = [0.0] * len(entities)
+        ys = [0.0] * len(entities)
+        xs[0] = self.body_shape.location_left_top.x + offsets_x[0]
+        ys[0] = self.body_shape.location_left_top.y + offsets_y[0]
+        for i in range(1, len(entities)):
+            xs[i] = xs[parents[i]] + offsets_x[i]
+            ys[i] = ys[parents[i]] + offsets_y[i]
+        for i, entity in enumerate(entities):
+            entity.body_shape.location_left_top = NumberVector(xs[i], ys[i])
+            if isinstance(entity, EntityFolder) and entity.children:
+                entity.body_shape.width = widths[i]
+                entity.body_shape.height = heights[i]
+                entity.invalidate_children_caches()
+        self._on_body_shape_changed()
+
+    def adjust_tree_treemap(
+            self,
+            cancel_token: CancelToken | None = None,
+            progress: OpenProgress | None = None,
+    ):
+        """
+        按文件大小排列整棵树（矩形树图），每个实体的面积和它包含的字节数成正比
+        扫描时需要顺带拿到文件大小（TreeWalker 的 is_size_needed），拿不到大小的文件按0字节算
+        自身的大小也会重新确定，左上角位置不变
+        :param cancel_token: 每排列完一个文件夹检查一次，被取消时抛出 OperationCancelled
+        :param progress: 每排列完一个文件夹累加一次
         :return:
         """
+        # 自底向上汇总每个文件夹的总大小，以及切分面积用的权重
+        entity_count = 1
+        for folder in iter_postorder(self, get_sub_folders):
+            raise_if_cancelled(cancel_token)
+            folder._update_treemap_weight()
+            entity_count += len(folder.children)
 
-        # === 递归部分
-        for child in folder.children:
+        side = math.sqrt(entity_count * self.TREEMAP_AREA_PER_ENTITY)
+        self.body_shape.width = side
+        self.body_shape.height = side
+        self._on_body_shape_changed()
+        self._squarify_tree(cancel_token, progress)
+
+    def _update_treemap_weight(self):
+        """
+        由第一层汇总自身的总大小和权重，子文件夹的权重要先算好
+        每个文件的权重是它的字节数加1，空文件也能分到一点面积，空文件夹也按一个空文件算
+        :return:
+        """
+        total_size = 0
+        total_weight = 0
+        for child in self.children:
             if isinstance(child, EntityFolder):
-                # 是文件夹，继续递归
-                self._adjust_tree_dfs(child)
-        # ===
+                total_size += child.total_size or 0
+            else:
+                total_size += child.file_size or 0
+            total_weight += _get_treemap_weight(child)
+        self.total_size = total_size
+        self.treemap_weight = max(1, total_weight)
 
-        # 调整当前文件夹里的所有实体顺序位置
+    def _squarify_children(self) -> "list[EntityFolder | EntityFile]":
+        """
+        把自身扣掉内边距之后的区域按权重切分给第一层，不深入
+        :return: 分到的矩形和原来不同的子项
+        """
+        shape = self.body_shape
+        padding = min(
+            self.PADDING,
+            shape.width * self.TREEMAP_PADDING_RATIO,
+            shape.height * self.TREEMAP_PADDING_RATIO,
+        )
+        boxes = squarify(
+            [_get_treemap_weight(child) for child in self.children],
+            shape.left() + padding,
+            shape.top() + padding,
+            shape.width - padding * 2,
+            shape.height - padding * 2,
+        )
+        changed = []
+        for child, box in zip(self.children, boxes):
+            if _get_box(child) == box:
+                continue
+            left, top, right, bottom = box
+            child.body_shape.location_left_top = NumberVector(left, top)
+            child.body_shape.width = right - left
+            child.body_shape.height = bottom - top
+            changed.append(child)
+        self.invalidate_children_caches()
+        return changed
 
-        rectangle_list = [child.body_shape for child in folder.children]
-        if len(folder.children) < 100:
-            sort_strategy_function = sort_rectangle_greedy
-        else:
-            if all(isinstance(child, EntityFolder) for child in folder.children) or all(
-                    isinstance(child, EntityFile) for child in folder.children
-            ):
-                # 如果全是文件夹或者全是文件，按照正常的矩形排列
-                sort_strategy_function = sort_rectangle_all_files
-            else:
-                sort_strategy_function = sort_rectangle_many_files_less_folders
+    def _squarify_tree(
+            self,
+            cancel_token: CancelToken | None = None,
+            progress: OpenProgress | None = None,
+    ):
+        """
+        自顶向下，按已经算好的权重切分整棵树，自身的位置大小不变
+        :param cancel_token: 每排列完一个文件夹检查一次
+        :param progress: 每排列完一个文件夹累加一次
+        :return:
+        """
+        for folder in iter_preorder(self, get_sub_folders):
+            raise_if_cancelled(cancel_token)
+            folder._squarify_children()
+            if progress is not None:
+                progress.add_laid_out()
 
-        sorted_rectangle_list = sort_strategy_function(
-            [rectangle.clone() for rectangle in rectangle_list], self.PADDING
+    def _relayout_first_level(self):
+        """
+        在原地重新排列第一层，并收缩扩张自身，不处理和兄弟节点的碰撞
+        :return:
+        """
+        if not self.children:
+            return
+        rectangle_list = self._pack_rectangles(self)
+        origin = self.body_shape.location_left_top + NumberVector(
+            self.PADDING, self.PADDING
         )
+        # 整个第一层重新排列，原来的空位都没有意义了
+        self._free_space = None
+        for i, child in enumerate(self.children):
+            child.move_to(rectangle_list[i].location_left_top + origin)
+        self.adjust(is_generating=True)
 
-        # ===
-        # 先检查一下排序策略函数是否顺序正确
-        if len(sorted_rectangle_list) != len(rectangle_list):
-            print("排序策略错误，前后数组不相等")
+    def _relayout_dirty_children(self, changed_children: "list[EntityFolder]"):
+        """
+        增量重新排列第一层：新增的子项，以及变大之后和兄弟节点挤在一起的子文件夹，放进第一层的空位里，
+        其余子项都不动，然后收缩扩张自身，不处理和兄弟节点的碰撞
+        :param changed_children: 内部重新排列过、大小发生了变化的子文件夹
+        :return:
+        """
+        unplaced = [
+            child
+            for child in self._unplaced_children
+            if self.get_child(child.name) is child
+        ]
+        self.is_layout_dirty = False
+        for child in unplaced:
+            if isinstance(child, EntityFolder):
+                # 新增的文件夹内部还没有排列过
+                child.adjust_tree_location()
+        # 排列完内部之后再清空，在临时位置上变大的新增文件夹不会占住空位
+        self._unplaced_children = []
+        if not self.children:
+            return
 
-        for i, rect in enumerate(rectangle_list):
-            if (
-                    sorted_rectangle_list[i].width != rect.width
-                    or sorted_rectangle_list[i].height != rect.height
-            ):
-                print("排序策略错误")
-        # ===
+        unplaced_set = set(unplaced)
+        to_place = list(unplaced)
+        # 变大之后挤到兄弟节点的子文件夹
+        collided = []
+        for child in changed_children:
+            if child in unplaced_set or self.get_child(child.name) is not child:
+                continue
+            for other in self.children:
+                if (
+                        other is not child
+                        and other not in unplaced_set
+                        and child.body_shape.is_collision(
+                            other.body_shape, self.PADDING - 1e-6
+                        )
+                ):
+                    collided.append(child)
+                    break
+        to_place.extend(collided)
+        if (
+                len(to_place) == len(self.children)
+                or len(to_place) > self.INCREMENTAL_MAX_PLACED_CHILDREN
+        ):
+            self._relayout_first_level()
+            return
+
+        if collided:
+            # 要挪走的子文件夹已经在原处变大了，区域被它撑大了，按其余的子项重新找空位
+            self._free_space = None
+            unplaced_set.update(collided)
+        free_space = self._get_free_space(unplaced_set)
+        for child in collided:
+            # 它原来占的地方让出来，它自己也可能放回原处附近
+            free_space.release(
+                _get_box(child), self._get_neighbor_boxes(child, unplaced_set)
+            )
+        # 大的先放，小的更容易塞进剩下的缝里
+        to_place.sort(
+            key=lambda c: c.body_shape.width * c.body_shape.height, reverse=True
+        )
+        for child in to_place:
+            x, y = free_space.place(child.body_shape.width, child.body_shape.height)
+            child.move_to(NumberVector(x, y))
+        self.adjust(is_generating=True)
+
+    def _get_neighbor_boxes(
+            self,
+            child: "EntityFolder | EntityFile",
+            unplaced_set: "set[EntityFolder | EntityFile]",
+    ) -> list[Box]:
+        """
+        第一层中离 child 不到两倍内边距的其他子项，child 让出地方时它们附近仍然不能放
+        :param child:
+        :param unplaced_set: 还没放好的子项，只在临时位置上，不算
+        :return:
+        """
+        shape = child.body_shape
+        distance = self.PADDING * 2
+        return [
+            _get_box(other)
+            for other in self._get_children_candidates(
+                shape.left() - distance,
+                shape.top() - distance,
+                shape.right() + distance,
+                shape.bottom() + distance,
+            )
+            if other is not child
+            and other not in unplaced_set
+            and shape.is_collision(other.body_shape, distance)
+        ]
+
+    def _get_free_space(
+            self, unplaced_set: "set[EntityFolder | EntityFile] | None" = None
+    ) -> FreeSpace:
+        """
+        获取第一层的空位，没有时从已经放好的子项新建一个
+        文件夹还没调整大小时，变大的子项可能已经伸到了内部外面，所以区域要包住它们
+        :param unplaced_set: 还没放好的子项，只在临时位置上，不算在区域里，默认是 _unplaced_children
+        :return:
+        """
+        if self._free_space is None:
+            if unplaced_set is None:
+                unplaced_set = set(self._unplaced_children)
+            shape = self.body_shape
+            self._free_space = FreeSpace(
+                [
+                    _get_box(child)
+                    for child in self.children
+                    if child not in unplaced_set
+                ],
+                (
+                    shape.left() + self.PADDING,
+                    shape.top() + self.PADDING,
+                    shape.right() - self.PADDING,
+                    shape.bottom() - self.PADDING,
+                ),
+                self.PADDING,
+            )
+        return self._free_space
 
+    def adjust_children_location(self):
+        """
+        只重新排列第一层，子文件夹内部已有的布局保持不变
+        :return:
+        """
+        self._pack_children(self)
+
+    def _pack_children(
+            self, folder: "EntityFolder", cancel_token: CancelToken | None = None
+    ):
+        """
+        只调整 folder 第一层里所有实体的顺序位置，不递归
+        子文件夹内部应该已经排列好了
+        :param folder:
+        :param cancel_token: 被取消时抛出 OperationCancelled，此时 folder 第一层还没有移动
+        :return:
+        """
+        sorted_rectangle_list = self._pack_rectangles(folder, cancel_token)
+        folder._free_space = None
         for i, child in enumerate(folder.children):
             child.move_to(
                 sorted_rectangle_list[i].location_left_top
@@ -386,20 +1179,178 @@ class EntityFolder(Entity):
             )
         folder.adjust(is_generating=True)
 
+    def _pack_rectangles(
+            self, folder: "EntityFolder", cancel_token: CancelToken | None = None
+    ) -> list[Rectangle]:
+        """
+        用排序策略计算 folder 第一层所有实体的排列位置，不移动实体
+        :param folder:
+        :param cancel_token: 耗时的排序策略中会不断检查
+        :return: 和 folder.children 一一对应的矩形，位置是相对于排列原点的
+        """
+        rectangle_list = [child.body_shape for child in folder.children]
+        locations = pack_locations(
+            [rectangle.width for rectangle in rectangle_list],
+            [rectangle.height for rectangle in rectangle_list],
+            self.PADDING,
+            LAYOUT_MEMO,
+            cancel_token,
+        )
+        return [
+            Rectangle(NumberVector(x, y), rectangle.width, rectangle.height)
+            for (x, y), rectangle in zip(locations, rectangle_list)
+        ]
+
     def __repr__(self):
         return f"({self.full_path})"
 
+    @property
+    def name(self) -> str:
+        return self.folder_name
+
     def get_components(self) -> List[Paintable]:
         return []
 
     def paint(self, context: PaintContext) -> None:
         context.painter.paint_rect(self.body_shape)
+        title = self.folder_name
+        if self.total_size is not None:
+            title = f"{self.folder_name}  {format_file_size(self.total_size)}"
         if self.is_hide_inner:
-            context.painter.paint_text_in_rect(
-                self.folder_name, self.body_shape
-            )
+            context.painter.paint_text_in_rect(title, self.body_shape)
             pass
         else:
-            context.painter.paint_text(
-                Text(self.body_shape.location_left_top, self.folder_name)
-            )
+            context.painter.paint_text(Text(self.body_shape.location_left_top, title))
+
+
+def get_entity_children(
+        entity: "EntityFolder | EntityFile",
+) -> "list[EntityFolder | EntityFile]":
+    """
+    用于 tools.tree_walk 遍历所有实体
+    """
+    if isinstance(entity, EntityFolder):
+        return entity.children
+    return []
+
+
+def get_sub_folders(folder: EntityFolder) -> list[EntityFolder]:
+    """
+    用于 tools.tree_walk 只遍历文件夹
+    """
+    return [child for child in folder.children if isinstance(child, EntityFolder)]
+
+
+def relayout_dirty_folders(root: EntityFolder) -> bool:
+    """
+    重新列出目录之后，增量地重新排列树中第一层有增删的文件夹（见 EntityFolder.is_layout_dirty）
+    新增的子项放进空位，原有的子项不动；文件夹因此变大、和兄弟节点挤在一起时，
+    再把它放进父文件夹的空位，一直向上直到大小不再变化，由深到浅，每个文件夹只处理一次
+    开销和变化的多少成正比，而不是和整棵树的大小成正比
+    :param root:
+    :return: 是否有文件夹被重新排列了
+    """
+    # 深度 -> {需要处理的文件夹: 它的内部重新排列过、大小发生了变化的子文件夹}
+    levels: dict[int, dict[EntityFolder, list[EntityFolder]]] = {}
+    for folder in _pop_dirty_folders(root):
+        levels.setdefault(folder.deep_level, {}).setdefault(folder, []).extend(
+            folder._resized_children
+        )
+        folder._resized_children = []
+    if not levels:
+        return False
+
+    while levels:
+        for folder, changed_children in levels.pop(max(levels)).items():
+            shape = folder.body_shape
+            old_shape = (shape.left(), shape.top(), shape.width, shape.height)
+            folder._relayout_dirty_children(changed_children)
+            parent = folder.parent
+            if parent is not None and old_shape != (
+                    shape.left(),
+                    shape.top(),
+                    shape.width,
+                    shape.height,
+            ):
+                levels.setdefault(parent.deep_level, {}).setdefault(
+                    parent, []
+                ).append(folder)
+    return True
+
+
+def relayout_dirty_treemap(root: EntityFolder) -> bool:
+    """
+    按文件大小排列（矩形树图）时的 relayout_dirty_folders
+    第一层有增删的文件夹和它所有的上层重新汇总权重、重新切分第一层；
+    其余的文件夹分到的矩形没有变化时内部都不动，变了才重新切分它的内部
+    整棵树的大小保持不变，新增的文件还不知道大小，按0字节算
+    :param root: 已经按文件大小排列过的树
+    :return: 是否有文件夹被重新排列了
+    """
+    dirty_folders = _pop_dirty_folders(root)
+    if not dirty_folders:
+        return False
+    # 权重发生了变化的文件夹：有增删的，以及它们的上层
+    path_folders: set[EntityFolder] = set()
+    for folder in dirty_folders:
+        folder.is_layout_dirty = False
+        folder._unplaced_children = []
+        folder._resized_children = []
+        folder._free_space = None
+        while folder is not None and folder not in path_folders:
+            path_folders.add(folder)
+            folder = folder.parent
+
+    # 新增的文件夹，内部还没有按文件大小排列过
+    new_folders: set[EntityFolder] = set()
+    ordered = sorted(path_folders, key=lambda f: f.deep_level)
+    for folder in reversed(ordered):
+        for child in get_sub_folders(folder):
+            if child.treemap_weight is None:
+                for sub_folder in iter_postorder(child, get_sub_folders):
+                    sub_folder._update_treemap_weight()
+                new_folders.add(child)
+        folder._update_treemap_weight()
+
+    # 由浅到深，上层先切分好，下层才知道自己分到了哪里
+    for folder in ordered:
+        changed = set(folder._squarify_children())
+        for child in get_sub_folders(folder):
+            if child not in path_folders and (child in changed or child in new_folders):
+                child._squarify_tree()
+    return True
+
+
+def _pop_dirty_folders(root: EntityFolder) -> list[EntityFolder]:
+    """
+    沿着 _has_dirty_descendant 找出第一层有增删的文件夹，顺带清除沿途的标记
+    :param root:
+    :return:
+    """
+    dirty_folders = []
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        if folder.is_layout_dirty:
+            dirty_folders.append(folder)
+        if folder._has_dirty_descendant:
+            folder._has_dirty_descendant = False
+            stack.extend(get_sub_folders(folder))
+    return dirty_folders
+
+
+def _get_treemap_weight(entity: "EntityFolder | EntityFile") -> int:
+    """
+    按文件大小排列时切分面积用的权重，文件夹的要先算好（见 EntityFolder._update_treemap_weight）
+    """
+    if isinstance(entity, EntityFolder):
+        return entity.treemap_weight or 1
+    return (entity.file_size or 0) + 1
+
+
+def _get_box(entity: "EntityFolder | EntityFile") -> Box:
+    """
+    实体占的地方 (left, top, right, bottom)，用于 FreeSpace
+    """
+    shape = entity.body_shape
+    return shape.left(), shape.top(), shape.right(), shape.bottom()
@@ -55,6 +55,13 @@ class ExcludeDialog(QDialog):
         # 设置初始内容
         self.text_edit.setPlainText(EXCLUDE_MANAGER.user_input_content)
         layout.addWidget(self.text_edit)
+        layout.addWidget(
+            QLabel(
+                "每行一条，#开头的行是注释；支持 * ? [] 通配符，如 *.pyc；"
+                "以 / 结尾的只排除文件夹，如 build*/",
+                self,
+            )
+        )
         layout.addWidget(
             QLabel(
                 "注意，如果您现在已经打开了文件，保存后需要重新“打开文件夹”才能生效",
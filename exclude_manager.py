@@ -3,6 +3,10 @@
 单例模式，全局唯一实例
 """
 
+import fnmatch
+import re
+from typing import Callable, Optional
+
 _init_content = """.git
 __pycache__
 .idea
@@ -19,38 +23,109 @@ class ExcludeManager:
         # 是否开启全局排除
         self.is_global_exclude = True
 
+        # 以下是由 user_input_content 预先编译好的匹配结构，只在内容更新时重新生成
+        # 不带通配符的名字
+        self._exclude_names: frozenset[str] = frozenset()
+        # 只排除文件夹的名字（以斜杠结尾的规则）
+        self._exclude_dir_names: frozenset[str] = frozenset()
+        # 所有带通配符的规则合并成的一个正则，对名字做匹配，没有这类规则时为None
+        self._exclude_pattern_match: Optional[Callable] = None
+        self._exclude_dir_pattern_match: Optional[Callable] = None
+
+        self.update_exclude_content(_init_content)
+
     def update_exclude_content(self, content: str):
+        """
+        更新排除规则，并预先编译好，之后每次判断都不再重新解析
+        每行一条规则，和.gitignore一样，#开头的是注释，以斜杠结尾的只排除文件夹，
+        支持 * ? [] 通配符，规则只和文件（夹）的名字匹配
+        :param content:
+        :return:
+        """
         self.user_input_content = content
 
+        names: set[str] = set()
+        dir_names: set[str] = set()
+        patterns: list[str] = []
+        dir_patterns: list[str] = []
+        for rule in self.exclude_list:
+            is_dir_only = rule.endswith("/")
+            rule = rule.strip("/")
+            if not rule:
+                continue
+            if any(c in rule for c in "*?["):
+                (dir_patterns if is_dir_only else patterns).append(
+                    fnmatch.translate(rule)
+                )
+            else:
+                (dir_names if is_dir_only else names).add(rule)
+
+        self._exclude_names = frozenset(names)
+        self._exclude_dir_names = frozenset(dir_names)
+        self._exclude_pattern_match = _compile_patterns(patterns)
+        self._exclude_dir_pattern_match = _compile_patterns(dir_patterns)
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        当前排除设置的指纹，排除设置变化后，之前按旧设置得到的扫描结果就不能再用了
+        """
+        return (
+            f"{int(self.is_local_exclude)}{int(self.is_global_exclude)}"
+            f"{self.user_input_content}"
+        )
+
     @property
     def exclude_list(self):
         """
         排除项列表
         """
-        result = self.user_input_content.split()
-        # 去掉空白项
-        result = [item for item in result if item]
+        result = [line.strip() for line in self.user_input_content.splitlines()]
+        # 去掉空白项和注释
+        result = [item for item in result if item and not item.startswith("#")]
         # 可能还有其他的排除
 
         return result
 
-    def is_file_in_global_exclude(self, file_path: str):
+    def is_file_in_global_exclude(self, file_path: str, is_dir: Optional[bool] = None):
         """
         判断某一个文件是否应该被全局排除
         拿到的路径在上游保证 反斜杠替换为正斜杠
+        :param file_path:
+        :param is_dir: 是否是文件夹，不知道时为None，此时只排除文件夹的规则不生效
         """
 
         if not self.is_global_exclude:
             return False
 
-        # 这里先写简单一些，暂时不支持正则表达式
-        file_name = file_path.split("/")[-1]
-        if file_name in self.exclude_list:
+        file_name = file_path[file_path.rfind("/") + 1 :]
+        if file_name in self._exclude_names:
             return True
+        if self._exclude_pattern_match is not None and self._exclude_pattern_match(
+            file_name
+        ):
+            return True
+        if is_dir:
+            if file_name in self._exclude_dir_names:
+                return True
+            if (
+                self._exclude_dir_pattern_match is not None
+                and self._exclude_dir_pattern_match(file_name)
+            ):
+                return True
         return False
 
     pass
 
 
+def _compile_patterns(patterns: list[str]) -> Optional[Callable]:
+    """
+    把多个 fnmatch.translate 得到的正则合并成一个，返回它的 match 方法
+    """
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns)).match
+
+
 EXCLUDE_MANAGER = ExcludeManager()
 del ExcludeManager
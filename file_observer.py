@@ -1,9 +1,28 @@
+import contextlib
 import enum
+import math
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from camera import Camera
 from data_struct.number_vector import NumberVector
 from data_struct.rectangle import Rectangle
 from entity.entity import Entity
 from entity.entity_file import EntityFile
-from entity.entity_folder import EntityFolder
+from entity.entity_folder import (
+    EntityFolder,
+    get_entity_children,
+    get_sub_folders,
+    relayout_dirty_folders,
+)
+from exclude_manager import EXCLUDE_MANAGER
+from tools.cancel_token import CancelToken
+from tools.layout_memo import LAYOUT_MEMO
+from tools.open_progress import OpenProgress
+from tools.scan_cache import ScanCache
+from tools.spatial_index import RangeQueryTracker
+from tools.tree_walk import iter_preorder
+from tree_walker import DEFAULT_SCAN_WORKERS, TreeWalker
 
 
 class InteractiveState(enum.Enum):
@@ -25,6 +44,10 @@ class FileObserver:
         # 选中的矩形
         self.select_rect_start_location: NumberVector | None = None
         self.select_rect_end_location: NumberVector | None = None
+        # 框选所在的文件夹、它的空间索引，以及在这个索引上增量更新的范围查询
+        self._select_tracker: (
+            tuple[EntityFolder, tuple, RangeQueryTracker] | None
+        ) = None
 
         # 当前正在拖拽的
         self.dragging_entity_list: list[Entity] = []
@@ -34,6 +57,39 @@ class FileObserver:
         self.is_drag_locked: bool = False
         # 当前的交互状态
         self.interactive_state: InteractiveState = InteractiveState.SELECT
+        # 扫描文件夹时同时列目录的线程数，1表示串行扫描
+        self.scan_workers: int = DEFAULT_SCAN_WORKERS
+
+        # 排列文件夹树时同时工作的进程数，1表示在扫描线程里串行排列
+        # 排列是纯计算，多线程受GIL限制，只有多进程才能用上多个核心
+        self.layout_workers: int = 1
+
+        # 是否使用扫描缓存，再次打开同一个文件夹时，没有变化的目录不再重新列出
+        self.is_scan_cache_enabled: bool = True
+
+        # 是否使用按需扫描：打开时只扫描到 lazy_scan_depth 层，
+        # 更深的内容等到透视等级或者缩放需要显示时再在后台扫描
+        self.is_lazy_scan: bool = False
+        self.lazy_scan_depth: int = 4
+
+        # 是否按文件大小排列（矩形树图），面积和字节数成正比，用来查看磁盘占用
+        # 排列需要整棵树的大小，所以这时不使用按需扫描，也不使用流式打开
+        self.is_treemap_layout: bool = False
+
+        # 是否使用流式打开：一边扫描一边显示已经扫描并排列好的顶层文件夹
+        self.is_streaming_open: bool = True
+        # 当前是否正在流式打开中
+        self.is_streaming: bool = False
+        # 扫描线程放进来的、已经排列好的顶层子树，由UI线程取出挂到根文件夹上
+        self._streamed_entities: queue.SimpleQueue[EntityFile | EntityFolder] = (
+            queue.SimpleQueue()
+        )
+        # 扫描线程里的根文件夹，记录了顶层子项最终应有的顺序
+        self._streaming_source_root: EntityFolder | None = None
+        # 流式摆放顶层子树时的游标（相对于根文件夹左上角）
+        self._stream_cursor = NumberVector(0, 0)
+        self._stream_row_height = 0.0
+        self._stream_total_area = 0.0
 
     @property
     def select_rectangle(self) -> Rectangle | None:
@@ -61,29 +117,104 @@ class FileObserver:
         """
         self.select_rect_start_location = None
         self.select_rect_end_location = None
+        self._select_tracker = None
+
+    def get_entities_in_select_rect(
+        self, select_rect: Rectangle
+    ) -> list[EntityFile | EntityFolder]:
+        """
+        获取框选矩形选中的实体
+        选择框的起始点位置落在了什么文件夹里就直接决定它只能选中哪一个文件夹里的内容
+        拖动选择框时，只查询选择框新旧位置不重叠的部分，而不是每次都把文件夹的所有子项判断一遍
+        :param select_rect: 选择框
+        :return: 和选择框相交的子项，保持在 children 中的先后顺序
+        """
+        if self.select_rect_start_location is None:
+            return []
+        folder = self.get_folder_by_location(self.select_rect_start_location)
+        if folder is None:
+            return []
+        spatial_index = folder.get_spatial_index()
+        if spatial_index is None:
+            return folder.get_children_in_rectangle(select_rect)
+
+        if (
+            self._select_tracker is None
+            or self._select_tracker[0] is not folder
+            or self._select_tracker[1] is not spatial_index
+        ):
+            # 换了文件夹，或者文件夹第一层有了变化，从头开始查询
+            self._select_tracker = (
+                folder,
+                spatial_index,
+                RangeQueryTracker(spatial_index[0]),
+            )
+        tracker = self._select_tracker[2]
+        indexed_children = spatial_index[1]
+        tolerance = EntityFolder.SPATIAL_INDEX_TOLERANCE
+        result = []
+        for i in tracker.update(
+            select_rect.left() - tolerance,
+            select_rect.top() - tolerance,
+            select_rect.right() + tolerance,
+            select_rect.bottom() + tolerance,
+        ):
+            child = indexed_children[i]
+            if child.body_shape.is_collision(select_rect):
+                result.append(child)
+        return result
 
     def set_drag_lock(self, is_lock: bool):
         self.is_drag_locked = is_lock
         if is_lock:
             self.dragging_entity_activating = False
 
-    def update_file_path(self, new_path: str):
+    def update_file_path(
+        self,
+        new_path: str,
+        cancel_token: CancelToken | None = None,
+        progress: OpenProgress | None = None,
+    ):
         """
         更新文件路径，相当于外界用户换了一个想要查看的文件夹
         被外界更换文件夹的地方调用
+        新的文件夹树全部扫描、排列完成之后才替换掉当前的，
+        所以被取消（抛出 OperationCancelled）时，当前打开的文件夹保持不变，扫描了一半的树直接丢弃
         :param new_path:
+        :param cancel_token: 用于取消这次打开
+        :param progress: 用于报告扫描和排列的进度
         :return:
         """
 
-        self.folder_full_path = new_path
-        self.root_folder = EntityFolder(NumberVector(0, 0), self.folder_full_path)
+        root_folder = EntityFolder(NumberVector(0, 0), new_path)
+        self._load_layout_memo()
         # 时间花费较少
         print("读取文件夹内容中")
-        self.root_folder.update_tree_content()
+        scan_cache = self._load_scan_cache(new_path)
+        if progress is not None and scan_cache is not None:
+            progress.expected_dir_count = scan_cache.record_count or None
+        TreeWalker(
+            self.scan_workers,
+            scan_cache,
+            cancel_token,
+            progress,
+            self._lazy_max_depth(),
+            is_size_needed=self.is_treemap_layout,
+        ).walk(root_folder)
+        self._save_scan_cache(scan_cache)
         print("生成排列结构中")
+        if progress is not None:
+            progress.start_layout(progress.dirs_visited)
         # 时间花费较大
-        self.root_folder.adjust_tree_location()
+        if self.is_treemap_layout:
+            root_folder.adjust_tree_treemap(cancel_token, progress)
+        else:
+            with self._create_layout_executor() as executor:
+                root_folder.adjust_tree_location(cancel_token, progress, executor)
+            self._save_layout_memo()
 
+        self.folder_full_path = new_path
+        self.root_folder = root_folder
         self.dragging_entity_list = []
         # 还需要将新的文件夹移动到世界坐标的中心。
         target_location_left_top = NumberVector(0, 0) - NumberVector(
@@ -94,6 +225,293 @@ class FileObserver:
         print("计算最大深度中")
         self.folder_max_deep_index = self.root_folder.count_deep_level()
 
+    def open_folder_streaming(
+        self,
+        new_path: str,
+        cancel_token: CancelToken | None = None,
+        progress: OpenProgress | None = None,
+    ):
+        """
+        流式打开文件夹，在扫描线程中调用
+        每个顶层子项连同其内部扫描完成后，先在后台排列好（见 TreeWalker.walk），再交给UI线程显示
+        UI线程需要不断调用 drain_streamed_entities，扫描线程结束后调用 finish_streaming_open，
+        被取消（抛出 OperationCancelled）时则调用 abort_streaming_open
+        :param new_path:
+        :param cancel_token: 用于取消这次打开
+        :param progress: 用于报告扫描和排列的进度
+        :return:
+        """
+        self.folder_full_path = new_path
+        self._streamed_entities = queue.SimpleQueue()
+        self._stream_cursor = NumberVector(0, 0)
+        self._stream_row_height = 0.0
+        self._stream_total_area = 0.0
+        self.dragging_entity_list = []
+        self.folder_max_deep_index = 1
+
+        # 显示用的根文件夹的子节点只由UI线程修改
+        # 扫描线程往另一个同路径的根文件夹里扫描，扫描好的子树再挪过去
+        source_root = EntityFolder(NumberVector(0, 0), new_path)
+        self._streaming_source_root = source_root
+        self.root_folder = EntityFolder(NumberVector(0, 0), new_path)
+        self.is_streaming = True
+        self._load_layout_memo()
+
+        with self._create_layout_executor() as executor:
+
+            def on_subtree_done(entity: EntityFile | EntityFolder):
+                if isinstance(entity, EntityFolder):
+                    entity.adjust_tree_location(cancel_token, progress, executor)
+                self._streamed_entities.put(entity)
+
+            scan_cache = self._load_scan_cache(new_path)
+            if progress is not None and scan_cache is not None:
+                progress.expected_dir_count = scan_cache.record_count or None
+            TreeWalker(
+                self.scan_workers,
+                scan_cache,
+                cancel_token,
+                progress,
+                self._lazy_max_depth(),
+            ).walk(source_root, on_subtree_done)
+            self._save_scan_cache(scan_cache)
+            self._save_layout_memo()
+
+    def _create_layout_executor(self) -> contextlib.AbstractContextManager:
+        """
+        :return: 排列用的进程池，layout_workers <= 1 时得到的是 None
+        """
+        if self.layout_workers <= 1:
+            return contextlib.nullcontext()
+        # 扫描线程之外还有UI线程，fork 一个多线程的进程不安全，所以用 spawn 启动工作进程
+        return ProcessPoolExecutor(
+            self.layout_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _load_scan_cache(self, root_path: str) -> ScanCache | None:
+        if not self.is_scan_cache_enabled:
+            return None
+        return ScanCache.load(root_path.replace("\\", "/"), EXCLUDE_MANAGER.fingerprint)
+
+    def _save_scan_cache(self, scan_cache: ScanCache | None):
+        if scan_cache is None:
+            return
+        print(
+            f"扫描缓存命中 {scan_cache.hit_count} 个目录，"
+            f"重新列出 {scan_cache.miss_count} 个"
+        )
+        try:
+            # 按需扫描只用到了浅层的记录，深层的记录也要留着
+            scan_cache.save(keep_unused_records=self.is_lazy_scan)
+        except OSError as e:
+            print(f"扫描缓存保存失败：{e}")
+
+    @staticmethod
+    def _load_layout_memo():
+        if LAYOUT_MEMO.is_enabled and not LAYOUT_MEMO.is_loaded:
+            LAYOUT_MEMO.load()
+
+    @staticmethod
+    def _save_layout_memo():
+        if not LAYOUT_MEMO.is_enabled:
+            return
+        print(
+            f"排列缓存命中 {LAYOUT_MEMO.hit_count} 个文件夹，"
+            f"重新排列 {LAYOUT_MEMO.miss_count} 个"
+        )
+        LAYOUT_MEMO.hit_count = 0
+        LAYOUT_MEMO.miss_count = 0
+        try:
+            LAYOUT_MEMO.save()
+        except OSError as e:
+            print(f"排列缓存保存失败：{e}")
+
+    def _lazy_max_depth(self) -> int | None:
+        if self.is_lazy_scan and not self.is_treemap_layout:
+            return self.lazy_scan_depth
+        return None
+
+    def get_lazy_folders_to_load(
+        self, camera: Camera, max_count: int = 16
+    ) -> list[EntityFolder]:
+        """
+        UI线程调用，找出视野内需要显示内部、但还没有扫描的文件夹
+        透视等级已经允许显示它的内部，或者它在屏幕上已经足够大（放大进入了这个文件夹）
+        :param camera:
+        :param max_count: 最多返回多少个
+        :return:
+        """
+        if self.root_folder is None or self.is_streaming:
+            return []
+        cover_world_rectangle = camera.cover_world_rectangle
+        perspective_level = camera.perspective_level
+        # 屏幕上的宽度超过视野宽度的这个比例，就认为是放大进入了这个文件夹
+        zoom_in_width = camera.view_width * 0.5 / camera.current_scale
+
+        def get_children(folder: EntityFolder):
+            # 视野之外的、不显示内部的文件夹，其内部也都不用看了
+            if folder.is_lazy_pending or not folder.body_shape.is_collision(
+                cover_world_rectangle
+            ):
+                return ()
+            if folder.deep_level >= perspective_level:
+                return ()
+            return get_sub_folders(folder)
+
+        result = []
+        for folder in iter_preorder(self.root_folder, get_children):
+            if not folder.is_lazy_pending:
+                continue
+            if not folder.body_shape.is_collision(cover_world_rectangle):
+                continue
+            if (
+                folder.deep_level < perspective_level
+                or folder.body_shape.width >= zoom_in_width
+            ):
+                result.append(folder)
+                if len(result) >= max_count:
+                    break
+        return result
+
+    def load_lazy_folders(
+        self,
+        folders: list[EntityFolder],
+        cancel_token: CancelToken | None = None,
+    ) -> list[tuple[EntityFolder, EntityFolder]]:
+        """
+        在后台线程调用，扫描并排列还没有扫描的文件夹，同样只向下扫描 lazy_scan_depth 层
+        不修改当前的树，而是扫描到另一个同路径的文件夹里，之后由UI线程调用 attach_lazy_folders 接上
+        :param folders:
+        :param cancel_token:
+        :return: (原文件夹, 扫描并排列好的同路径文件夹) 的列表
+        """
+        result = []
+        for folder in folders:
+            loaded_folder = EntityFolder(NumberVector(0, 0), folder.full_path)
+            loaded_folder.deep_level = folder.deep_level
+            # 继承上层的.gitignore规则，但不挂到父文件夹上：
+            # 后台排列时会让父文件夹的空间索引和绘制缓存失效，而UI线程可能正在用它们绘制
+            # 到 attach_lazy_folders 里在UI线程接上时才和树发生关系
+            if folder.parent is not None:
+                loaded_folder.set_inherited_gitignore(folder.parent)
+            TreeWalker(
+                self.scan_workers,
+                cancel_token=cancel_token,
+                max_depth=self.lazy_scan_depth,
+            ).walk(loaded_folder)
+            loaded_folder.adjust_tree_location(cancel_token)
+            result.append((folder, loaded_folder))
+        return result
+
+    def attach_lazy_folders(
+        self, loaded_list: list[tuple[EntityFolder, EntityFolder]]
+    ) -> bool:
+        """
+        UI线程调用，把后台扫描好的内容接到原文件夹上，然后增量重新排列：
+        变大的文件夹和兄弟节点挤在一起时才放进父文件夹的空位，其余的兄弟节点和上层文件夹都不动
+        后台扫描期间树可能已经换掉了（重新打开了文件夹），这时扫描结果直接丢弃
+        :param loaded_list: load_lazy_folders 的结果
+        :return: 是否有内容被接上
+        """
+        is_attached = False
+        for folder, loaded_folder in loaded_list:
+            if (
+                not folder.is_lazy_pending
+                or self.get_folder_by_path(folder.full_path) is not folder
+            ):
+                continue
+            folder.adopt_content(loaded_folder)
+            is_attached = True
+        if not is_attached:
+            return False
+        assert self.root_folder
+        relayout_dirty_folders(self.root_folder)
+        self.folder_max_deep_index = self.root_folder.count_deep_level()
+        return True
+
+    def drain_streamed_entities(self, max_count: int = 200) -> bool:
+        """
+        UI线程调用，把扫描线程已经完成的顶层子树挂到根文件夹上
+        每次最多处理 max_count 个，防止一帧卡太久
+        :return: 是否有新的内容被挂上
+        """
+        if self.root_folder is None:
+            return False
+        batch = []
+        while len(batch) < max_count:
+            try:
+                batch.append(self._streamed_entities.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return False
+        for entity in batch:
+            self._place_streamed_entity(entity)
+        self.root_folder.adjust(is_generating=True)
+        return True
+
+    def _place_streamed_entity(self, entity: EntityFile | EntityFolder):
+        """
+        把一个排列好的顶层子树按行摆放到根文件夹里，行宽随已摆放的总面积增长，大致保持方形
+        """
+        assert self.root_folder
+        margin = EntityFolder.PADDING
+        shape = entity.body_shape
+        row_width_limit = max(2000.0, math.sqrt(self._stream_total_area))
+        if self._stream_cursor.x > 0 and self._stream_cursor.x > row_width_limit:
+            # 换行
+            self._stream_cursor = NumberVector(
+                0, self._stream_cursor.y + self._stream_row_height + margin
+            )
+            self._stream_row_height = 0.0
+        entity.move_to(NumberVector(0, 0) + self._stream_cursor)
+        self._stream_cursor = self._stream_cursor + NumberVector(
+            shape.width + margin, 0
+        )
+        self._stream_row_height = max(self._stream_row_height, shape.height)
+        self._stream_total_area += shape.width * shape.height
+
+        entity.parent = self.root_folder
+        self.root_folder.add_child(entity)
+        if isinstance(entity, EntityFolder):
+            self.folder_max_deep_index = max(
+                self.folder_max_deep_index, entity.count_deep_level() + 1
+            )
+
+    def finish_streaming_open(self):
+        """
+        UI线程调用，扫描线程结束之后，把剩下的子树挂上，并按照最终顺序重新排列第一层
+        最终结果和非流式打开得到的树结构、内部布局一致，只是不会再移动到世界中心
+        """
+        if not self.is_streaming:
+            return
+        self.is_streaming = False
+        source_root = self._streaming_source_root
+        self._streaming_source_root = None
+        if self.root_folder is None or source_root is None:
+            return
+        while self.drain_streamed_entities():
+            pass
+        # 按扫描结果里的顺序排列，这样和非流式打开得到的布局一样
+        self.root_folder.set_children(list(source_root.children))
+        self.root_folder.take_listing_state(source_root)
+        self.root_folder.adjust_children_location()
+        self.folder_max_deep_index = self.root_folder.count_deep_level()
+
+    def abort_streaming_open(self):
+        """
+        UI线程调用，流式打开被取消之后，丢掉已经显示出来的部分，释放整棵扫描了一半的树
+        """
+        if not self.is_streaming:
+            return
+        self.is_streaming = False
+        self._streaming_source_root = None
+        self._streamed_entities = queue.SimpleQueue()
+        self.root_folder = None
+        self.folder_full_path = ""
+        self.dragging_entity_list = []
+        self.folder_max_deep_index = 1
+
     def output_layout_dict(self) -> dict:
         """
         输出当前文件夹的布局文件
@@ -120,13 +538,11 @@ class FileObserver:
         :param folder:
         :return:
         """
-        res = []
-        for file in folder.children:
-            if isinstance(file, EntityFile):
-                res.append(file)
-            elif isinstance(file, EntityFolder):
-                res.extend(self._entity_files(file))
-        return res
+        return [
+            entity
+            for entity in iter_preorder(folder, get_entity_children)
+            if isinstance(entity, EntityFile)
+        ]
 
     def _entity_folders(self, folder: EntityFolder) -> list[EntityFolder]:
         """
@@ -134,14 +550,29 @@ class FileObserver:
         :param folder:
         :return:
         """
+        return list(iter_preorder(folder, get_sub_folders))
 
-        assert self.root_folder
-        res = [self.root_folder]
-        for file in folder.children:
-            if isinstance(file, EntityFolder):
-                res.append(file)
-                res.extend(self._entity_folders(file))
-        return res
+    def get_folder_by_path(self, full_path: str) -> EntityFolder | None:
+        """
+        根据完整路径找到树中对应的文件夹，不在树中（被排除或已删除）则返回None
+        :param full_path:
+        :return:
+        """
+        if self.root_folder is None:
+            return None
+        full_path = full_path.replace("\\", "/").rstrip("/")
+        root_path = self.root_folder.full_path.rstrip("/")
+        if full_path == root_path:
+            return self.root_folder
+        if not full_path.startswith(root_path + "/"):
+            return None
+        folder = self.root_folder
+        for name in full_path[len(root_path) + 1 :].split("/"):
+            child = folder.get_child(name)
+            if not isinstance(child, EntityFolder):
+                return None
+            folder = child
+        return folder
 
     def get_entity_by_location(
         self, location_world: NumberVector
@@ -154,7 +585,7 @@ class FileObserver:
         if self.root_folder is None:
             return None
 
-        return self._get_entity_by_location_dfs(location_world, self.root_folder)
+        return self._descend_to_entity_by_location(location_world, self.root_folder)
 
     def get_folder_by_location(
         self, location_world: NumberVector
@@ -167,68 +598,54 @@ class FileObserver:
         if self.root_folder is None:
             return None
 
-        return self._get_folder_by_location_dfs(location_world, self.root_folder)
+        return self._descend_to_folder_by_location(location_world, self.root_folder)
 
-    def _get_folder_by_location_dfs(
-        self, location_world: NumberVector, currentEntity: EntityFolder
+    @staticmethod
+    def _descend_to_folder_by_location(
+        location_world: NumberVector, root_folder: EntityFolder
     ) -> EntityFolder | None:
-        """递归的实现"""
+        """
+        从 root_folder 开始一层层向内找，每层只会进入第一个击中的子文件夹
+        每层通过空间索引只取出包含这个点的子项，而不是逐个判断所有子项
+        """
         # 当前没有点到东西
-        if not currentEntity.body_shape.is_contain_point(location_world):
+        if not root_folder.body_shape.is_contain_point(location_world):
             return None
-
-        if isinstance(currentEntity, EntityFolder):
-            # 是文件夹
-
+        current_folder = root_folder
+        while True:
             # 如果当前文件夹内部隐藏了，则直接返回当前文件夹
-            if currentEntity.is_hide_inner:
-                return currentEntity
-
-            # 看看是不是击中了内部的东西
-            for child in currentEntity.children:
+            if current_folder.is_hide_inner:
+                return current_folder
+            # 看看是不是击中了内部的文件夹
+            for child in current_folder.get_children_at_location(location_world):
                 if isinstance(child, EntityFolder):
-                    # 是否击中文件夹
-                    res = self._get_folder_by_location_dfs(location_world, child)
-                    if res is not None:
-                        return res
-
-            # 未击中任何内部的东西，则返回当前文件夹
-            return currentEntity
-        else:
-            raise ValueError("Unknown entity type")
-
-    def _get_entity_by_location_dfs(
-        self, location_world: NumberVector, currentEntity: EntityFile | EntityFolder
+                    current_folder = child
+                    break
+            else:
+                # 未击中任何内部的东西，则返回当前文件夹
+                return current_folder
+
+    @staticmethod
+    def _descend_to_entity_by_location(
+        location_world: NumberVector, root_folder: EntityFolder
     ) -> EntityFile | EntityFolder | None:
-        """递归的实现"""
+        """
+        从 root_folder 开始一层层向内找，击中文件就返回文件，击中文件夹就进入这个文件夹继续找
+        """
         # 当前没有点到东西
-        if not currentEntity.body_shape.is_contain_point(location_world):
+        if not root_folder.body_shape.is_contain_point(location_world):
             return None
-
-        if isinstance(currentEntity, EntityFile):
-            # 是文件
-            return currentEntity
-        elif isinstance(currentEntity, EntityFolder):
-            # 是文件夹
-
+        current_folder = root_folder
+        while True:
             # 如果当前文件夹内部隐藏了，则直接返回当前文件夹
-            if currentEntity.is_hide_inner:
-                return currentEntity
-
+            if current_folder.is_hide_inner:
+                return current_folder
             # 看看是不是击中了内部的东西
-            for child in currentEntity.children:
+            for child in current_folder.get_children_at_location(location_world):
                 if isinstance(child, EntityFile):
-                    # 是否击中文件
-                    if child.body_shape.is_contain_point(location_world):
-                        return child
-
-                elif isinstance(child, EntityFolder):
-                    # 是否击中文件夹
-                    res = self._get_entity_by_location_dfs(location_world, child)
-                    if res is not None:
-                        return res
-
-            # 未击中任何内部的东西，则返回当前文件夹
-            return currentEntity
-        else:
-            raise ValueError("Unknown entity type")
+                    return child
+                current_folder = child
+                break
+            else:
+                # 未击中任何内部的东西，则返回当前文件夹
+                return current_folder
@@ -0,0 +1,150 @@
+"""
+文件夹监视者，监视当前打开的文件夹，把文件系统的变化增量地合并进文件夹树
+底层用 QFileSystemWatcher，linux 下就是 inotify，windows 下是 ReadDirectoryChangesW
+"""
+
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+from entity.entity_folder import (
+    EntityFolder,
+    relayout_dirty_folders,
+    relayout_dirty_treemap,
+)
+from file_observer import FileObserver
+
+
+class FolderWatcher(QObject):
+    """
+    变化事件先攒起来，安静一段时间之后才一次性处理，
+    比如 git checkout 改动了两万个文件，最后也只会合并一次、重新排列一次
+    """
+
+    # 一批变化合并进树结构之后发出
+    tree_patched = pyqtSignal()
+
+    # 最后一个事件之后等待多久再处理
+    DEBOUNCE_MS = 300
+    # 事件一直不停的时候，最多攒多久就必须处理一次
+    MAX_WAIT_MS = 2000
+    # 监视的目录数量上限，linux下inotify默认的 max_user_watches 可能只有8192
+    MAX_WATCHED_DIRS = 8000
+
+    def __init__(self, observer: FileObserver, parent=None):
+        super().__init__(parent)
+        self._observer = observer
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+
+        # 攒起来的发生了变化的目录
+        self._dirty_paths: set[str] = set()
+
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(self.DEBOUNCE_MS)
+        self._debounce_timer.timeout.connect(self._apply_changes)
+
+        self._max_wait_timer = QTimer(self)
+        self._max_wait_timer.setSingleShot(True)
+        self._max_wait_timer.setInterval(self.MAX_WAIT_MS)
+        self._max_wait_timer.timeout.connect(self._apply_changes)
+
+    @property
+    def is_watching(self) -> bool:
+        return bool(self._watcher.directories())
+
+    def start(self):
+        """
+        开始监视当前打开的文件夹
+        :return:
+        """
+        self.stop()
+        self._sync_watched_paths()
+
+    def stop(self):
+        """
+        停止监视，丢弃还没处理的变化
+        :return:
+        """
+        watched = self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+        self._dirty_paths.clear()
+        self._debounce_timer.stop()
+        self._max_wait_timer.stop()
+
+    def refresh_watched_paths(self):
+        """
+        树结构在别处发生了变化（比如按需扫描接上了新的内容）之后调用，只在监视中时生效
+        :return:
+        """
+        if self.is_watching:
+            self._sync_watched_paths()
+
+    def _on_directory_changed(self, path: str):
+        self._dirty_paths.add(path.replace("\\", "/"))
+        # 每来一个事件都重新计时，直到安静下来
+        self._debounce_timer.start()
+        if not self._max_wait_timer.isActive():
+            self._max_wait_timer.start()
+
+    def _apply_changes(self):
+        """
+        把攒起来的变化一次性合并进树结构，然后重新排列发生变化的文件夹
+        :return:
+        """
+        self._debounce_timer.stop()
+        self._max_wait_timer.stop()
+        if not self._dirty_paths:
+            return
+        dirty_paths = self._dirty_paths
+        self._dirty_paths = set()
+
+        changed_folders: list[EntityFolder] = []
+        for path in dirty_paths:
+            folder = self._observer.get_folder_by_path(path)
+            if folder is None:
+                # 被排除了，或者连同父文件夹一起被删掉了
+                continue
+            if folder.is_lazy_pending:
+                # 按需扫描中还没有列出过内容，等真正扫描它的时候自然是最新的
+                continue
+            folder.update_self_content()
+            changed_folders.append(folder)
+        if not changed_folders:
+            return
+
+        if self._observer.is_treemap_layout:
+            # 只重新切分权重变了的文件夹，以及分到的矩形变了的文件夹
+            relayout_dirty_treemap(self._observer.root_folder)
+        else:
+            # 只有第一层真的有增删的文件夹才重新排列，新增的放进空位，原有的不动
+            relayout_dirty_folders(self._observer.root_folder)
+
+        self._sync_watched_paths()
+        self.tree_patched.emit()
+
+    def _sync_watched_paths(self):
+        """
+        让监视的目录和当前树中的文件夹保持一致，超过上限时优先监视浅层的目录
+        :return:
+        """
+        root_folder = self._observer.root_folder
+        wanted: list[str] = []
+        if root_folder is not None:
+            queue = [root_folder]
+            index = 0
+            while index < len(queue) and len(wanted) < self.MAX_WATCHED_DIRS:
+                folder = queue[index]
+                index += 1
+                wanted.append(folder.full_path)
+                queue.extend(
+                    child for child in folder.children if isinstance(child, EntityFolder)
+                )
+        wanted_set = set(wanted)
+        watched_set = set(self._watcher.directories())
+        removed = [path for path in watched_set if path not in wanted_set]
+        if removed:
+            self._watcher.removePaths(removed)
+        added = [path for path in wanted if path not in watched_set]
+        if added:
+            self._watcher.addPaths(added)
@@ -1,7 +1,8 @@
 import json
+import os
 import traceback
 
-from PyQt5.QtCore import Qt, QTimer, QUrl
+from PyQt5.QtCore import QEvent, Qt, QTimer, QUrl
 from PyQt5.QtGui import (
     QPainter,
     QMouseEvent,
@@ -20,6 +21,7 @@ from PyQt5.QtWidgets import (
     QFileDialog,
     QMessageBox,
     QPushButton,
+    QInputDialog,
 )
 
 from camera import Camera
@@ -27,9 +29,10 @@ from data_struct.number_vector import NumberVector
 from data_struct.rectangle import Rectangle
 from entity.entity import Entity
 from entity.entity_file import EntityFile
-from entity.entity_folder import EntityFolder
+from entity.entity_folder import EntityFolder, relayout_dirty_folders
 from exclude_dialog import ExcludeDialog
 from file_observer import FileObserver, InteractiveState
+from folder_watcher import FolderWatcher
 from file_openner import open_file
 from paint.paint_elements import (
     paint_grid,
@@ -42,8 +45,12 @@ from paint.paint_elements import (
 )
 from paint.paintables import PaintContext
 from paint.painters import VisualFilePainter
+from paint.tile_cache import TileCache
 from style.styles import EntityFolderDefaultStyle
-from tools.threads import OpenFolderThread
+from tools.layout_memo import LAYOUT_MEMO
+from tools.open_progress import OpenProgressSnapshot
+from tools.threads import LoadLazyFoldersThread, OpenFolderThread
+from tools.tree_walk import iter_preorder
 
 from assets import assets
 
@@ -52,6 +59,19 @@ from assets import assets
 # 只是为了让pyinstaller打包时能打包到exe文件中。
 # 需要进入assets文件夹后在命令行输入指令 `pyrcc5 image.rcc -o assets.py` 来更新assets.py文件
 
+# 这些输入事件可能会改变画面（移动视野、拖拽、框选……），收到之后需要重绘
+_REPAINT_EVENT_TYPES = frozenset(
+    [
+        QEvent.MouseButtonPress,
+        QEvent.MouseButtonRelease,
+        QEvent.MouseButtonDblClick,
+        QEvent.MouseMove,
+        QEvent.Wheel,
+        QEvent.KeyPress,
+        QEvent.KeyRelease,
+    ]
+)
+
 
 class Canvas(QMainWindow):
 
@@ -59,6 +79,11 @@ class Canvas(QMainWindow):
         super().__init__()
 
         self._open_folder_thread = None
+        # 按需扫描时在后台扫描更深内容的线程
+        self._lazy_load_thread: LoadLazyFoldersThread | None = None
+        self._lazy_check_countdown = 0
+        # 正在进行的打开操作的最新进度
+        self._open_progress: OpenProgressSnapshot | None = None
         # 界面初始化
         self.zoom_in_button = QPushButton("透视+", self)
         self.zoom_out_button = QPushButton("透视-", self)
@@ -67,11 +92,29 @@ class Canvas(QMainWindow):
         # 重要对象绑定
         self.camera = Camera(NumberVector.zero(), 1920, 1080)
         self.file_observer = FileObserver()
+        # 监视打开的文件夹的变化，默认关闭
+        self.folder_watcher = FolderWatcher(self.file_observer, self)
+        self.folder_watcher.tree_patched.connect(self.on_folder_watcher_patched)
+        self._is_watch_folder = False
+
+        # 视野静止或者只是平移时，用缓存的瓦片贴图代替每一帧重新绘制整棵树
+        self.tile_cache = TileCache()
+        self._is_tile_cache_enabled = True
+        # 上一帧的缩放比例，缩放还在变化时不使用瓦片
+        self._last_paint_scale = 0.0
 
         # 创建一个定时器用于定期更新窗口
+        # 只在有东西变化（相机在动、收到输入、后台任务有了结果……）时才运行，空闲时停下，不占CPU
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.tick)
         self.timer.setInterval(16)  # 1000/60 大约= 16ms
+        # 下一帧是否需要重绘
+        self._is_dirty = True
+        # 视野或者树有变化之后，按需扫描还没有检查过要不要加载更深的内容
+        self._is_lazy_check_pending = True
+        # 所有菜单项触发之后都可能改变画面
+        for action in self.findChildren(QAction):
+            action.triggered.connect(lambda _checked=False: self.request_repaint())
         # 启动定时器
         self.timer.start()
 
@@ -93,9 +136,11 @@ class Canvas(QMainWindow):
         # 在界面右上角增加两个按钮“+”“-”
         self.zoom_in_button.setGeometry(140, 60, 100, 50)
         self.zoom_in_button.clicked.connect(lambda: self.camera.add_perspective_level())
+        self.zoom_in_button.clicked.connect(lambda: self.request_repaint())
         self.zoom_in_button.setStyleSheet("background-color: rgb(30, 215, 109);")
         self.zoom_out_button.setGeometry(20, 60, 100, 50)
         self.zoom_out_button.clicked.connect(lambda: self.camera.reduce_perspective_level())
+        self.zoom_out_button.clicked.connect(lambda: self.request_repaint())
         self.zoom_out_button.setStyleSheet("background-color: rgb(30, 215, 109);")
 
         # 创建菜单栏
@@ -110,6 +155,12 @@ class Canvas(QMainWindow):
         folder_menu.addAction(open_action)
         open_action.triggered.connect(self.on_open)
 
+        # 创建 取消打开 菜单项
+        cancel_open_action = QAction("取消打开", self)
+        cancel_open_action.setShortcut("Esc")
+        folder_menu.addAction(cancel_open_action)
+        cancel_open_action.triggered.connect(self.on_cancel_open)
+
         # 创建 "Update" 菜单项
         update_action = QAction("更新文件夹", self)
         update_action.setShortcut("Ctrl+U")
@@ -122,6 +173,54 @@ class Canvas(QMainWindow):
         folder_menu.addAction(exclude_action)
         exclude_action.triggered.connect(self.show_exclude_dialog)
 
+        # 创建 按需扫描 菜单项
+        lazy_scan_action = QAction("按需扫描（只扫描看得到的深度）", self)
+        lazy_scan_action.setCheckable(True)
+        folder_menu.addAction(lazy_scan_action)
+        lazy_scan_action.toggled.connect(self.on_lazy_scan_toggled)
+
+        # 创建 设置按需扫描深度 菜单项
+        lazy_scan_depth_action = QAction("设置按需扫描深度", self)
+        folder_menu.addAction(lazy_scan_depth_action)
+        lazy_scan_depth_action.triggered.connect(self.on_set_lazy_scan_depth)
+
+        # 创建 流式打开 菜单项
+        streaming_open_action = QAction("流式打开（边扫描边显示）", self)
+        streaming_open_action.setCheckable(True)
+        streaming_open_action.setChecked(True)
+        folder_menu.addAction(streaming_open_action)
+        streaming_open_action.toggled.connect(self.on_streaming_open_toggled)
+
+        # 创建 扫描缓存 菜单项
+        scan_cache_action = QAction("使用扫描缓存（再次打开更快）", self)
+        scan_cache_action.setCheckable(True)
+        scan_cache_action.setChecked(True)
+        folder_menu.addAction(scan_cache_action)
+        scan_cache_action.toggled.connect(self.on_scan_cache_toggled)
+
+        # 创建 使用排列缓存 菜单项
+        layout_memo_action = QAction("使用排列缓存（跳过没有变化的文件夹）", self)
+        layout_memo_action.setCheckable(True)
+        layout_memo_action.setChecked(True)
+        folder_menu.addAction(layout_memo_action)
+        layout_memo_action.toggled.connect(self.on_layout_memo_toggled)
+
+        # 创建 监视文件夹变化 菜单项
+        watch_folder_action = QAction("监视文件夹变化（自动更新）", self)
+        watch_folder_action.setCheckable(True)
+        folder_menu.addAction(watch_folder_action)
+        watch_folder_action.toggled.connect(self.on_watch_folder_toggled)
+
+        # 创建 设置扫描线程数 菜单项
+        scan_workers_action = QAction("设置扫描线程数", self)
+        folder_menu.addAction(scan_workers_action)
+        scan_workers_action.triggered.connect(self.on_set_scan_workers)
+
+        # 创建 设置排列进程数 菜单项
+        layout_workers_action = QAction("设置排列进程数", self)
+        folder_menu.addAction(layout_workers_action)
+        layout_workers_action.triggered.connect(self.on_set_layout_workers)
+
         # “布局”菜单
         layout_menu = menubar.addMenu("布局")
         assert layout_menu
@@ -136,6 +235,12 @@ class Canvas(QMainWindow):
         layout_menu.addAction(import_action)
         import_action.triggered.connect(self.on_import)
 
+        # 创建 按文件大小排列 菜单项
+        treemap_layout_action = QAction("按文件大小排列（矩形树图）", self)
+        treemap_layout_action.setCheckable(True)
+        layout_menu.addAction(treemap_layout_action)
+        treemap_layout_action.toggled.connect(self.on_treemap_layout_toggled)
+
         drag_lock = QAction("锁定拖拽", self)
         drag_lock.setShortcut("Ctrl+L")
         layout_menu.addAction(drag_lock)
@@ -180,6 +285,12 @@ class Canvas(QMainWindow):
             lambda: self.camera.set_scale_animation(False)
         )
 
+        tile_cache_action = QAction("瓦片缓存（视野静止时贴图）", self)
+        tile_cache_action.setCheckable(True)
+        tile_cache_action.setChecked(True)
+        view_menu.addAction(tile_cache_action)
+        tile_cache_action.toggled.connect(self.on_tile_cache_toggled)
+
         # 创建帮助说明菜单项
         help_menu = menubar.addMenu("帮助")
         assert help_menu
@@ -209,6 +320,141 @@ class Canvas(QMainWindow):
         dialog = ExcludeDialog(self)
         dialog.exec_()
 
+    def on_scan_cache_toggled(self, checked: bool):
+        self.file_observer.is_scan_cache_enabled = checked
+
+    @staticmethod
+    def on_layout_memo_toggled(checked: bool):
+        LAYOUT_MEMO.is_enabled = checked
+
+    def on_tile_cache_toggled(self, checked: bool):
+        self._is_tile_cache_enabled = checked
+        self.tile_cache.clear()
+
+    def on_watch_folder_toggled(self, checked: bool):
+        self._is_watch_folder = checked
+        if not checked:
+            self.folder_watcher.stop()
+        elif self.file_observer.root_folder is not None and not self._is_opening():
+            self.folder_watcher.start()
+
+    def on_folder_watcher_patched(self):
+        if self.file_observer.root_folder is None:
+            return
+        self.file_observer.folder_max_deep_index = (
+            self.file_observer.root_folder.count_deep_level()
+        )
+        # 选中的实体可能已经被删除了
+        self.file_observer.dragging_entity_list = []
+        self.tile_cache.clear()
+        self.request_repaint()
+
+    def _is_opening(self) -> bool:
+        """是否有正在进行的打开文件夹操作"""
+        return (
+            self._open_folder_thread is not None
+            and self._open_folder_thread.isRunning()
+        )
+
+    def on_cancel_open(self):
+        if self._is_opening():
+            assert self._open_folder_thread is not None
+            self._open_folder_thread.cancel()
+
+    def on_open_progress_changed(self, snapshot: OpenProgressSnapshot):
+        self._open_progress = snapshot
+        self.request_repaint()
+
+    def _open_progress_text(self) -> str:
+        if self._open_progress is None:
+            return "正在打开文件夹，请稍后...（按Esc取消）"
+        return f"{self._open_progress.to_text()}（按Esc取消）"
+
+    def on_streaming_open_toggled(self, checked: bool):
+        self.file_observer.is_streaming_open = checked
+
+    def on_treemap_layout_toggled(self, checked: bool):
+        self.file_observer.is_treemap_layout = checked
+        # 两种排列方式需要的扫描结果不同（是否有文件大小），所以重新打开当前的文件夹
+        if self.file_observer.root_folder is not None and not self._is_opening():
+            self._start_open_folder(self.file_observer.folder_full_path)
+
+    def on_lazy_scan_toggled(self, checked: bool):
+        self.file_observer.is_lazy_scan = checked
+
+    def on_set_lazy_scan_depth(self):
+        depth, ok = QInputDialog.getInt(
+            self,
+            "设置按需扫描深度",
+            "打开文件夹时先扫描多少层，更深的内容在需要显示时再扫描：",
+            self.file_observer.lazy_scan_depth,
+            1,
+            118,
+        )
+        if ok:
+            self.file_observer.lazy_scan_depth = depth
+
+    def _check_lazy_folders(self):
+        """
+        按需扫描时，定期看看视野内有没有需要显示内部、但还没扫描的文件夹，有则放到后台扫描
+        """
+        if (
+                not self._is_lazy_check_pending
+                or not self.file_observer.is_lazy_scan
+                or self._is_opening()
+        ):
+            self._is_lazy_check_pending = False
+            return
+        if self._lazy_load_thread is not None and self._lazy_load_thread.isRunning():
+            # 扫描结束之后会再检查一次
+            self._is_lazy_check_pending = False
+            return
+        self._lazy_check_countdown -= 1
+        if self._lazy_check_countdown > 0:
+            return
+        # 不用每一帧都找，大约0.2秒找一次
+        self._lazy_check_countdown = 12
+        self._is_lazy_check_pending = False
+        folders = self.file_observer.get_lazy_folders_to_load(self.camera)
+        if not folders:
+            return
+        self._lazy_load_thread = LoadLazyFoldersThread(self.file_observer, folders)
+        self._lazy_load_thread.finished.connect(self.on_lazy_folders_loaded)
+        self._lazy_load_thread.start()
+
+    def on_lazy_folders_loaded(self):
+        if self._lazy_load_thread is None:
+            return
+        if self.file_observer.attach_lazy_folders(self._lazy_load_thread.result):
+            self.folder_watcher.refresh_watched_paths()
+            self.tile_cache.clear()
+        # 接上的内容里可能还有需要继续加载的
+        self.request_repaint()
+
+    def on_set_scan_workers(self):
+        workers, ok = QInputDialog.getInt(
+            self,
+            "设置扫描线程数",
+            "同时列出目录的线程数（1表示串行扫描），下次打开文件夹时生效：",
+            self.file_observer.scan_workers,
+            1,
+            256,
+        )
+        if ok:
+            self.file_observer.scan_workers = workers
+
+    def on_set_layout_workers(self):
+        workers, ok = QInputDialog.getInt(
+            self,
+            "设置排列进程数",
+            "同时排列文件夹的进程数（1表示不使用多进程），下次打开文件夹时生效：",
+            self.file_observer.layout_workers,
+            1,
+            max(1, os.cpu_count() or 1),
+        )
+        if ok:
+            self.file_observer.layout_workers = workers
+
     @staticmethod
     def on_help():
         # 创建一个消息框
@@ -251,25 +497,72 @@ class Canvas(QMainWindow):
         QDesktopServices.openUrl(QUrl("https://www.bilibili.com/video/BV1qw4m1k7LD"))
 
     def on_open_folder_finish_slot(self):
-        self._is_open_folder = False
-        self.camera.reset()
-        self.camera.target_scale = 0.1
+        self._open_progress = None
+        self.tile_cache.clear()
+        self.request_repaint()
+        if self._open_folder_thread is not None and self._open_folder_thread.is_cancelled:
+            # 流式打开已经替换掉了原来的文件夹，只能清空；非流式打开则原来的文件夹保持不变
+            self.file_observer.abort_streaming_open()
+            self._is_open_folder = False
+            if self._is_watch_folder and self.file_observer.root_folder is not None:
+                self.folder_watcher.start()
+            return
+        if self.file_observer.is_streaming:
+            # 流式打开时视野一直可用，这里不再重置相机
+            self.file_observer.finish_streaming_open()
+        else:
+            self._is_open_folder = False
+            self.camera.reset()
+            self.camera.target_scale = 0.1
+        if self._is_watch_folder:
+            self.folder_watcher.start()
 
     def on_open(self):
+        if self._is_opening():
+            # 上一次打开还没有结束
+            return
         # 直接读取文件
         directory = QFileDialog.getExistingDirectory(self, "选择要直观化查看的文件夹")
 
         if directory:
-            # paint_alert_message(painter, self.camera, "请先打开文件夹")
-            self._is_open_folder = True
-            self._open_folder_thread = OpenFolderThread(self.file_observer, directory)
-            self._open_folder_thread.finished.connect(self.on_open_folder_finish_slot)
-            self._open_folder_thread.start()
+            self._start_open_folder(directory)
             # self.file_observer.update_file_path(directory)
             # self._is_open_folder = False
 
         pass
 
+    def _start_open_folder(self, directory: str):
+        """
+        在后台线程中打开文件夹
+        :param directory:
+        :return:
+        """
+        self.folder_watcher.stop()
+        if self._lazy_load_thread is not None:
+            # 旧文件夹的后台扫描结果已经用不上了
+            self._lazy_load_thread.cancel()
+        # paint_alert_message(painter, self.camera, "请先打开文件夹")
+        # 按文件大小排列需要整棵树都扫描完，不能边扫描边显示
+        is_streaming = (
+            self.file_observer.is_streaming_open
+            and not self.file_observer.is_treemap_layout
+        )
+        if is_streaming:
+            # 流式打开不遮挡画面，扫描好的部分会陆续显示出来
+            self.camera.reset()
+            self.camera.target_scale = 0.1
+        else:
+            self._is_open_folder = True
+        self._open_progress = None
+        self._open_folder_thread = OpenFolderThread(
+            self.file_observer, directory, is_streaming
+        )
+        self._open_folder_thread.progress_changed.connect(
+            self.on_open_progress_changed
+        )
+        self._open_folder_thread.finished.connect(self.on_open_folder_finish_slot)
+        self._open_folder_thread.start()
+
     def on_save(self):
 
         file_path, _ = QFileDialog.getSaveFileName(
@@ -294,9 +587,21 @@ class Canvas(QMainWindow):
     def on_update(self):
         if self.file_observer.root_folder is None:
             return
-        # BUG：新增的东西可能会导致父文件夹形状炸开散架
-        # 更新文件夹内容
-        self.file_observer.root_folder.update_tree_content()
+        if self.file_observer.is_streaming:
+            # 还在流式打开中，树结构还不完整
+            return
+        if self.file_observer.is_treemap_layout:
+            # 文件大小变化不会改变目录的修改时间，增量更新发现不了，只能整个重新扫描
+            if not self._is_opening():
+                self._start_open_folder(self.file_observer.folder_full_path)
+            return
+        # 更新文件夹内容，只重新列出修改时间变化了的目录
+        self.file_observer.root_folder.update_tree_content_incremental()
+        # 新增的东西放进所在文件夹的空位，原有的不动
+        relayout_dirty_folders(self.file_observer.root_folder)
+        # 选中的实体可能已经被删除了
+        self.file_observer.dragging_entity_list = []
+        self.tile_cache.clear()
         self.file_observer.folder_max_deep_index = (
             self.file_observer.root_folder.count_deep_level()
         )
@@ -318,6 +623,7 @@ class Canvas(QMainWindow):
                 self._is_updating_layout = True
                 self.file_observer.read_layout_dict(layout_dict)
                 self._is_updating_layout = False
+                self.tile_cache.clear()
             except Exception as e:
                 traceback.print_exc()
                 print(e)
@@ -328,10 +634,45 @@ class Canvas(QMainWindow):
     def on_reset_zoom(self):
         self.camera.reset()
 
+    def request_repaint(self):
+        """
+        有东西变化了，下一帧需要重绘，定时器停着的话重新启动
+        :return:
+        """
+        self._is_dirty = True
+        self._is_lazy_check_pending = True
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def event(self, a0: QEvent | None) -> bool:
+        if a0 is not None and a0.type() in _REPAINT_EVENT_TYPES:
+            self.request_repaint()
+        return super().event(a0)
+
     def tick(self):
+        # 这一帧相机还会动，包括动画的最后一帧
+        is_camera_moving = self.camera.is_animating
         self.camera.tick()
-        # 重绘窗口
-        self.update()
+        if is_camera_moving:
+            self._is_dirty = True
+            self._is_lazy_check_pending = True
+        if self.file_observer.is_streaming:
+            # 把扫描线程已经排列好的顶层子树挂上来
+            if self.file_observer.drain_streamed_entities():
+                self.tile_cache.clear()
+                self._is_dirty = True
+        self._check_lazy_folders()
+        if self._is_dirty:
+            # 重绘窗口
+            self._is_dirty = False
+            self.update()
+        elif (
+                not self.camera.is_animating
+                and not self.file_observer.is_streaming
+                and not self._is_lazy_check_pending
+        ):
+            # 什么都没有变化，停下定时器，等下一次 request_repaint
+            self.timer.stop()
         for entity in self.file_observer.dragging_entity_list:
             # 对比当前选中的实体矩形和视野矩形
             if self.camera.cover_world_rectangle.is_contain(entity.body_shape):
@@ -360,11 +701,12 @@ class Canvas(QMainWindow):
             paint_alert_message(painter, self.camera, "正在更新布局，请稍后...")
             return
         if self._is_open_folder:
-            paint_alert_message(painter, self.camera, "正在打开文件夹，请稍后...")
+            paint_alert_message(painter, self.camera, self._open_progress_text())
             return
         # 如果没有文件夹，绘制提示信息
         if self.file_observer.root_folder is None:
             paint_alert_message(painter, self.camera, "请先打开文件夹")
+
         # 画场景物体
 
         # 画各种矩形
@@ -373,11 +715,25 @@ class Canvas(QMainWindow):
             folder_style = EntityFolderDefaultStyle(
                 self.file_observer.root_folder, self.file_observer.folder_max_deep_index
             )
-            painter.setTransform(self.camera.get_world2view_transform())
-            folder_style.paint_objects(
-                PaintContext(VisualFilePainter(painter), self.camera)
-            )
-            painter.resetTransform()
+
+            def paint_world(world_painter: QPainter, camera: Camera):
+                folder_style.paint_objects(
+                    PaintContext(VisualFilePainter(world_painter), camera)
+                )
+
+            if self._is_tile_cache_usable():
+                self.tile_cache.set_render_state(
+                    (
+                        self.camera.perspective_level,
+                        self.file_observer.folder_max_deep_index,
+                    )
+                )
+                self.tile_cache.paint(painter, self.camera, paint_world)
+            else:
+                painter.setTransform(self.camera.get_world2view_transform())
+                paint_world(painter, self.camera)
+                painter.resetTransform()
+        self._last_paint_scale = self.camera.current_scale
         # 绘制选中的矩形的填充色
         for entity in self.file_observer.dragging_entity_list:
             paint_selected_rect(
@@ -425,35 +781,53 @@ class Canvas(QMainWindow):
                 f"拖拽锁定: {self.file_observer.is_drag_locked}",
                 f"鼠标状态: {self.file_observer.interactive_state.name}",
                 f"透视等级：{self.camera.perspective_level}",
-            ],
+            ]
+            + (
+                [
+                    "正在扫描文件夹，已扫描完的部分会陆续显示...",
+                    self._open_progress_text(),
+                ]
+                if self.file_observer.is_streaming
+                else []
+            ),
         )
 
-    def paint_folder_dfs(self, painter: QPainter, folder_entity: EntityFolder):
+    def _is_tile_cache_usable(self) -> bool:
         """
-        递归绘制文件夹，遇到视野之外的直接排除
+        缩放还在变化、正在拖拽实体、正在流式打开时，每一帧的画面都不一样，瓦片缓存不起作用，直接绘制更快
         """
-        # 先绘制本体
-        if folder_entity.body_shape.is_collision(self.camera.cover_world_rectangle):
-            paint_folder_rect(
-                painter,
-                self.camera,
-                folder_entity,
-                folder_entity.deep_level / self.file_observer.folder_max_deep_index,
+        return (
+            self._is_tile_cache_enabled
+            and self.camera.current_scale == self._last_paint_scale
+            and not self.file_observer.is_streaming
+            and not (
+                self.file_observer.interactive_state == InteractiveState.DRAG
+                and not self.file_observer.is_drag_locked
             )
-        else:
-            return
-        # 递归绘制子文件夹
-        for child in folder_entity.children:
-            if isinstance(child, EntityFolder):
-                self.paint_folder_dfs(painter, child)
-            elif isinstance(child, EntityFile):
-                if child.body_shape.is_collision(self.camera.cover_world_rectangle):
-                    paint_file_rect(
-                        painter,
-                        self.camera,
-                        child,
-                        child.deep_level / self.file_observer.folder_max_deep_index,
-                    )
+        )
+
+    def paint_folder_dfs(self, painter: QPainter, folder_entity: EntityFolder):
+        """
+        先序遍历绘制文件夹，遇到视野之外的直接排除
+        """
+        cover_world_rectangle = self.camera.cover_world_rectangle
+        # 只有本体在视野内的文件夹才继续遍历内部
+        painted_folder: EntityFolder | None = None
+
+        def get_children(entity: EntityFolder | EntityFile):
+            if entity is painted_folder:
+                return entity.children
+            return ()
+
+        for entity in iter_preorder(folder_entity, get_children):
+            if not entity.body_shape.is_collision(cover_world_rectangle):
+                continue
+            color_rate = entity.deep_level / self.file_observer.folder_max_deep_index
+            if isinstance(entity, EntityFolder):
+                paint_folder_rect(painter, self.camera, entity, color_rate)
+                painted_folder = entity
+            else:
+                paint_file_rect(painter, self.camera, entity, color_rate)
 
     def mousePressEvent(self, a0: QMouseEvent | None):
         assert a0 is not None
@@ -500,20 +874,8 @@ class Canvas(QMainWindow):
         选择current_folder中的实体
         选择框的起始点位置落在了什么文件夹里就直接决定它只能选中哪一个文件夹里的内容
         """
-        entity_list = []
-
-        if self.file_observer.select_rect_start_location is None:
-            return entity_list
-
-        folder = self.file_observer.get_folder_by_location(
-            self.file_observer.select_rect_start_location
-        )
-        if folder:
-            for child in folder.children:
-                if child.body_shape.is_collision(select_rect):
-                    entity_list.append(child)
-
-        return entity_list
+        # 文件夹的空间索引上增量地做范围查询，大文件夹里拖动选择框也不会卡
+        return list(self.file_observer.get_entities_in_select_rect(select_rect))
 
     def mouseMoveEvent(self, a0: QMouseEvent | None):
         assert a0 is not None
@@ -545,7 +907,7 @@ class Canvas(QMainWindow):
                         # 让它跟随鼠标移动
                         new_left_top = point_world_location - entity.dragging_offset
                         d_location = new_left_top - entity.body_shape.location_left_top
-                        entity.move(d_location)
+                        self._move_entity_and_invalidate_tiles(entity, d_location)
                 except Exception as e:
                     print(e)
                     traceback.print_exc()
@@ -561,6 +923,44 @@ class Canvas(QMainWindow):
             diff_location = current_mouse_move_location - self._last_mouse_move_location
             self.camera.location -= diff_location
 
+    def _move_entity_and_invalidate_tiles(
+            self, entity: EntityFile | EntityFolder, d_location: NumberVector
+    ):
+        """
+        拖拽移动实体，并丢弃受影响区域内的瓦片
+        移动会推开兄弟节点、让父文件夹伸缩，伸缩又可能推开父文件夹的兄弟……
+        所以向上找到第一个形状没有变化的文件夹，它的内部就包含了所有可能变化的地方
+        """
+        old_shapes = []
+        folder = entity.parent
+        while folder is not None:
+            old_shapes.append((folder, folder.body_shape.clone()))
+            folder = folder.parent
+        old_entity_shape = entity.body_shape.clone()
+        entity.move(d_location)
+
+        for folder, old_shape in old_shapes:
+            new_shape = folder.body_shape
+            if (
+                    new_shape.location_left_top == old_shape.location_left_top
+                    and new_shape.width == old_shape.width
+                    and new_shape.height == old_shape.height
+            ):
+                self.tile_cache.invalidate_rectangle(new_shape)
+                return
+        # 一直到最外层都有变化，范围是最外层移动前后的并集
+        old_shape, new_shape = old_entity_shape, entity.body_shape
+        if old_shapes:
+            old_shape, new_shape = old_shapes[-1][1], old_shapes[-1][0].body_shape
+        self.tile_cache.invalidate_rectangle(
+            Rectangle.from_edges(
+                min(old_shape.left(), new_shape.left()),
+                min(old_shape.top(), new_shape.top()),
+                max(old_shape.right(), new_shape.right()),
+                max(old_shape.bottom(), new_shape.bottom()),
+            )
+        )
+
     def mouseReleaseEvent(self, a0: QMouseEvent | None):
         assert a0 is not None
         point_view_location = NumberVector(a0.pos().x(), a0.pos().y())
@@ -649,9 +1049,12 @@ class Canvas(QMainWindow):
 
 
 def main():
+    import multiprocessing
     import sys
     import traceback
 
+    # 打包成可执行文件后，排列用的工作进程也是从这个入口启动的
+    multiprocessing.freeze_support()
     try:
         sys.excepthook = sys.__excepthook__
 
@@ -0,0 +1,61 @@
+"""
+文件夹的绘制缓存
+文件夹第一层的文件只是一堆矩形和名字，每一帧都在python里逐个绘制，文件一多就很慢。
+把它们录制成一个QPicture，之后每一帧在C++里整体回放，python这边只需要一次调用。
+文件夹第一层有任何变化时缓存作废（由文件夹负责），整个文件夹平移时只移动回放的原点。
+"""
+
+from typing import Callable
+
+from PyQt5.QtGui import QPainter, QPicture
+
+from paint.painters import VisualFilePainter
+
+
+class FolderPaintCache:
+    """
+    一个文件夹第一层的绘制缓存
+    """
+
+    def __init__(
+        self,
+        key: tuple,
+        record: Callable[[QPainter], None],
+        origin_x: float,
+        origin_y: float,
+        sub_folders: list,
+    ):
+        """
+        :param key: 录制时影响绘制结果的状态，状态不同时缓存不能用
+        :param record: 录制函数，传入的painter直接使用世界坐标绘制
+        :param origin_x: 录制的内容保存成相对于这一点的坐标，通常是文件夹的左上角
+        :param origin_y:
+        :param sub_folders: 第一层的子文件夹，录制时一起整理出来，省得每一帧都从子项里挑一遍
+        """
+        self.key = key
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.sub_folders = sub_folders
+        self._picture = QPicture()
+        painter = QPainter(self._picture)
+        painter.translate(-origin_x, -origin_y)
+        record(painter)
+        painter.end()
+
+    def translate(self, dx: float, dy: float):
+        """
+        文件夹整体平移
+        :param dx:
+        :param dy:
+        :return:
+        """
+        self.origin_x += dx
+        self.origin_y += dy
+
+    def replay(self, painter: VisualFilePainter):
+        """
+        回放录制的内容，painter 需要已经设置好世界坐标的变换
+        :param painter:
+        :return:
+        """
+        painter.paint_picture(self.origin_x, self.origin_y, self._picture)
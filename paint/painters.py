@@ -1,5 +1,5 @@
 from PyQt5.QtCore import QRectF, QPointF
-from PyQt5.QtGui import QPainter
+from PyQt5.QtGui import QFont, QFontMetrics, QPainter, QPen, QPicture
 
 from data_struct.rectangle import Rectangle
 from data_struct.text import Text
@@ -7,25 +7,108 @@ from data_struct.text import Text
 
 # 施工中...
 class VisualFilePainter:
+    """
+    画笔和字体通过 set_pen / set_font 设置，只在真正变化时才交给 QPainter
+    批量模式下（begin_batch 到 flush 之间）不会立即绘制，而是按画笔把矩形、按 (字体, 画笔) 把文字分组攒起来，
+    flush 时每组只调用一次 drawRects / 设置一次状态，python到Qt的调用次数和分组数成正比，而不是和图元数成正比
+    批量模式下先画所有矩形，再画所有文字，最后回放所有录制好的内容，同一类图元之间保持提交的先后顺序
+    画笔和字体按对象本身分组，调用者应该复用同一个对象，而不是每次新建一个相同的
+    """
+
     def __init__(self, painter: QPainter):
         self._painter = painter
+        self._pen: QPen | None = None
+        self._font: QFont | None = None
+        # 当前字体的度量，批量模式下不需要真的把字体设置给 QPainter 就能排版
+        self._font_metrics: QFontMetrics | None = None
+        self._font_metrics_cache: dict[int, tuple[QFont, QFontMetrics]] = {}
+        self._is_batching = False
+        # id(画笔) -> (画笔, 矩形)
+        self._rect_batches: dict[int, tuple[QPen | None, list[QRectF]]] = {}
+        # (id(字体), id(画笔)) -> (字体, 画笔, 文字)
+        self._text_batches: dict[
+            tuple[int, int], tuple[QFont | None, QPen | None, list[tuple[QPointF, str]]]
+        ] = {}
+        # (x, y, 录制好的内容)
+        self._pictures: list[tuple[float, float, QPicture]] = []
 
     def q_painter(self) -> QPainter:
         return self._painter
 
+    def set_pen(self, pen: QPen):
+        if pen is self._pen:
+            return
+        self._pen = pen
+        if not self._is_batching:
+            self._painter.setPen(pen)
+
+    def set_font(self, font: QFont):
+        if font is self._font:
+            return
+        self._font = font
+        cached = self._font_metrics_cache.get(id(font))
+        if cached is None:
+            cached = (font, QFontMetrics(font, self._painter.device()))
+            self._font_metrics_cache[id(font)] = cached
+        self._font_metrics = cached[1]
+        if not self._is_batching:
+            self._painter.setFont(font)
+
+    def begin_batch(self):
+        """
+        进入批量模式，之后的绘制都先攒起来，直到 flush
+        :return:
+        """
+        self._is_batching = True
+
+    def flush(self):
+        """
+        把攒起来的图元一次性画出来，并退出批量模式
+        :return:
+        """
+        painter = self._painter
+        for pen, rects in self._rect_batches.values():
+            if pen is not None:
+                painter.setPen(pen)
+            painter.drawRects(rects)
+        for font, pen, texts in self._text_batches.values():
+            if font is not None:
+                painter.setFont(font)
+            if pen is not None:
+                painter.setPen(pen)
+            for point, str_text in texts:
+                painter.drawText(point, str_text)
+        for x, y, picture in self._pictures:
+            painter.drawPicture(QPointF(x, y), picture)
+        self._rect_batches.clear()
+        self._text_batches.clear()
+        self._pictures.clear()
+        self._is_batching = False
+        # 退出批量模式时 QPainter 的状态是最后一组的，和记录的不一定一致
+        if self._pen is not None:
+            painter.setPen(self._pen)
+        if self._font is not None:
+            painter.setFont(self._font)
+
     def paint_rect(self, rect: Rectangle):
-        self._painter.drawRect(
-            QRectF(
-                rect.location_left_top.x,
-                rect.location_left_top.y,
-                rect.width,
-                rect.height,
-            )
+        q_rect = QRectF(
+            rect.location_left_top.x,
+            rect.location_left_top.y,
+            rect.width,
+            rect.height,
         )
+        if self._is_batching:
+            batch = self._rect_batches.get(id(self._pen))
+            if batch is None:
+                batch = self._rect_batches[id(self._pen)] = (self._pen, [])
+            batch[1].append(q_rect)
+        else:
+            self._painter.drawRect(q_rect)
 
     def paint_text(self, text: Text):
-        ascent = self._painter.fontMetrics().ascent()
-        self._painter.drawText(
+        font_metrics = self._get_font_metrics()
+        ascent = font_metrics.ascent()
+        self._draw_text(
             QPointF(text.left_top.x, text.left_top.y + ascent), text.text
         )
 
@@ -35,13 +118,42 @@ class VisualFilePainter:
         :param str_text: 文本内容
         :param rect: 矩形框
         """
-        ascent = self._painter.fontMetrics().ascent()
-        text_width = self._painter.fontMetrics().width(str_text)
-        text_height = self._painter.fontMetrics().height()
-        self._painter.drawText(
+        font_metrics = self._get_font_metrics()
+        ascent = font_metrics.ascent()
+        text_width = font_metrics.width(str_text)
+        text_height = font_metrics.height()
+        self._draw_text(
             QPointF(
                 rect.location_left_top.x + (rect.width - text_width) / 2,
                 rect.location_left_top.y + (rect.height - text_height) / 2 + ascent,
             ),
             str_text
         )
+
+    def paint_picture(self, x: float, y: float, picture: QPicture):
+        """
+        回放录制好的内容
+        :param x: 录制内容的坐标原点对应的位置
+        :param y:
+        :param picture:
+        """
+        if self._is_batching:
+            self._pictures.append((x, y, picture))
+        else:
+            self._painter.drawPicture(QPointF(x, y), picture)
+
+    def _get_font_metrics(self) -> QFontMetrics:
+        if self._font_metrics is None:
+            # 没有通过 set_font 设置过字体，用 QPainter 自己的
+            return self._painter.fontMetrics()
+        return self._font_metrics
+
+    def _draw_text(self, point: QPointF, str_text: str):
+        if self._is_batching:
+            key = (id(self._font), id(self._pen))
+            batch = self._text_batches.get(key)
+            if batch is None:
+                batch = self._text_batches[key] = (self._font, self._pen, [])
+            batch[2].append((point, str_text))
+        else:
+            self._painter.drawText(point, str_text)
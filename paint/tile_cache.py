@@ -0,0 +1,180 @@
+"""
+瓦片缓存
+视野不动或者只是平移时，每一帧都把整棵树重新绘制一遍太浪费了。
+把世界按当前的缩放比例切成固定像素大小的瓦片，每个瓦片只绘制一次存成QPixmap，之后每一帧只需要贴图。
+每个缩放比例各有一套瓦片（瓦片金字塔），按最近使用的顺序淘汰，总内存不超过预算。
+实体移动或者变化时，只丢弃被波及区域内的瓦片，下次用到时再重新绘制。
+"""
+
+import math
+from collections import OrderedDict
+from typing import Callable
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPainter, QPixmap, QTransform
+
+from camera import Camera
+from data_struct.number_vector import NumberVector
+from data_struct.rectangle import Rectangle
+
+
+class TileCache:
+    """
+    瓦片用 (缩放比例, 列号, 行号) 标识，第 (tx, ty) 个瓦片覆盖的世界范围是
+    [tx * TILE_SIZE / scale, (tx + 1) * TILE_SIZE / scale) 乘上同样的纵向范围
+    贴图时所有瓦片使用同一个取整后的像素偏移，瓦片之间不会出现缝隙
+    """
+
+    # 瓦片边长，像素
+    TILE_SIZE = 512
+    # 绘制瓦片时向外多看的像素，让旁边瓦片里超出自身矩形的文字（比如隐藏内部的文件夹居中的名字）也能画进来
+    PAINT_MARGIN = 256
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        """
+        :param max_bytes: 所有瓦片占用内存的上限
+        """
+        self.max_bytes = max_bytes
+        # 按最近使用的顺序排列，最久没用的在最前面，什么都没画上的瓦片存为None，贴图时跳过
+        self._tiles: OrderedDict[tuple[float, int, int], QPixmap | None] = (
+            OrderedDict()
+        )
+        # 一个全透明瓦片的像素数据，用来判断瓦片是不是空的
+        self._blank_tile_bits: bytes | None = None
+        # 影响所有瓦片绘制结果的状态（比如透视等级），变化时整体作废
+        self._render_state: tuple = ()
+
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @property
+    def tile_bytes(self) -> int:
+        return self.TILE_SIZE * self.TILE_SIZE * 4
+
+    @property
+    def tile_count(self) -> int:
+        return len(self._tiles)
+
+    def clear(self):
+        """
+        丢弃所有瓦片，树结构整体变化时调用
+        :return:
+        """
+        self._tiles.clear()
+
+    def set_render_state(self, render_state: tuple):
+        """
+        设置影响绘制结果的全局状态，和之前不同时丢弃所有瓦片
+        :param render_state:
+        :return:
+        """
+        if render_state != self._render_state:
+            self._render_state = render_state
+            self.clear()
+
+    def invalidate_rectangle(self, rectangle: Rectangle):
+        """
+        丢弃所有缩放比例下和这个世界区域有关的瓦片
+        :param rectangle: 发生变化的世界区域，实体移动时应该包括移动前和移动后的位置
+        :return:
+        """
+        for key in list(self._tiles):
+            scale, tx, ty = key
+            world_size = self.TILE_SIZE / scale
+            world_margin = self.PAINT_MARGIN / scale
+            if (
+                tx * world_size - world_margin <= rectangle.right()
+                and (tx + 1) * world_size + world_margin >= rectangle.left()
+                and ty * world_size - world_margin <= rectangle.bottom()
+                and (ty + 1) * world_size + world_margin >= rectangle.top()
+            ):
+                del self._tiles[key]
+
+    def paint(
+        self,
+        painter: QPainter,
+        camera: Camera,
+        paint_world: Callable[[QPainter, Camera], None],
+    ):
+        """
+        用瓦片贴满整个视野，缺少的瓦片当场绘制
+        :param painter: 没有设置变换的、视野渲染坐标下的painter
+        :param camera:
+        :param paint_world: 绘制世界内容的函数，传入的painter已经设置好了世界坐标到瓦片像素的变换，
+        传入的camera的视野就是这个瓦片（再向外扩一点）
+        :return:
+        """
+        scale = camera.current_scale
+        size = self.TILE_SIZE
+        # 世界坐标 x 在屏幕上的位置是 x * scale + offset_x，所有瓦片共用取整后的偏移
+        offset_x = round(camera.view_width / 2 - camera.location.x * scale)
+        offset_y = round(camera.view_height / 2 - camera.location.y * scale)
+        first_column = math.floor(-offset_x / size)
+        last_column = math.floor((camera.view_width - offset_x) / size)
+        first_row = math.floor(-offset_y / size)
+        last_row = math.floor((camera.view_height - offset_y) / size)
+
+        for ty in range(first_row, last_row + 1):
+            for tx in range(first_column, last_column + 1):
+                key = (scale, tx, ty)
+                if key in self._tiles:
+                    self.hit_count += 1
+                    self._tiles.move_to_end(key)
+                    pixmap = self._tiles[key]
+                else:
+                    self.miss_count += 1
+                    pixmap = self._render_tile(camera, scale, tx, ty, paint_world)
+                    self._tiles[key] = pixmap
+                    self._evict()
+                if pixmap is not None:
+                    painter.drawPixmap(
+                        tx * size + offset_x, ty * size + offset_y, pixmap
+                    )
+
+    def _render_tile(
+        self,
+        camera: Camera,
+        scale: float,
+        tx: int,
+        ty: int,
+        paint_world: Callable[[QPainter, Camera], None],
+    ) -> QPixmap | None:
+        """
+        :return: 绘制好的瓦片，什么都没有画上时返回None
+        """
+        size = self.TILE_SIZE
+        margin = self.PAINT_MARGIN
+        image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        if self._blank_tile_bits is None:
+            self._blank_tile_bits = image.constBits().asstring(image.byteCount())
+
+        # 视野中心对准瓦片中心，视野比瓦片大一圈
+        tile_camera = Camera(
+            NumberVector((tx + 0.5) * size / scale, (ty + 0.5) * size / scale),
+            size + margin * 2,
+            size + margin * 2,
+        )
+        tile_camera.current_scale = scale
+        tile_camera.target_scale = scale
+        tile_camera.perspective_level = camera.perspective_level
+
+        tile_painter = QPainter(image)
+        # 扩大的视野的左上角才是视野渲染坐标的原点，瓦片的左上角在它向内 margin 的位置
+        tile_painter.setTransform(
+            tile_camera.get_world2view_transform()
+            * QTransform().translate(-margin, -margin)
+        )
+        paint_world(tile_painter, tile_camera)
+        tile_painter.end()
+        if image.constBits().asstring(image.byteCount()) == self._blank_tile_bits:
+            return None
+        return QPixmap.fromImage(image)
+
+    def _evict(self):
+        """
+        超出内存预算时淘汰最久没用的瓦片，空瓦片几乎不占内存，但也按一个瓦片计算
+        """
+        max_count = max(1, self.max_bytes // self.tile_bytes)
+        while len(self._tiles) > max_count:
+            self._tiles.popitem(last=False)
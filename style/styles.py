@@ -3,10 +3,14 @@ import math
 
 from PyQt5.QtGui import QPainter, QColor, QFont, QPen
 
+from data_struct.rectangle import Rectangle
 from entity.entity_file import EntityFile
 from entity.entity_folder import EntityFolder
+from paint.folder_paint_cache import FolderPaintCache
 from paint.paintables import PaintContext
+from paint.painters import VisualFilePainter
 from tools.color_utils import get_color_by_level
+from tools.tree_walk import iter_preorder_with_depth
 
 
 class Styleable(metaclass=ABCMeta):
@@ -23,6 +27,10 @@ class Styleable(metaclass=ABCMeta):
 
 
 class EntityFolderDefaultStyle(Styleable):
+    # 文件夹至少有这么大比例的面积在视野内时，第一层的文件用绘制缓存整体回放，
+    # 回放时不会剔除视野之外的内容，大部分文件都在视野之外时只绘制看得到的那些更快
+    PAINT_CACHE_MIN_VISIBLE_RATIO = 0.5
+
     def __init__(self, root_folder: EntityFolder, folder_max_deep_index: int):
         """构造方法
 
@@ -32,6 +40,12 @@ class EntityFolderDefaultStyle(Styleable):
         """
         self.root_folder = root_folder
         self.folder_max_deep_index = folder_max_deep_index
+        # 同一深度的实体共用同一个画笔对象，绘制时按画笔分组批量提交
+        self._pens: dict[int, QPen] = {}
+        self._folder_font = QFont("Consolas", 16)
+        self._file_font = QFont("Consolas", 14)
+        # 隐藏内部的文件夹的名字按缩放放大，字号 -> 字体
+        self._hide_inner_fonts: dict[int, QFont] = {}
 
     @staticmethod
     def calculate_deep(camera_current_scale: float) -> float:
@@ -48,65 +62,142 @@ class EntityFolderDefaultStyle(Styleable):
         else:
             return math.tan(camera_current_scale * (math.pi / 2)) * 10
 
-    def _paint_folder_dfs(
-        self, context: PaintContext, folder: EntityFolder, current_deep_index: int
-    ) -> None:
+    def _paint_folder_tree(self, context: PaintContext) -> None:
         """
-        递归绘制文件夹，遇到视野之外的直接排除
-        current_deep_index 从0开始，表示当前文件夹的深度
+        先序遍历绘制整棵文件夹树，遇到视野之外的文件夹，连同它的内部直接排除
+        每个文件夹只通过空间索引取出和视野相交的子项，视野之外的兄弟节点根本不会被访问到
+        文件夹第一层的文件通过绘制缓存整体回放，python里只需要继续遍历子文件夹
+        深度从0开始，根文件夹为0
         """
-        # 看看是否因为缩放太小，视野看到的太宏观，就不绘制太细节的东西
         exclude_level = context.camera.perspective_level
-        if current_deep_index != 0 and current_deep_index > exclude_level:
-            # print("skip folder deep index", current_deep_index)
-            return
-        q = context.painter.q_painter()
-        # 先绘制本体
-        if folder.body_shape.is_collision(context.camera.cover_world_rectangle):
-            color_rate = folder.deep_level / self.folder_max_deep_index
-            q.setPen(
-                QPen(get_color_by_level(color_rate), 1 / context.camera.current_scale)
-            )
-            if (
-                exclude_level < 2147483647
-                and math.floor(exclude_level) == current_deep_index
-            ):
-                # 这时代表文件夹内部已经不显示了，要将文件夹名字居中显示在中央
-                q.setFont(QFont("Consolas", int(16 / context.camera.current_scale)))
-                folder.is_hide_inner = True
-            else:
-                folder.is_hide_inner = False
-                if q.font().pointSize != 16:
-                    q.setFont(QFont("Consolas", 16))
-            folder.paint(context)
-        else:
-            return
-        # 递归绘制子文件夹
-        child_deep_index = current_deep_index + 1
-        for child in folder.children:
-            if isinstance(child, EntityFolder):
-                self._paint_folder_dfs(context, child, child_deep_index)
-            elif isinstance(child, EntityFile):
-                if child_deep_index > exclude_level:
-                    continue
-                if child.body_shape.is_collision(context.camera.cover_world_rectangle):
-                    color_rate = child.deep_level / self.folder_max_deep_index
-                    q.setPen(
-                        QPen(
-                            get_color_by_level(color_rate),
-                            1 / context.camera.current_scale,
+        cover_world_rectangle = context.camera.cover_world_rectangle
+        painter = context.painter
+        # 刚刚绘制了本体的文件夹，只有它的内部才需要继续遍历
+        # tree_walk 在处理完一个节点之后才取它的子节点，所以这里可以据此剪枝
+        painted_folder: EntityFolder | None = None
+        # 第一层的文件已经通过绘制缓存画好了的文件夹，继续遍历时只需要进入子文件夹
+        replayed_folder: EntityFolder | None = None
+
+        def get_children(entity: EntityFolder | EntityFile):
+            if entity is not painted_folder:
+                return ()
+            cache = entity.paint_cache
+            if entity is replayed_folder and cache is not None:
+                return [
+                    sub_folder
+                    for sub_folder in cache.sub_folders
+                    if sub_folder.body_shape.is_collision(cover_world_rectangle)
+                ]
+            return entity.get_children_in_rectangle(cover_world_rectangle)
+
+        for entity, current_deep_index in iter_preorder_with_depth(
+            self.root_folder, get_children
+        ):
+            # 看看是否因为缩放太小，视野看到的太宏观，就不绘制太细节的东西
+            if current_deep_index != 0 and current_deep_index > exclude_level:
+                continue
+            if not entity.body_shape.is_collision(cover_world_rectangle):
+                continue
+            painter.set_pen(self._get_pen(entity))
+            if isinstance(entity, EntityFolder):
+                if (
+                    exclude_level < 2147483647
+                    and math.floor(exclude_level) == current_deep_index
+                ):
+                    # 这时代表文件夹内部已经不显示了，要将文件夹名字居中显示在中央
+                    painter.set_font(
+                        self._get_hide_inner_font(
+                            int(16 / context.camera.current_scale)
                         )
                     )
-                    if q.font().pointSize != 14:
-                        q.setFont(QFont("Consolas", 14))
-                    child.paint(context)
+                    entity.is_hide_inner = True
+                else:
+                    entity.is_hide_inner = False
+                    painter.set_font(self._folder_font)
+                entity.paint(context)
+                painted_folder = entity
+                if current_deep_index + 1 <= exclude_level and self._is_mostly_visible(
+                    entity.body_shape, cover_world_rectangle
+                ):
+                    self._get_paint_cache(entity, context).replay(painter)
+                    replayed_folder = entity
+            else:
+                painter.set_font(self._file_font)
+                entity.paint(context)
+
+    def _is_mostly_visible(self, shape: Rectangle, cover: Rectangle) -> bool:
+        visible_width = min(shape.right(), cover.right()) - max(
+            shape.left(), cover.left()
+        )
+        visible_height = min(shape.bottom(), cover.bottom()) - max(
+            shape.top(), cover.top()
+        )
+        if visible_width <= 0 or visible_height <= 0:
+            return False
+        return (
+            visible_width * visible_height
+            >= shape.width * shape.height * self.PAINT_CACHE_MIN_VISIBLE_RATIO
+        )
+
+    def _get_pen(self, entity: EntityFolder | EntityFile) -> QPen:
+        """
+        按深度取颜色，线宽固定为屏幕上的1像素，和缩放无关，所以录制好的绘制缓存在任何缩放下都能用
+        """
+        pen = self._pens.get(entity.deep_level)
+        if pen is None:
+            pen = QPen(
+                get_color_by_level(entity.deep_level / self.folder_max_deep_index), 1
+            )
+            pen.setCosmetic(True)
+            self._pens[entity.deep_level] = pen
+        return pen
+
+    def _get_hide_inner_font(self, point_size: int) -> QFont:
+        font = self._hide_inner_fonts.get(point_size)
+        if font is None:
+            font = self._hide_inner_fonts[point_size] = QFont("Consolas", point_size)
+        return font
+
+    def _get_paint_cache(
+        self, folder: EntityFolder, context: PaintContext
+    ) -> FolderPaintCache:
+        """
+        获取文件夹第一层文件的绘制缓存，没有或者已经不能用了就重新录制
+        """
+        key = (self.folder_max_deep_index,)
+        paint_cache = folder.paint_cache
+        if paint_cache is not None and paint_cache.key == key:
+            return paint_cache
+
+        def record(q_painter: QPainter):
+            painter = VisualFilePainter(q_painter)
+            record_context = PaintContext(painter, context.camera)
+            painter.begin_batch()
+            painter.set_font(self._file_font)
+            for child in folder.children:
+                if isinstance(child, EntityFile):
+                    painter.set_pen(self._get_pen(child))
+                    child.paint(record_context)
+            painter.flush()
+
+        paint_cache = FolderPaintCache(
+            key,
+            record,
+            folder.body_shape.location_left_top.x,
+            folder.body_shape.location_left_top.y,
+            [child for child in folder.children if isinstance(child, EntityFolder)],
+        )
+        folder.paint_cache = paint_cache
+        return paint_cache
 
     def paint_objects(self, context: PaintContext) -> None:
         q = context.painter.q_painter()
         q.setBrush(QColor(255, 255, 255, 0))
         q.setRenderHint(QPainter.Antialiasing)
         q.setFont(QFont("Consolas", 16))
-        self._paint_folder_dfs(context, self.root_folder, 0)
+        context.painter.begin_batch()
+        self._paint_folder_tree(context)
+        context.painter.flush()
         q.setPen(QColor(0, 0, 0, 0))
         q.setBrush(QColor(0, 0, 0, 0))
         q.setRenderHint(QPainter.Antialiasing, False)
@@ -0,0 +1,67 @@
+"""
+第一层的空位
+运行：python -m pytest tests/test_free_space.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.free_space import FreeSpace  # noqa: E402
+
+MARGIN = 50
+
+
+def _assert_apart(boxes: list[tuple[float, float, float, float]]):
+    for i, a in enumerate(boxes):
+        for b in boxes[i + 1 :]:
+            assert (
+                b[0] >= a[2] + MARGIN - 1e-6
+                or a[0] >= b[2] + MARGIN - 1e-6
+                or b[1] >= a[3] + MARGIN - 1e-6
+                or a[1] >= b[3] + MARGIN - 1e-6
+            ), (a, b)
+
+
+def test_released_hole_is_reused():
+    boxes = [(0, 0, 200, 100), (250, 0, 450, 100), (500, 0, 700, 100)]
+    free_space = FreeSpace(boxes, (0, 0, 700, 100), MARGIN)
+    free_space.release(boxes.pop(1), boxes)
+    x, y = free_space.place(150, 100)
+    # 放进删掉的那个留下的洞，区域不用变大
+    assert (x, y) == (250, 0)
+    boxes.append((x, y, x + 150, y + 100))
+    _assert_apart(boxes)
+
+
+def test_placements_stay_apart():
+    generator = random.Random(1)
+    boxes = [(0, 0, 1000, 1000)]
+    free_space = FreeSpace(boxes, boxes[0], MARGIN)
+    for _ in range(200):
+        if len(boxes) > 1 and generator.random() < 0.3:
+            free_space.release(boxes.pop(generator.randrange(len(boxes))), boxes)
+            continue
+        width, height = generator.uniform(50, 400), generator.uniform(50, 400)
+        x, y = free_space.place(width, height)
+        boxes.append((x, y, x + width, y + height))
+    _assert_apart(boxes)
+
+
+def test_space_below_is_used():
+    boxes = [(0, 0, 1000, 1000), (1050, 0, 1300, 100)]
+    free_space = FreeSpace(boxes, (0, 0, 1300, 1000), MARGIN)
+    x, y = free_space.place(250, 800)
+    # 矮的那个下面还空着，区域不用变大
+    assert (x, y) == (1050, 150)
+    boxes.append((x, y, x + 250, y + 800))
+    _assert_apart(boxes)
+
+
+def test_translate():
+    free_space = FreeSpace([(0, 0, 200, 100)], (0, 0, 200, 100), MARGIN)
+    free_space.translate(1000, 500)
+    free_space.release((1000, 500, 1200, 600), [])
+    assert free_space.place(200, 100) == (1000, 500)
@@ -0,0 +1,112 @@
+"""
+编译好的.gitignore规则集
+运行：python -m pytest tests/test_gitignore_parser.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.gitignore_parser import handle_negation, parse_gitignore  # noqa: E402
+
+
+def _parse(tmp_path, text: str):
+    (tmp_path / ".gitignore").write_text(text)
+    base = os.path.abspath(tmp_path).replace("\\", "/")
+    compiled = parse_gitignore(f"{base}/.gitignore")
+    return compiled, lambda rel_path: f"{base}/{rel_path}"
+
+
+def test_negation(tmp_path):
+    compiled, path = _parse(tmp_path, "*.log\n!keep.log\n")
+    assert compiled(path("a.log"))
+    assert compiled(path("sub/a.log"))
+    # 被否定规则重新包含，和没有规则匹配是不同的结果
+    assert compiled.check(path("keep.log")) is False
+    assert compiled.check(path("sub/keep.log")) is False
+    assert compiled.check(path("a.txt")) is None
+
+
+def test_later_rule_wins(tmp_path):
+    compiled, path = _parse(tmp_path, "!keep.log\n*.log\n")
+    assert compiled(path("keep.log"))
+
+
+def test_directory_only(tmp_path):
+    compiled, path = _parse(tmp_path, "build/\n")
+    assert compiled.check(path("build"), is_dir=True) is True
+    assert compiled.check(path("build"), is_dir=False) is None
+    # 不知道是不是文件夹时，排除规则当作文件夹
+    assert compiled.check(path("build"), is_dir=None) is True
+    assert compiled(path("src/build"), is_dir=True)
+    # 被排除的文件夹里面的东西
+    assert compiled(path("build/x.o"), is_dir=False)
+    assert compiled(path("src/build/x.o"), is_dir=False)
+    assert not compiled(path("build.txt"), is_dir=False)
+
+
+def test_directory_only_negation(tmp_path):
+    compiled, path = _parse(tmp_path, "out*/\n!out_keep/\n")
+    assert compiled.check(path("out_keep"), is_dir=True) is False
+    assert compiled.check(path("out_other"), is_dir=True) is True
+    # 不知道是不是文件夹时，否定规则当作文件，所以不会重新包含
+    assert compiled.check(path("out_keep"), is_dir=None) is True
+    assert compiled.check(path("out_keep"), is_dir=False) is None
+
+
+def test_anchored(tmp_path):
+    compiled, path = _parse(tmp_path, "/top.txt\nsub/deep.txt\n/data/\n")
+    assert compiled(path("top.txt"))
+    assert not compiled(path("a/top.txt"))
+    # 中间有斜杠的规则也只相对于.gitignore所在的目录
+    assert compiled(path("sub/deep.txt"))
+    assert not compiled(path("a/sub/deep.txt"))
+    assert compiled(path("data"), is_dir=True)
+    assert not compiled(path("a/data"), is_dir=True)
+    assert compiled(path("data/x.txt"), is_dir=False)
+
+
+def test_double_asterisk(tmp_path):
+    compiled, path = _parse(tmp_path, "**/cache\nlogs/**\na/**/b\n")
+    assert compiled(path("cache"))
+    assert compiled(path("x/y/cache"))
+    assert compiled(path("logs/x"))
+    assert compiled(path("logs/x/y"))
+    assert not compiled(path("logs"))
+    assert compiled(path("a/b"))
+    assert compiled(path("a/x/y/b"))
+    assert not compiled(path("c/a/b"))
+
+
+def test_same_as_rule_by_rule(tmp_path):
+    compiled, path = _parse(
+        tmp_path,
+        "*.py[cod]\n__pycache__/\n/dist\ndocs/*.md\n!docs/README.md\n"
+        "**/tmp/**\nnode_modules\n!node_modules/keep\nbuild/\n!build/\n",
+    )
+    rel_paths = [
+        "a.pyc",
+        "x/a.pyo",
+        "a.py",
+        "__pycache__",
+        "x/__pycache__",
+        "x/__pycache__/a.pyc",
+        "dist",
+        "x/dist",
+        "docs/a.md",
+        "docs/README.md",
+        "docs/x/a.md",
+        "tmp/a",
+        "x/tmp/a/b",
+        "node_modules",
+        "node_modules/keep",
+        "node_modules/other",
+        "build",
+        "build/x",
+    ]
+    for rel_path in rel_paths:
+        # 不知道是不是文件夹时和原库挨个规则匹配的结果一致
+        assert compiled(path(rel_path)) == handle_negation(
+            path(rel_path), compiled.rules
+        ), rel_path
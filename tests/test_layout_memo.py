@@ -0,0 +1,63 @@
+"""
+排列缓存
+运行：python -m pytest tests/test_layout_memo.py
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import tools.layout_memo as layout_memo  # noqa: E402
+from tools.layout_memo import LayoutMemo, get_layout_key, pack_locations  # noqa: E402
+from tools.parallel_layout import layout_flat_tree  # noqa: E402
+
+
+def test_equal_sizes_give_equal_keys():
+    size = 1976.0
+    # 同一个 float 对象出现两次、int 和 float 混用，都不影响键
+    assert get_layout_key([size, size], [100, 100], 50) == get_layout_key(
+        [1976.0, float("1976")], [100.0, 100.0], 50.0
+    )
+    assert get_layout_key([1976], [100], 50) == get_layout_key([1976.0], [100.0], 50)
+
+
+def test_each_packed_folder_counts_once():
+    # 根节点下面：文件夹1（里面有文件夹2和一个文件）、文件夹6，其余是文件
+    parents = [-1, 0, 1, 2, 2, 1, 0, 6, 6]
+    is_folder = [True, True, True, False, False, False, True, False, False]
+    memo = LayoutMemo()
+
+    def layout(executor):
+        layout_flat_tree(
+            parents,
+            [0.0 if folder else 100.0 for folder in is_folder],
+            [0.0 if folder else 100.0 for folder in is_folder],
+            50,
+            50,
+            executor=executor,
+            task_size=5,
+            memo=memo,
+        )
+
+    # 两棵子树各是一个任务，先只用缓存试一次，没有缓存才交给工作线程
+    with ThreadPoolExecutor(2) as executor:
+        layout(executor)
+        assert (memo.hit_count, memo.miss_count) == (0, 4)
+        layout(executor)
+        assert (memo.hit_count, memo.miss_count) == (4, 4)
+
+
+def test_save_keeps_at_most_max_records(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(layout_memo, "MAX_SAVED_RECORD_COUNT", 2)
+    memo = LayoutMemo()
+    for count in range(1, 6):
+        pack_locations([100.0] * count, [100.0] * count, 50, memo)
+    assert memo.miss_count == 5
+    memo.save()
+
+    loaded = LayoutMemo()
+    loaded.load()
+    assert len(loaded._old_records) == 2
@@ -0,0 +1,101 @@
+"""
+按需扫描在后台加载文件夹
+运行：python -m pytest tests/test_lazy_scan.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from entity.entity_folder import get_sub_folders  # noqa: E402
+from file_observer import FileObserver  # noqa: E402
+from tools.tree_walk import iter_preorder  # noqa: E402
+
+
+def test_background_load_does_not_touch_live_tree(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.log\n")
+    folder_a = tmp_path / "a"
+    (folder_a / "b" / "c").mkdir(parents=True)
+    (folder_a / "x.txt").write_text("1")
+    (folder_a / "junk.log").write_text("1")
+
+    observer = FileObserver()
+    observer.is_scan_cache_enabled = False
+    observer.is_lazy_scan = True
+    observer.lazy_scan_depth = 1
+    observer.update_file_path(str(tmp_path))
+    pending = [
+        folder
+        for folder in iter_preorder(observer.root_folder, get_sub_folders)
+        if folder.is_lazy_pending
+    ]
+    assert pending
+    folder = pending[0]
+    live_parent = folder.parent
+    # 后台加载期间UI线程正在使用的缓存
+    sentinel = object()
+    live_parent.paint_cache = sentinel
+
+    loaded = observer.load_lazy_folders([folder])
+
+    assert live_parent.paint_cache is sentinel
+    loaded_folder = loaded[0][1]
+    assert loaded_folder.parent is None
+    names = {
+        entity.name for entity in iter_preorder(loaded_folder, get_sub_folders)
+    } | {
+        child.name
+        for sub in iter_preorder(loaded_folder, get_sub_folders)
+        for child in sub.children
+    }
+    assert "x.txt" in names
+    assert "junk.log" not in names
+
+    assert observer.attach_lazy_folders(loaded)
+    assert not folder.is_lazy_pending
+
+
+def test_attach_keeps_siblings_in_place(tmp_path):
+    for i in range(6):
+        (tmp_path / f"file_{i}.txt").write_text("1")
+        folder = tmp_path / f"folder_{i}" / "inner"
+        folder.mkdir(parents=True)
+        for j in range(i * 8):
+            (folder / f"file_with_a_long_name_{j}.txt").write_text("1")
+
+    observer = FileObserver()
+    observer.is_scan_cache_enabled = False
+    observer.is_lazy_scan = True
+    observer.lazy_scan_depth = 1
+    observer.update_file_path(str(tmp_path))
+    root = observer.root_folder
+    pending = [
+        folder
+        for folder in iter_preorder(root, get_sub_folders)
+        if folder.is_lazy_pending
+    ]
+    folder = max(pending, key=lambda f: len(f.full_path))
+    locations = {
+        child.name: (child.body_shape.left(), child.body_shape.top())
+        for child in root.children
+    }
+    root_location = (root.body_shape.left(), root.body_shape.top())
+
+    assert observer.attach_lazy_folders(observer.load_lazy_folders([folder]))
+
+    # 只有变大后挤到兄弟节点的文件夹自己可能挪位置，其余的都不动
+    top_folder = folder
+    while top_folder.parent is not root:
+        top_folder = top_folder.parent
+    for child in root.children:
+        if child is not top_folder:
+            assert (child.body_shape.left(), child.body_shape.top()) == locations[
+                child.name
+            ]
+    assert (root.body_shape.left(), root.body_shape.top()) == root_location
+    for sub in iter_preorder(root, get_sub_folders):
+        children = sub.children
+        for i, a in enumerate(children):
+            for b in children[i + 1 :]:
+                assert not a.body_shape.is_collision(b.body_shape, sub.PADDING - 1e-6)
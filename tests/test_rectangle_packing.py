@@ -0,0 +1,68 @@
+"""
+第一层的排列
+运行：python -m pytest tests/test_rectangle_packing.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from data_struct.number_vector import NumberVector  # noqa: E402
+from data_struct.rectangle import Rectangle  # noqa: E402
+from tools.rectangle_packing import (  # noqa: E402
+    _get_bounding_area,
+    sort_rectangle_compact,
+    sort_rectangle_greedy,
+)
+
+MARGIN = 50
+
+
+def _random_rectangles(count: int, seed: int) -> list[Rectangle]:
+    generator = random.Random(seed)
+    rectangles = []
+    for _ in range(count):
+        if generator.random() < 0.7:
+            # 文件，高度都一样
+            width, height = generator.choice([150, 200, 300]), 100
+        else:
+            width, height = generator.uniform(100, 2000), generator.uniform(150, 2000)
+        rectangles.append(Rectangle(NumberVector(0, 0), width, height))
+    return rectangles
+
+
+def _assert_apart(rectangles: list[Rectangle]):
+    rectangles = sorted(rectangles, key=lambda r: r.left())
+    for i, a in enumerate(rectangles):
+        for b in rectangles[i + 1 :]:
+            if b.left() >= a.right() + MARGIN - 1e-6:
+                break
+            assert (
+                b.top() >= a.bottom() + MARGIN - 1e-6
+                or a.top() >= b.bottom() + MARGIN - 1e-6
+            )
+
+
+def test_rectangles_keep_margin():
+    for count in (1, 2, 17, 300, 3000):
+        rectangles = _random_rectangles(count, count)
+        _assert_apart(sort_rectangle_compact(rectangles, MARGIN))
+
+
+def test_small_folders_are_not_looser_than_greedy():
+    for seed in range(200):
+        count = seed % 16 + 1
+        greedy = sort_rectangle_greedy(_random_rectangles(count, seed), MARGIN)
+        compact = sort_rectangle_compact(_random_rectangles(count, seed), MARGIN)
+        assert _get_bounding_area(compact) <= _get_bounding_area(greedy)
+
+
+def test_folders_below_hundred_are_not_looser_than_greedy():
+    # 贪心策略排列几十个矩形就要几秒，在 17..99 之间均匀取几个数量
+    for seed in range(8):
+        count = 17 + seed * 82 // 7
+        greedy = sort_rectangle_greedy(_random_rectangles(count, seed), MARGIN)
+        compact = sort_rectangle_compact(_random_rectangles(count, seed), MARGIN)
+        assert _get_bounding_area(compact) <= _get_bounding_area(greedy)
@@ -0,0 +1,97 @@
+"""
+空间索引和连续的范围查询
+运行：python -m pytest tests/test_spatial_index.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from data_struct.number_vector import NumberVector  # noqa: E402
+from data_struct.rectangle import Rectangle  # noqa: E402
+from tools.spatial_index import RangeQueryTracker, SpatialIndex  # noqa: E402
+
+
+def _random_rectangles(count: int, seed: int) -> list[Rectangle]:
+    # 坐标都是随机小数，不会恰好边界相接，索引和 is_collision 对相接的处理不同也没关系
+    generator = random.Random(seed)
+    return [
+        Rectangle(
+            NumberVector(generator.uniform(0, 5000), generator.uniform(0, 5000)),
+            generator.uniform(10, 300),
+            generator.uniform(10, 300),
+        )
+        for _ in range(count)
+    ]
+
+
+def _build_index(rectangles: list[Rectangle]) -> SpatialIndex:
+    return SpatialIndex(
+        [(r.left(), r.top(), r.right(), r.bottom()) for r in rectangles]
+    )
+
+
+def _brute_force(
+    rectangles: list[Rectangle], left: float, top: float, right: float, bottom: float
+) -> list[int]:
+    area = Rectangle(NumberVector(left, top), right - left, bottom - top)
+    return [i for i, r in enumerate(rectangles) if r.is_collision(area)]
+
+
+def _drag_boxes(seed: int, steps: int):
+    # 框选框的一角固定，另一角来回拖动，有时变大有时变小，也会越过固定的那个角
+    generator = random.Random(seed)
+    anchor_x, anchor_y = generator.uniform(1000, 4000), generator.uniform(1000, 4000)
+    x, y = anchor_x, anchor_y
+    for _ in range(steps):
+        x += generator.uniform(-400, 400)
+        y += generator.uniform(-400, 400)
+        yield min(anchor_x, x), min(anchor_y, y), max(anchor_x, x), max(anchor_y, y)
+
+
+def test_query_matches_brute_force():
+    rectangles = _random_rectangles(2000, 1)
+    index = _build_index(rectangles)
+    generator = random.Random(2)
+    for _ in range(100):
+        left, top = generator.uniform(-500, 5000), generator.uniform(-500, 5000)
+        right = left + generator.uniform(1, 2000)
+        bottom = top + generator.uniform(1, 2000)
+        assert index.query(left, top, right, bottom) == _brute_force(
+            rectangles, left, top, right, bottom
+        )
+    assert _build_index([]).query(0, 0, 100, 100) == []
+
+
+def test_query_after_translate():
+    rectangles = _random_rectangles(500, 3)
+    index = _build_index(rectangles)
+    index.translate(1000, -300)
+    index.translate(-0.5, 20)
+    for r in rectangles:
+        r.location_left_top = r.location_left_top + NumberVector(999.5, -280)
+    for box in _drag_boxes(4, 50):
+        assert index.query(*box) == _brute_force(rectangles, *box)
+
+
+def test_tracker_follows_growing_and_shrinking_box():
+    rectangles = _random_rectangles(2000, 5)
+    tracker = RangeQueryTracker(_build_index(rectangles))
+    for box in _drag_boxes(6, 300):
+        assert tracker.update(*box) == _brute_force(rectangles, *box)
+
+
+def test_tracker_after_translate():
+    rectangles = _random_rectangles(2000, 7)
+    index = _build_index(rectangles)
+    tracker = RangeQueryTracker(index)
+    boxes = list(_drag_boxes(8, 200))
+    for step, box in enumerate(boxes):
+        if step % 50 == 25:
+            # 拖动期间索引整体平移了，之前的结果作废
+            index.translate(120.25, -80.5)
+            for r in rectangles:
+                r.location_left_top = r.location_left_top + NumberVector(120.25, -80.5)
+        assert tracker.update(*box) == _brute_force(rectangles, *box)
@@ -0,0 +1,67 @@
+"""
+流式打开之后的增量更新
+运行：python -m pytest tests/test_streaming_open.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from entity.entity_folder import relayout_dirty_folders  # noqa: E402
+from file_observer import FileObserver  # noqa: E402
+
+
+def _open_streaming(path: str) -> FileObserver:
+    observer = FileObserver()
+    observer.is_scan_cache_enabled = False
+    observer.open_folder_streaming(path)
+    while observer.drain_streamed_entities(10**9):
+        pass
+    observer.finish_streaming_open()
+    return observer
+
+
+def _touch_dir(path: str):
+    # 有些文件系统的修改时间精度很粗，直接把时间往后拨，保证能看出变化
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_new_top_level_entry_is_placed_after_rescan(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "x.txt").write_text("1")
+    (tmp_path / ".gitignore").write_text("*.log\n")
+    observer = _open_streaming(str(tmp_path))
+    root = observer.root_folder
+
+    (tmp_path / "new_folder").mkdir()
+    (tmp_path / "new_folder" / "y.txt").write_text("1")
+    _touch_dir(str(tmp_path))
+    root.update_tree_content_incremental()
+
+    assert root.get_child("new_folder") is not None
+    assert relayout_dirty_folders(root)
+    children = root.children
+    for i, child in enumerate(children):
+        for other in children[i + 1 :]:
+            assert not child.body_shape.is_collision(other.body_shape)
+
+
+def test_root_gitignore_applies_when_relisting_top_level_folder(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "x.txt").write_text("1")
+    (tmp_path / ".gitignore").write_text("*.log\nnode_modules/\n")
+    observer = _open_streaming(str(tmp_path))
+    assert observer.root_folder.gitignore_stack
+
+    (tmp_path / "a" / "junk.log").write_text("1")
+    (tmp_path / "a" / "node_modules").mkdir()
+    (tmp_path / "a" / "kept.txt").write_text("1")
+    folder = observer.get_folder_by_path(str(tmp_path / "a"))
+    folder.update_self_content()
+
+    assert folder.get_child("kept.txt") is not None
+    assert folder.get_child("junk.log") is None
+    assert folder.get_child("node_modules") is None
@@ -0,0 +1,128 @@
+"""
+瓦片缓存，在没有显示器的环境下用 offscreen 平台绘制
+运行：python -m pytest tests/test_tile_cache.py
+"""
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtGui import QColor, QImage, QPainter  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from camera import Camera  # noqa: E402
+from data_struct.number_vector import NumberVector  # noqa: E402
+from data_struct.rectangle import Rectangle  # noqa: E402
+from paint.tile_cache import TileCache  # noqa: E402
+
+# QPixmap 需要先有 QApplication
+_APP = QApplication.instance() or QApplication([])
+
+SIZE = TileCache.TILE_SIZE
+
+
+class _World:
+    """
+    一些填充的矩形，记下每个瓦片被绘制了多少次
+    """
+
+    def __init__(self, rectangles: list[Rectangle]):
+        self.rectangles = rectangles
+        self.rendered: list[tuple[int, int]] = []
+
+    def paint(self, painter: QPainter, camera: Camera):
+        # 瓦片绘制时视野中心就是瓦片中心
+        tile_world_size = SIZE / camera.current_scale
+        self.rendered.append(
+            (
+                math.floor(camera.location.x / tile_world_size),
+                math.floor(camera.location.y / tile_world_size),
+            )
+        )
+        for rectangle in self.rectangles:
+            painter.fillRect(
+                int(rectangle.left()),
+                int(rectangle.top()),
+                int(rectangle.width),
+                int(rectangle.height),
+                QColor(255, 0, 0),
+            )
+
+
+def _camera(columns: int, rows: int, first_column: int = 0) -> Camera:
+    # 缩放比例为1，视野左上角正好对准第 (first_column, 0) 个瓦片的左上角，比整数个瓦片略小一点
+    width = columns * SIZE - 12
+    height = rows * SIZE - 12
+    location = NumberVector(first_column * SIZE + width / 2, height / 2)
+    return Camera(location, width, height)
+
+
+def _paint(cache: TileCache, camera: Camera, world: _World):
+    image = QImage(
+        int(camera.view_width), int(camera.view_height), QImage.Format_ARGB32
+    )
+    painter = QPainter(image)
+    cache.paint(painter, camera, world.paint)
+    painter.end()
+
+
+def test_only_invalidated_tiles_render_again():
+    moving = Rectangle(NumberVector(100, 100), 50, 50)
+    world = _World([moving, Rectangle(NumberVector(1200, 1200), 100, 100)])
+    cache = TileCache()
+    camera = _camera(4, 4)
+    _paint(cache, camera, world)
+    assert sorted(world.rendered) == [(x, y) for x in range(4) for y in range(4)]
+
+    world.rendered.clear()
+    _paint(cache, camera, world)
+    assert world.rendered == []
+
+    # 从第 (0, 0) 个瓦片移动到第 (2, 0) 个瓦片，移动前后的位置都要作废，
+    # 新位置离第 (1, 0) 个瓦片不到 PAINT_MARGIN，它也要重新绘制，其余的都不动
+    old_shape = moving.clone()
+    moving.location_left_top = NumberVector(1200, 200)
+    cache.invalidate_rectangle(old_shape)
+    cache.invalidate_rectangle(moving)
+    _paint(cache, camera, world)
+    assert sorted(world.rendered) == [(0, 0), (1, 0), (2, 0)]
+
+
+def test_invalidate_includes_paint_margin():
+    cache = TileCache()
+    world = _World([])
+    camera = _camera(4, 1)
+    _paint(cache, camera, world)
+    world.rendered.clear()
+    # 在第0个瓦片里面，但离第1个瓦片不到 PAINT_MARGIN，第1个瓦片绘制时也会看到它
+    cache.invalidate_rectangle(
+        Rectangle(NumberVector(SIZE - TileCache.PAINT_MARGIN + 10, 100), 50, 50)
+    )
+    _paint(cache, camera, world)
+    assert sorted(world.rendered) == [(0, 0), (1, 0)]
+
+
+def test_eviction_keeps_recently_used_tiles():
+    cache = TileCache(max_bytes=TileCache.TILE_SIZE**2 * 4 * 2)
+    world = _World([Rectangle(NumberVector(0, 0), 10, 10)])
+    for column in (0, 5, 0, 9):
+        _paint(cache, _camera(1, 1, column), world)
+        assert cache.tile_count <= 2
+    # 第5个最久没用，被淘汰了，第0个刚用过还在
+    world.rendered.clear()
+    _paint(cache, _camera(1, 1, 0), world)
+    assert world.rendered == []
+    _paint(cache, _camera(1, 1, 5), world)
+    assert world.rendered == [(5, 0)]
+
+
+def test_tile_count_never_exceeds_budget():
+    cache = TileCache(max_bytes=TileCache.TILE_SIZE**2 * 4 * 5)
+    world = _World([Rectangle(NumberVector(0, 0), 5000, 5000)])
+    _paint(cache, _camera(4, 4), world)
+    assert cache.tile_count == 5
+    # 一帧里需要的瓦片比预算多，多出来的也照样画出来
+    assert len(world.rendered) == 16
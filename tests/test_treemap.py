@@ -0,0 +1,140 @@
+"""
+矩形树图（按文件大小排列）
+运行：python -m pytest tests/test_treemap.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from entity.entity_folder import (  # noqa: E402
+    EntityFolder,
+    get_sub_folders,
+    relayout_dirty_treemap,
+)
+from file_observer import FileObserver  # noqa: E402
+from tools.tree_walk import iter_preorder  # noqa: E402
+from tools.treemap import squarify  # noqa: E402
+
+
+def _area(box) -> float:
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _assert_tiled(boxes, left: float, top: float, width: float, height: float):
+    for i, box in enumerate(boxes):
+        assert left - 1e-6 <= box[0] <= box[2] <= left + width + 1e-6
+        assert top - 1e-6 <= box[1] <= box[3] <= top + height + 1e-6
+        for other in boxes[i + 1 :]:
+            overlap_x = min(box[2], other[2]) - max(box[0], other[0])
+            overlap_y = min(box[3], other[3]) - max(box[1], other[1])
+            assert overlap_x <= 1e-6 or overlap_y <= 1e-6
+    # 互不重叠，都在里面，面积之和又等于整个矩形，就是正好铺满
+    total = sum(_area(box) for box in boxes)
+    assert abs(total - width * height) <= width * height * 1e-9
+
+
+def test_squarify_areas_and_tiling():
+    generator = random.Random(1)
+    for count in (1, 2, 3, 7, 50, 300):
+        weights = [
+            generator.choice([1, 10, 1000]) * generator.random() for _ in range(count)
+        ]
+        left, top = generator.uniform(-100, 100), generator.uniform(-100, 100)
+        width, height = generator.uniform(1, 3000), generator.uniform(1, 3000)
+        boxes = squarify(weights, left, top, width, height)
+        assert len(boxes) == count
+        _assert_tiled(boxes, left, top, width, height)
+        area_per_weight = width * height / sum(weights)
+        for weight, box in zip(weights, boxes):
+            assert abs(_area(box) - weight * area_per_weight) <= width * height * 1e-9
+
+
+def test_squarify_zero_weights():
+    boxes = squarify([0, 3, 0, 1], 10, 20, 400, 100)
+    assert _area(boxes[0]) == 0
+    assert _area(boxes[2]) == 0
+    assert abs(_area(boxes[1]) - 30000) < 1e-6
+    assert abs(_area(boxes[3]) - 10000) < 1e-6
+    _assert_tiled(boxes, 10, 20, 400, 100)
+    # 全是0时每一项都分到左上角的一个点
+    assert squarify([0, 0], 10, 20, 400, 100) == [(10, 20, 10, 20)] * 2
+
+
+def test_squarify_degenerate_rectangle():
+    assert squarify([], 0, 0, 100, 100) == []
+    for width, height in ((0, 100), (100, 0), (-5, 100)):
+        assert squarify([1, 2, 3], 7, 8, width, height) == [(7, 8, 7, 8)] * 3
+
+
+def _open_treemap(path: str) -> FileObserver:
+    observer = FileObserver()
+    observer.is_scan_cache_enabled = False
+    observer.is_treemap_layout = True
+    observer.update_file_path(path)
+    return observer
+
+
+def _count_weight(entity) -> int:
+    # 按定义重新数一遍：每个文件是 字节数 + 1，空文件夹按一个空文件算
+    if not isinstance(entity, EntityFolder):
+        return (entity.file_size or 0) + 1
+    return max(1, sum(_count_weight(child) for child in entity.children))
+
+
+def _assert_treemap(root: EntityFolder):
+    for folder in iter_preorder(root, get_sub_folders):
+        children = folder.children
+        shape = folder.body_shape
+        area_per_weight = None
+        for i, child in enumerate(children):
+            child_shape = child.body_shape
+            assert shape.left() - 1e-6 <= child_shape.left()
+            assert shape.top() - 1e-6 <= child_shape.top()
+            assert child_shape.right() <= shape.right() + 1e-6
+            assert child_shape.bottom() <= shape.bottom() + 1e-6
+            for other in children[i + 1 :]:
+                assert not child_shape.is_collision(other.body_shape, -1e-6)
+            ratio = child_shape.width * child_shape.height / _count_weight(child)
+            if area_per_weight is None:
+                area_per_weight = ratio
+            assert abs(ratio - area_per_weight) <= area_per_weight * 1e-6
+
+
+def _touch_dir(path: str):
+    # 有些文件系统的修改时间精度很粗，直接把时间往后拨，保证能看出变化
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_relayout_only_changed_path(tmp_path):
+    for name, count in (("a", 3), ("b", 5)):
+        (tmp_path / name / "inner").mkdir(parents=True)
+        for i in range(count):
+            (tmp_path / name / "inner" / f"{i}.txt").write_text("1" * (i * 100))
+    (tmp_path / "big.bin").write_text("1" * 5000)
+    observer = _open_treemap(str(tmp_path))
+    root = observer.root_folder
+    _assert_treemap(root)
+    root_box = (root.body_shape.left(), root.body_shape.top(), root.body_shape.width)
+
+    inner = root.get_child("b").get_child("inner")
+    (tmp_path / "b" / "inner" / "new.txt").write_text("1")
+    (tmp_path / "b" / "inner" / "new_folder").mkdir()
+    (tmp_path / "b" / "inner" / "new_folder" / "x.txt").write_text("1")
+    os.remove(tmp_path / "b" / "inner" / "0.txt")
+    _touch_dir(str(tmp_path / "b" / "inner"))
+    inner.update_self_content()
+
+    assert relayout_dirty_treemap(root)
+    assert not relayout_dirty_treemap(root)
+    assert inner.get_child("new_folder").get_child("x.txt") is not None
+    assert inner.get_child("0.txt") is None
+    _assert_treemap(root)
+    assert (
+        root.body_shape.left(),
+        root.body_shape.top(),
+        root.body_shape.width,
+    ) == root_box
@@ -0,0 +1,48 @@
+"""
+取消令牌
+耗时的后台操作（扫描、排列）在循环中不断检查令牌，
+其他线程调用 cancel 之后，后台操作在下一次检查时抛出 OperationCancelled 尽快退出
+"""
+
+import threading
+from typing import Optional
+
+
+class OperationCancelled(Exception):
+    """
+    后台操作被取消
+    """
+
+
+class CancelToken:
+    """
+    可以在任意线程调用 cancel，检查一次只是读取一个标志，开销很小，可以频繁检查
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """
+        已经被取消时抛出 OperationCancelled
+        :return:
+        """
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+def raise_if_cancelled(cancel_token: Optional[CancelToken]):
+    """
+    令牌可以为None（表示不可取消）时的简便写法
+    :param cancel_token:
+    :return:
+    """
+    if cancel_token is not None and cancel_token.is_cancelled:
+        raise OperationCancelled()
@@ -0,0 +1,68 @@
+"""
+基于 os.scandir 的目录扫描工具
+os.listdir + os.path.isdir 的组合会给每个子项多一次 stat 系统调用，
+而 scandir 在读取目录时就已经拿到了类型信息（linux 的 d_type，windows 的 FindNextFile），
+所以冷启动打开文件夹时，基本只需要每个目录一次系统调用。
+"""
+
+import os
+from typing import NamedTuple, Optional
+
+# windows 下 DirEntry.stat() 的结果是读目录时顺带拿到的，不需要额外的系统调用
+# 其他系统下调用 stat() 会真的去访问磁盘，所以不主动获取
+_IS_STAT_FREE = os.name == "nt"
+
+
+class ScanEntry(NamedTuple):
+    """
+    目录中的一项
+    """
+
+    name: str
+    full_path: str  # 已经保证是正斜杠
+    is_dir: bool
+    # 文件大小（字节），只从扫描时顺带拿到的stat结果中取，拿不到（需要额外系统调用）的时候为None
+    size: Optional[int]
+
+
+class DirListing(NamedTuple):
+    """
+    一个目录的扫描结果
+    """
+
+    # 目录自身的stat，在列目录之前获取，这样列目录期间发生的修改下次还能被发现
+    stat: Optional[os.stat_result]
+    # 列目录失败时为None，表示不知道里面有什么，而不是里面什么都没有
+    entries: Optional[list[ScanEntry]]
+
+
+def scan_dir(full_path: str, is_size_needed: bool = False) -> list[ScanEntry]:
+    """
+    列出一个目录下的所有子项，不递归
+    :param full_path: 目录路径，正斜杠
+    :param is_size_needed: 是否一定要拿到文件大小，为True时在没有免费stat结果的系统上也对每个文件stat一次
+    :return:
+    """
+    result = []
+    with os.scandir(full_path) as iterator:
+        for entry in iterator:
+            try:
+                # 和 os.path.isdir 一样会跟随软链接，但只有软链接才会真的触发 stat
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            size = None
+            if _IS_STAT_FREE or (is_size_needed and not is_dir):
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    pass
+            result.append(
+                ScanEntry(
+                    entry.name,
+                    os.path.join(full_path, entry.name).replace("\\", "/"),
+                    is_dir,
+                    size,
+                )
+            )
+    return result
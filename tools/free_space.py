@@ -0,0 +1,322 @@
+"""
+文件夹第一层的空位
+增量更新时，新增的实体放进文件夹里原有实体之间的空位，原有的实体一个都不动。
+空位保存在文件夹上，建好之后每放一个、删一个、动一个实体时就地更新，不需要每次都从所有实体重新找空位，
+所以一次增量更新的开销只和空位的数量有关，和文件夹里有多少实体无关。
+
+空位是若干个尽量大的矩形（MaxRects），可以互相重叠，放在某个空位里面的矩形和所有已有矩形的距离都不小于间隔。
+新建时只找已有实体下方和右方轮廓以外的空白，排列剩下的地方主要在这里，
+实体之间零碎的缝隙不算在内，要找出它们开销大得多，而且大多也放不下什么东西；
+之后删除的实体留下的洞，以及在区域外面放置时同一行（或同一列）剩下的部分也会变成空位。
+没有合适的空位时向右或向下扩大区域，选让总面积增长最少的位置。
+"""
+
+import heapq
+import math
+from typing import Sequence
+
+from tools.spatial_index import Box
+
+# 判断是否放得下、是否重叠时容忍的浮点误差，位置本身就是 右边 + 间隔 算出来的
+_EPSILON = 1e-6
+
+
+class FreeSpace:
+    """
+    一个矩形占住某处之后，和它太近的空位都去掉这一块，剩下的切成至多四块尽量大的矩形，
+    再去掉被别的空位包含的
+    坐标和 SpatialIndex 一样，整体平移时只记录偏移量
+    """
+
+    def __init__(self, occupied: Sequence[Box], region: Box, margin: float):
+        """
+        :param occupied: 已经摆好的矩形 (left, top, right, bottom)
+        :param region: 优先使用的区域，通常是文件夹内部，已有矩形超出这个区域时按包住它们的区域算，
+        放在它外面时会扩大它
+        :param margin: 矩形之间至少隔开的距离
+        """
+        self.margin = margin
+        for box in occupied:
+            region = _union(region, box)
+        self._region = region
+        self._rects: list[Box] = []
+        # 整体平移的累计偏移量，内部坐标加上它才是世界坐标
+        self._offset_x = 0.0
+        self._offset_y = 0.0
+        self._add_rects(_get_rects_below(occupied, region, margin))
+        # 转置之后的下方就是右方，每一行右边剩下的部分
+        self._add_rects(
+            [
+                _transpose(rect)
+                for rect in _get_rects_below(
+                    [_transpose(box) for box in occupied], _transpose(region), margin
+                )
+            ]
+        )
+        self._rects = _remove_contained(self._rects)
+
+    def __len__(self) -> int:
+        return len(self._rects)
+
+    def translate(self, dx: float, dy: float):
+        """
+        所有空位和区域整体平移
+        :param dx:
+        :param dy:
+        :return:
+        """
+        self._offset_x += dx
+        self._offset_y += dy
+
+    def place(self, width: float, height: float) -> tuple[float, float]:
+        """
+        为一个矩形找位置并占住它，之后放的不会和它重叠
+        优先放进让区域面积增长最少的空位，同样时放在最上面，再同样时放在最左边
+        :param width:
+        :param height:
+        :return: 矩形的左上角
+        """
+        margin = self.margin
+        region = self._region
+        region_area = _area(region)
+        # 紧贴着整个区域的右边和下边，一定是空的
+        best_rect: Box | None = None
+        best_x = region[2] + margin
+        best_y = region[1]
+        best_score = self._get_score(best_x, best_y, width, height, region_area)
+        x = region[0]
+        y = region[3] + margin
+        score = self._get_score(x, y, width, height, region_area)
+        if score < best_score:
+            best_x, best_y, best_score = x, y, score
+        for rect in self._rects:
+            # 贴着区域右边（下边）的空位向右（下）伸出去也是空的，放不下的部分伸出区域就行
+            right = rect[2] if rect[2] < region[2] - _EPSILON else math.inf
+            bottom = rect[3] if rect[3] < region[3] - _EPSILON else math.inf
+            if (
+                right - rect[0] + _EPSILON < width
+                or bottom - rect[1] + _EPSILON < height
+            ):
+                continue
+            score = self._get_score(rect[0], rect[1], width, height, region_area)
+            if score < best_score:
+                best_rect = rect
+                best_x, best_y, best_score = rect[0], rect[1], score
+
+        box = (best_x, best_y, best_x + width, best_y + height)
+        if best_rect is None and best_x > region[2]:
+            # 放在区域右边，区域向右扩大之后，它下面剩下的一条也是空的
+            self._add_rects(
+                [(box[0], box[3] + margin, box[2], max(region[3], box[3]))]
+            )
+        elif best_rect is None:
+            # 放在区域下边，它右边剩下的一条也是空的
+            self._add_rects(
+                [(box[2] + margin, box[1], max(region[2], box[2]), box[3])]
+            )
+        self._occupy(box)
+        return best_x + self._offset_x, best_y + self._offset_y
+
+    def occupy(self, box: Box):
+        """
+        有一个矩形移动到了这里或者变大了，和它太近的空位都切掉
+        :param box: (left, top, right, bottom)
+        :return:
+        """
+        self._occupy(self._to_local(box))
+
+    def release(self, box: Box, neighbors: Sequence[Box]):
+        """
+        一个矩形被删除了或者要挪走，它和四周间隔以内的地方变成空位，和相邻的空位连起来，
+        再去掉离其他矩形不到间隔的地方
+        :param box: (left, top, right, bottom)
+        :param neighbors: 离它不到两倍间隔的其他矩形，包括和它挤在一起的
+        :return:
+        """
+        box = self._to_local(box)
+        margin = self.margin
+        region = self._region
+        freed = (
+            max(box[0] - margin, region[0]),
+            max(box[1] - margin, region[1]),
+            min(box[2] + margin, region[2]),
+            min(box[3] + margin, region[3]),
+        )
+        merged = [freed]
+        for rect in self._rects:
+            merged.extend(_merge(rect, freed))
+        self._add_rects(merged)
+        self._rects = _remove_contained(self._rects)
+        for neighbor in neighbors:
+            self._occupy(self._to_local(neighbor))
+
+    def _occupy(self, box: Box):
+        margin = self.margin
+        # 离它不到间隔的地方都不能放
+        blocked = (box[0] - margin, box[1] - margin, box[2] + margin, box[3] + margin)
+        rects = []
+        pieces = []
+        for rect in self._rects:
+            if _is_overlapping(rect, blocked):
+                pieces.extend(_cut(rect, blocked))
+            else:
+                rects.append(rect)
+        # 切出来的都在原来的空位里面，原来的空位互不包含，所以只要检查切出来的会不会被包含
+        for piece in _remove_contained(pieces):
+            if (
+                piece[2] - piece[0] > _EPSILON
+                and piece[3] - piece[1] > _EPSILON
+                and not any(_contains(rect, piece) for rect in rects)
+            ):
+                rects.append(piece)
+        self._rects = rects
+        self._region = _union(self._region, box)
+
+    def _get_score(
+        self, x: float, y: float, width: float, height: float, region_area: float
+    ) -> tuple[float, float, float]:
+        grown_area = _area(_union(self._region, (x, y, x + width, y + height)))
+        return grown_area - region_area, y, x
+
+    def _add_rects(self, rects: list[Box]):
+        for rect in rects:
+            if rect[2] - rect[0] > _EPSILON and rect[3] - rect[1] > _EPSILON:
+                self._rects.append(rect)
+
+    def _to_local(self, box: Box) -> Box:
+        return (
+            box[0] - self._offset_x,
+            box[1] - self._offset_y,
+            box[2] - self._offset_x,
+            box[3] - self._offset_y,
+        )
+
+
+def _get_rects_below(
+    occupied: Sequence[Box], region: Box, margin: float
+) -> list[Box]:
+    """
+    已有矩形（四周留出间隔）下方轮廓以下、直到区域底边的空白
+    先扫描出轮廓：区域被竖着切成若干段，每段里再往下都没有矩形了；
+    再把每一段向左右延伸到比它更靠下的段为止，得到尽量宽的矩形
+    """
+    left, top, right, bottom = region
+    # (左边, 右边, 底边)，都留出了间隔，按左边排序
+    boxes = sorted(
+        (box[0] - margin, box[2] + margin, box[3] + margin) for box in occupied
+    )
+    xs = sorted(
+        {left, right} | {x for box in boxes for x in box[:2] if left < x < right}
+    )
+    # 轮廓的各段 (x0, x1, 这一段里最靠下的底边)
+    segments: list[tuple[float, float, float]] = []
+    # (-底边, 右边)，扫描到的位置上方覆盖着的矩形，已经扫过的在堆顶时才移除
+    heap: list[tuple[float, float]] = []
+    i = 0
+    for x0, x1 in zip(xs, xs[1:]):
+        while i < len(boxes) and boxes[i][0] <= x0:
+            heapq.heappush(heap, (-boxes[i][2], boxes[i][1]))
+            i += 1
+        while heap and heap[0][1] <= x0:
+            heapq.heappop(heap)
+        y = -heap[0][0] if heap else top
+        if segments and segments[-1][2] == y:
+            segments[-1] = (segments[-1][0], x1, y)
+        else:
+            segments.append((x0, x1, y))
+
+    # 每一段向左右延伸，碰到第一个更靠下的段为止
+    count = len(segments)
+    starts = [left] * count
+    ends = [right] * count
+    stack: list[int] = []
+    for j, segment in enumerate(segments):
+        while stack and segments[stack[-1]][2] <= segment[2]:
+            ends[stack.pop()] = segment[0]
+        if stack:
+            starts[j] = segments[stack[-1]][1]
+        stack.append(j)
+    return list(
+        {(starts[j], segments[j][2], ends[j], bottom) for j in range(count)}
+    )
+
+
+def _transpose(box: Box) -> Box:
+    return box[1], box[0], box[3], box[2]
+
+
+def _cut(rect: Box, blocked: Box) -> list[Box]:
+    """
+    从 rect 中去掉 blocked，剩下的部分是至多四块尽量大的矩形（可以互相重叠）
+    """
+    result = []
+    if rect[0] < blocked[0]:
+        result.append((rect[0], rect[1], blocked[0], rect[3]))
+    if blocked[2] < rect[2]:
+        result.append((blocked[2], rect[1], rect[2], rect[3]))
+    if rect[1] < blocked[1]:
+        result.append((rect[0], rect[1], rect[2], blocked[1]))
+    if blocked[3] < rect[3]:
+        result.append((rect[0], blocked[3], rect[2], rect[3]))
+    return result
+
+
+def _is_overlapping(a: Box, b: Box) -> bool:
+    return (
+        a[2] - b[0] > _EPSILON
+        and b[2] - a[0] > _EPSILON
+        and a[3] - b[1] > _EPSILON
+        and b[3] - a[1] > _EPSILON
+    )
+
+
+def _merge(a: Box, b: Box) -> list[Box]:
+    """
+    两个相接或者重叠的空位连起来：在公共的那一段上，竖着（横着）跨过两个空位的矩形
+    """
+    result = []
+    if (
+        min(a[2], b[2]) - max(a[0], b[0]) > _EPSILON
+        and a[1] <= b[3] + _EPSILON
+        and b[1] <= a[3] + _EPSILON
+    ):
+        result.append(
+            (max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3]))
+        )
+    if (
+        min(a[3], b[3]) - max(a[1], b[1]) > _EPSILON
+        and a[0] <= b[2] + _EPSILON
+        and b[0] <= a[2] + _EPSILON
+    ):
+        result.append(
+            (min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3]))
+        )
+    return result
+
+
+def _remove_contained(rects: list[Box]) -> list[Box]:
+    """
+    去掉被别的矩形包含的矩形（包括重复的）
+    """
+    result: list[Box] = []
+    for rect in sorted(rects, key=_area, reverse=True):
+        if not any(_contains(other, rect) for other in result):
+            result.append(rect)
+    return result
+
+
+def _contains(a: Box, b: Box) -> bool:
+    return (
+        a[0] <= b[0] + _EPSILON
+        and a[1] <= b[1] + _EPSILON
+        and b[2] <= a[2] + _EPSILON
+        and b[3] <= a[3] + _EPSILON
+    )
+
+
+def _union(a: Box, b: Box) -> Box:
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _area(box: Box) -> float:
+    return max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
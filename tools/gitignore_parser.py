@@ -5,12 +5,13 @@ https://github.com/mherrmann/gitignore_parser
 """
 
 import collections
+import functools
 import os
 import re
 
 from os.path import abspath, dirname
 from pathlib import Path
-from typing import Reversible, Union
+from typing import Optional, Reversible, Union
 
 
 def handle_negation(file_path, rules: Reversible["IgnoreRule"]):
@@ -20,7 +21,12 @@ def handle_negation(file_path, rules: Reversible["IgnoreRule"]):
     return False
 
 
-def parse_gitignore(full_path, base_dir=None):
+def parse_gitignore(full_path, base_dir=None) -> "CompiledGitignore":
+    """
+    解析一个.gitignore文件，返回编译好的匹配器
+    原库返回的是一个挨个规则匹配的lambda，这里改成了把所有规则编译成少数几个正则
+    返回值依然可以直接当作 matches_function(file_path) 调用
+    """
     if base_dir is None:
         base_dir = dirname(full_path)
     rules = []
@@ -34,12 +40,168 @@ def parse_gitignore(full_path, base_dir=None):
             )
             if rule:
                 rules.append(rule)
-    if not any(r.negation for r in rules):
-        return lambda file_path: any(r.match(file_path) for r in rules)
-    else:
-        # We have negation rules. We can't use a simple "any" to evaluate them.
-        # Later rules override earlier rules.
-        return lambda file_path: handle_negation(file_path, rules)
+    return CompiledGitignore(rules, base_dir)
+
+
+class _RuleGroup:
+    """
+    一段连续的、否定与否相同的规则，合并编译
+    只和文件名有关的规则（最常见的情况，如 *.pyc、node_modules）只对最后一级名字做一次 fullmatch，
+    没有通配符的直接放进集合里查，其余和路径有关的规则才对整个相对路径做 search
+    """
+
+    def __init__(self, rules: list["IgnoreRule"]):
+        self.negation = rules[0].negation
+        # 对文件和文件夹都适用的规则
+        any_names: set[str] = set()
+        any_name_patterns = []
+        any_path_patterns = []
+        # 只有路径本身是文件夹时才适用的规则
+        dir_names: set[str] = set()
+        dir_name_patterns = []
+        dir_path_patterns = []
+        # 路径在某个被这些规则排除的文件夹里面
+        inside_path_patterns = []
+        for rule in rules:
+            if rule.basename is not None:
+                if rule.directory_only:
+                    dir_names.add(rule.basename)
+                else:
+                    any_names.add(rule.basename)
+            elif rule.basename_regex is not None:
+                if rule.directory_only:
+                    dir_name_patterns.append(rule.basename_regex)
+                else:
+                    any_name_patterns.append(rule.basename_regex)
+            elif rule.directory_only:
+                dir_path_patterns.append(rule.core_regex + "$")
+                if not rule.negation:
+                    inside_path_patterns.append(rule.core_regex + "/")
+            else:
+                any_path_patterns.append(rule.regex)
+
+        self._any_names = frozenset(any_names)
+        self._any_name_match = _compile_alternation(any_name_patterns, fullmatch=True)
+        self._any_path_search = _compile_alternation(any_path_patterns)
+        self._dir_names = frozenset(dir_names)
+        self._dir_name_match = _compile_alternation(dir_name_patterns, fullmatch=True)
+        self._dir_path_search = _compile_alternation(dir_path_patterns)
+        self._inside_path_search = _compile_alternation(inside_path_patterns)
+        # 被排除的文件夹里面的东西也都被排除，所以祖先文件夹的名字也要检查
+        self._is_check_ancestors = not self.negation and bool(
+            self._dir_names or self._dir_name_match
+        )
+
+    def _match_dir_name(self, name: str) -> bool:
+        return name in self._dir_names or (
+            self._dir_name_match is not None and self._dir_name_match(name) is not None
+        )
+
+    def match(self, rel_path: str, is_dir: Optional[bool]) -> bool:
+        """
+        :param rel_path: 相对于规则所在目录的路径，正斜杠，不以斜杠结尾
+        :param is_dir: 不知道时为None，按原库的行为处理：排除规则当作文件夹，否定规则当作文件
+        """
+        if is_dir is None:
+            is_dir = not self.negation
+        slash_index = rel_path.rfind("/")
+        name = rel_path[slash_index + 1 :]
+        if name in self._any_names:
+            return True
+        if self._any_name_match is not None and self._any_name_match(name):
+            return True
+        if self._any_path_search is not None and self._any_path_search(rel_path):
+            return True
+        if is_dir:
+            if self._match_dir_name(name):
+                return True
+            if self._dir_path_search is not None and self._dir_path_search(rel_path):
+                return True
+        if slash_index != -1:
+            if self._is_check_ancestors and any(
+                self._match_dir_name(ancestor_name)
+                for ancestor_name in rel_path[:slash_index].split("/")
+            ):
+                return True
+            if self._inside_path_search is not None and self._inside_path_search(
+                rel_path
+            ):
+                return True
+        return False
+
+
+def _compile_alternation(patterns: list[str], fullmatch: bool = False):
+    if not patterns:
+        return None
+    compiled = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+    return compiled.fullmatch if fullmatch else compiled.search
+
+
+class CompiledGitignore:
+    """
+    编译好的一个.gitignore规则集
+    只在字符串上操作，不再为每个路径构造 Path 对象
+    后面的规则优先级更高（可以用否定规则把前面排除的东西再加回来），
+    所以把规则按否定与否切成几段，从后往前匹配，第一个匹配上的段决定结果
+    """
+
+    def __init__(self, rules: list["IgnoreRule"], base_dir: str):
+        self.rules = rules
+        self.base_path = _normalize_path_str(base_dir)
+        self._base_prefix = self.base_path.rstrip("/") + "/"
+        groups: list[_RuleGroup] = []
+        start = 0
+        for i in range(1, len(rules) + 1):
+            if i == len(rules) or rules[i].negation != rules[start].negation:
+                groups.append(_RuleGroup(rules[start:i]))
+                start = i
+        self._groups_reversed = list(reversed(groups))
+
+    def __call__(self, abs_path: str, is_dir: Optional[bool] = None) -> bool:
+        return bool(self.check(abs_path, is_dir))
+
+    def check(self, abs_path: str, is_dir: Optional[bool] = None) -> Optional[bool]:
+        """
+        :param abs_path: 绝对路径，正斜杠
+        :param is_dir: 路径是否是文件夹，不知道时传None，按照原库的行为处理
+        :return: True 表示被排除，False 表示被否定规则重新包含，None 表示没有任何规则匹配
+        """
+        if abs_path.startswith(self._base_prefix):
+            rel_path = abs_path[len(self._base_prefix) :]
+        else:
+            # 路径没有规范化，走一遍慢的规范化再试
+            abs_path = _normalize_path_str(abs_path)
+            if not abs_path.startswith(self._base_prefix):
+                return None
+            rel_path = abs_path[len(self._base_prefix) :]
+        if rel_path.endswith("/"):
+            # 和原库一样，结尾带斜杠的当作文件夹
+            is_dir = True
+            rel_path = rel_path.rstrip("/")
+        if not rel_path:
+            return None
+        for group in self._groups_reversed:
+            if group.match(rel_path, is_dir):
+                return not group.negation
+        return None
+
+
+def is_ignored_by_stack(
+    stack: tuple[CompiledGitignore, ...], abs_path: str, is_dir: Optional[bool] = None
+) -> bool:
+    """
+    用一组层层嵌套的.gitignore判断路径是否被排除
+    和git一样，越深层的.gitignore优先级越高，深层没有规则匹配时才看外层的
+    :param stack: 由外层到内层排列
+    :param abs_path: 绝对路径，正斜杠
+    :param is_dir:
+    :return:
+    """
+    for compiled_gitignore in reversed(stack):
+        result = compiled_gitignore.check(abs_path, is_dir)
+        if result is not None:
+            return result
+    return False
 
 
 def rule_from_pattern(pattern, base_path=None, source=None):
@@ -104,9 +266,20 @@ def rule_from_pattern(pattern, base_path=None, source=None):
     regex = fnmatch_pathname_to_regex(
         pattern, directory_only, negation, anchored=bool(anchored)
     )
+    # 不带斜杠的规则只和最后一级名字有关，可以不看整个路径
+    basename = None
+    basename_regex = None
+    if not anchored and "/" not in pattern and "**" not in pattern:
+        if any(c in pattern for c in "*?[\\"):
+            basename_regex = _fnmatch_pathname_to_regex_core(pattern, with_prefix=False)
+        else:
+            basename = pattern
     return IgnoreRule(
         pattern=orig_pattern,
         regex=regex,
+        core_regex=_fnmatch_pathname_to_regex_core(pattern, anchored=bool(anchored)),
+        basename=basename,
+        basename_regex=basename_regex,
         negation=negation,
         directory_only=directory_only,
         anchored=anchored,
@@ -118,6 +291,9 @@ def rule_from_pattern(pattern, base_path=None, source=None):
 IGNORE_RULE_FIELDS = [
     "pattern",
     "regex",  # Basic values
+    "core_regex",  # regex 去掉结尾部分，用于分开处理 directory_only 的情况
+    "basename",  # 只和最后一级名字有关、且没有通配符的规则，就是这个名字本身，否则为None
+    "basename_regex",  # 只和最后一级名字有关的规则，对名字 fullmatch 的正则，否则为None
     "negation",
     "directory_only",
     "anchored",  # Behavior flags
@@ -135,7 +311,15 @@ class IgnoreRule(collections.namedtuple("IgnoreRule_", IGNORE_RULE_FIELDS)):
 
     def match(self, abs_path: Union[str, Path]):
         matched = False
-        if self.base_path:
+        if isinstance(abs_path, str):
+            # 只在字符串上处理，不构造 Path 对象
+            rel_path = _normalize_path_str(abs_path)
+            if self.base_path:
+                base_prefix = str(self.base_path).replace("\\", "/").rstrip("/") + "/"
+                if not rel_path.startswith(base_prefix):
+                    raise ValueError(f"{abs_path} 不在 {self.base_path} 中")
+                rel_path = rel_path[len(base_prefix) :]
+        elif self.base_path:
             rel_path = str(_normalize_path(abs_path).relative_to(self.base_path))
         else:
             rel_path = str(_normalize_path(abs_path))
@@ -145,11 +329,16 @@ class IgnoreRule(collections.namedtuple("IgnoreRule_", IGNORE_RULE_FIELDS)):
             rel_path += "/"
         if rel_path.startswith("./"):
             rel_path = rel_path[2:]
-        if re.search(self.regex, rel_path):
+        if _compile(self.regex).search(rel_path):
             matched = True
         return matched
 
 
+@functools.lru_cache(maxsize=4096)
+def _compile(regex: str) -> re.Pattern:
+    return re.compile(regex)
+
+
 # Frustratingly, python's fnmatch doesn't provide the FNM_PATHNAME
 # option that .gitignore's behavior depends on.
 def fnmatch_pathname_to_regex(
@@ -159,6 +348,23 @@ def fnmatch_pathname_to_regex(
     Implements fnmatch style-behavior, as though with FNM_PATHNAME flagged;
     the path separator will not match shell-style '*' and '.' wildcards.
     """
+    res = [_fnmatch_pathname_to_regex_core(pattern, anchored)]
+    if not directory_only:
+        res.append("$")
+    elif directory_only and negation:
+        res.append("/$")
+    else:
+        res.append("($|\\/)")
+    return "".join(res)
+
+
+def _fnmatch_pathname_to_regex_core(
+    pattern, anchored: bool = False, with_prefix: bool = True
+) -> str:
+    """
+    fnmatch_pathname_to_regex 中不包含结尾部分的正则
+    with_prefix 为 False 时也不包含开头的锚定部分
+    """
     i, n = 0, len(pattern)
 
     seps = [re.escape(os.sep)]
@@ -177,7 +383,7 @@ def fnmatch_pathname_to_regex(
                     i += 1
                     if i < n and pattern[i] == "/":
                         i += 1
-                        res.append("".join(["(.*", seps_group, ")?"]))
+                        res.append("".join(["(?:.*", seps_group, ")?"]))
                     else:
                         res.append(".*")
                 else:
@@ -208,16 +414,8 @@ def fnmatch_pathname_to_regex(
                 res.append("[{}]".format(stuff))
         else:
             res.append(re.escape(c))
-    if anchored:
-        res.insert(0, "^")
-    else:
-        res.insert(0, f"(^|{seps_group})")
-    if not directory_only:
-        res.append("$")
-    elif directory_only and negation:
-        res.append("/$")
-    else:
-        res.append("($|\\/)")
+    if with_prefix:
+        res.insert(0, "^" if anchored else f"(?:^|{seps_group})")
     return "".join(res)
 
 
@@ -229,3 +427,10 @@ def _normalize_path(path: Union[str, Path]) -> Path:
     `Path.resolve()` does.
     """
     return Path(abspath(path))
+
+
+def _normalize_path_str(path: Union[str, Path]) -> str:
+    """
+    和 _normalize_path 一样，但是返回正斜杠的字符串
+    """
+    return abspath(path).replace("\\", "/")
@@ -0,0 +1,194 @@
+"""
+排列缓存
+排列一个文件夹的第一层只取决于第一层各个实体的大小和先后顺序，和名字、位置、子文件夹内部都无关。
+所以把 (排列策略, 间隔, 各实体的宽高) 的摘要作为键，把排列结果（各实体相对于排列原点的位置）记下来，
+大小完全一样的第一层直接用记下的结果，不再重新排列：
+同一棵树里重复出现的子树（比如拷贝进来的第三方库、多份一样的 build 输出）只排列一次，
+缓存还会保存到文件中，再次打开没有变化的文件夹时完全不需要排列。
+"""
+
+import array
+import hashlib
+import marshal
+import os
+import sys
+import zlib
+from typing import Optional, Sequence
+
+from data_struct.number_vector import NumberVector
+from data_struct.rectangle import Rectangle
+from tools.cancel_token import CancelToken
+from tools.rectangle_packing import sort_rectangle_compact
+from tools.scan_cache import get_cache_dir
+
+# 排列策略或者缓存格式变化时修改这个版本号，旧的排列结果会被直接忽略
+_LAYOUT_STRATEGY = "skyline-2"
+# marshal 的格式和python版本有关，所以文件头里也带上python版本
+_CACHE_HEADER = (
+    f"VFLM{_LAYOUT_STRATEGY}-{sys.version_info[0]}.{sys.version_info[1]}\n"
+).encode("ascii")
+# 保存到文件中的排列结果最多这么多条，这一次用到的优先保留
+MAX_SAVED_RECORD_COUNT = 200000
+
+
+def get_layout_key(
+    widths: Sequence[float], heights: Sequence[float], margin: float
+) -> bytes:
+    """
+    :param widths: 第一层各个实体的大小，按排列时的顺序
+    :param heights:
+    :param margin: 实体之间的间隔
+    :return: 排列结果的键
+    """
+    # 按 double 打包，不用 marshal：marshal 会把同一个对象的重复出现写成引用，
+    # 而且 int 和 float 的编码也不同，同样的大小可能得到不同的键
+    values = array.array("d", (margin,))
+    values.extend(widths)
+    values.extend(heights)
+    return hashlib.blake2b(
+        _LAYOUT_STRATEGY.encode("ascii") + values.tobytes(),
+        digest_size=16,
+    ).digest()
+
+
+class LayoutMemo:
+    """
+    排列结果的缓存
+    lookup 和 store 可以在多个线程中同时调用（只是对字典单个键的读写）
+    """
+
+    def __init__(self):
+        # 是否使用缓存，关闭时 pack_locations 总是重新排列
+        self.is_enabled = True
+        self.is_loaded = False
+        # 键 -> 各实体位置 (x0, y0, x1, y1, ...) 的二进制内容
+        # 上一次保存的
+        self._old_records: dict[bytes, bytes] = {}
+        # 这一次用到的
+        self._new_records: dict[bytes, bytes] = {}
+
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @property
+    def file_path(self) -> str:
+        return f"{get_cache_dir()}/layout_memo.bin"
+
+    @property
+    def new_records(self) -> dict[bytes, bytes]:
+        return self._new_records
+
+    def lookup(self, key: bytes) -> Optional[list[tuple[float, float]]]:
+        """
+        只查找，不计入命中和未命中的数量，由真正排列的地方统计
+        :param key: get_layout_key 得到的键
+        :return: 各实体相对于排列原点的位置，没有记录时返回None
+        """
+        record = self._new_records.get(key)
+        if record is None:
+            record = self._old_records.get(key)
+            if record is None:
+                return None
+            self._new_records[key] = record
+        values = array.array("d")
+        values.frombytes(record)
+        return list(zip(values[0::2], values[1::2]))
+
+    def store(self, key: bytes, locations: list[tuple[float, float]]):
+        """
+        记录一次排列结果
+        :param key: get_layout_key 得到的键
+        :param locations: 各实体相对于排列原点的位置
+        :return:
+        """
+        values = array.array("d")
+        for x, y in locations:
+            values.append(x)
+            values.append(y)
+        self._new_records[key] = values.tobytes()
+
+    def update(self, records: dict[bytes, bytes]):
+        """
+        合并别处（比如排列用的工作进程）记录的排列结果
+        :param records: 另一个 LayoutMemo 的 new_records
+        :return:
+        """
+        self._new_records.update(records)
+
+    def load(self):
+        """
+        读取缓存文件，文件不存在、损坏或者版本对不上时什么都不读
+        :return:
+        """
+        self.is_loaded = True
+        try:
+            with open(self.file_path, "rb") as f:
+                content = f.read()
+            if not content.startswith(_CACHE_HEADER):
+                return
+            data = marshal.loads(zlib.decompress(content[len(_CACHE_HEADER) :]))
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return
+        if isinstance(data, dict):
+            self._old_records = data
+
+    def save(self):
+        """
+        写入缓存文件，这一次用到的排列结果优先，剩下的名额留给以前的，先写临时文件再替换
+        这一次用到的就超过了上限时，只保留最后记录的那些
+        :return:
+        """
+        new_items = list(self._new_records.items())
+        records = dict(new_items[-MAX_SAVED_RECORD_COUNT:])
+        for key, record in self._old_records.items():
+            if len(records) >= MAX_SAVED_RECORD_COUNT:
+                break
+            records.setdefault(key, record)
+        os.makedirs(get_cache_dir(), exist_ok=True)
+        content = _CACHE_HEADER + zlib.compress(marshal.dumps(records), 1)
+        temp_file_path = self.file_path + ".tmp"
+        with open(temp_file_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_file_path, self.file_path)
+        self._old_records = records
+        self._new_records = {}
+
+
+def pack_locations(
+    widths: Sequence[float],
+    heights: Sequence[float],
+    margin: float,
+    memo: Optional[LayoutMemo] = None,
+    cancel_token: Optional[CancelToken] = None,
+) -> list[tuple[float, float]]:
+    """
+    排列一个文件夹的第一层，有缓存时优先用缓存
+    :param widths: 第一层各个实体的大小
+    :param heights:
+    :param margin: 实体之间的间隔
+    :param memo: 排列缓存，为None时总是重新排列
+    :param cancel_token: 重新排列时不断检查
+    :return: 各实体相对于排列原点的位置，和 widths 一一对应
+    """
+    key = None
+    if memo is not None and memo.is_enabled:
+        key = get_layout_key(widths, heights, margin)
+        locations = memo.lookup(key)
+        if locations is not None:
+            memo.hit_count += 1
+            return locations
+        memo.miss_count += 1
+    sorted_rectangle_list = sort_rectangle_compact(
+        [Rectangle(NumberVector(0, 0), w, h) for w, h in zip(widths, heights)],
+        margin,
+        cancel_token=cancel_token,
+    )
+    locations = [
+        (r.location_left_top.x, r.location_left_top.y) for r in sorted_rectangle_list
+    ]
+    if key is not None:
+        memo.store(key, locations)
+    return locations
+
+
+LAYOUT_MEMO = LayoutMemo()
@@ -0,0 +1,116 @@
+"""
+打开文件夹的进度
+扫描线程和排列过程不断累加计数，每隔一小段时间把一份快照交给监听者（比如发给UI线程显示）
+"""
+
+import enum
+import math
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+
+class OpenPhase(enum.Enum):
+    SCAN = "扫描"
+    LAYOUT = "排列"
+
+
+class OpenProgressSnapshot(NamedTuple):
+    """
+    某一时刻的进度，不可变，可以安全地交给其他线程
+    """
+
+    phase: OpenPhase
+    dirs_visited: int
+    files_found: int
+    # 当前阶段完成的比例，不知道总量时为None
+    fraction: Optional[float]
+    # 预计剩余秒数，不知道总量时为None
+    eta_seconds: Optional[float]
+
+    def to_text(self) -> str:
+        text = (
+            f"正在{self.phase.value}：已扫描 {self.dirs_visited} 个文件夹，"
+            f"{self.files_found} 个文件"
+        )
+        if self.fraction is not None:
+            text += f"，{self.fraction:.0%}"
+        if self.eta_seconds is not None:
+            text += f"，预计剩余 {math.ceil(self.eta_seconds)} 秒"
+        return text
+
+
+class OpenProgress:
+    """
+    计数在后台线程里累加，流式打开时扫描结果的合并和排列分别在两个线程里同时进行，所以累加时加锁，
+    监听者在累加的线程里被调用，两次通知之间至少间隔 report_interval 秒
+    """
+
+    def __init__(
+        self,
+        on_changed: Optional[Callable[[OpenProgressSnapshot], None]] = None,
+        report_interval: float = 0.1,
+    ):
+        self.on_changed = on_changed
+        self.report_interval = report_interval
+
+        self.phase = OpenPhase.SCAN
+        self.dirs_visited = 0
+        self.files_found = 0
+        # 预计要扫描的文件夹数量，来自上一次的扫描缓存，不知道时为None
+        self.expected_dir_count: Optional[int] = None
+        self.folders_laid_out = 0
+        self.folders_total = 0
+
+        self._phase_start_time = time.perf_counter()
+        self._last_report_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_scanned(self, dir_count: int, file_count: int):
+        with self._lock:
+            self.dirs_visited += dir_count
+            self.files_found += file_count
+            self._report()
+
+    def start_layout(self, folders_total: int):
+        """
+        扫描结束，进入排列阶段
+        :param folders_total: 需要排列的文件夹数量
+        :return:
+        """
+        with self._lock:
+            self.phase = OpenPhase.LAYOUT
+            self.folders_total = folders_total
+            self.folders_laid_out = 0
+            self._phase_start_time = time.perf_counter()
+            self._report(force=True)
+
+    def add_laid_out(self, folder_count: int = 1):
+        with self._lock:
+            self.folders_laid_out += folder_count
+            self._report()
+
+    def snapshot(self) -> OpenProgressSnapshot:
+        if self.phase == OpenPhase.SCAN:
+            done, total = self.dirs_visited, self.expected_dir_count
+        else:
+            done, total = self.folders_laid_out, self.folders_total
+        fraction = None
+        eta_seconds = None
+        if total:
+            fraction = min(1.0, done / total)
+            elapsed = time.perf_counter() - self._phase_start_time
+            if done > 0 and elapsed > 0:
+                eta_seconds = max(0, total - done) * elapsed / done
+        return OpenProgressSnapshot(
+            self.phase, self.dirs_visited, self.files_found, fraction, eta_seconds
+        )
+
+    def _report(self, force: bool = False):
+        if self.on_changed is None:
+            return
+        now = time.perf_counter()
+        if not force and now - self._last_report_time < self.report_interval:
+            return
+        self._last_report_time = now
+        self.on_changed(self.snapshot())
@@ -0,0 +1,287 @@
+"""
+多进程并行排列文件夹树
+排列是后序的：一个文件夹要等它的子文件夹内部都排列好、大小确定之后才能排列第一层，
+但兄弟子树之间在父文件夹排列之前完全互不依赖。排列是纯计算（CPU密集），线程受GIL限制并不能同时跑，
+所以把互不相交的子树交给进程池，在各个核心上同时排列，主进程再排列剩下的上层文件夹，最后合并结果。
+
+进程之间只传递扁平的数字列表，不传递实体对象：
+树按先序展开成若干节点，parents[i] 是节点 i 的父节点下标（根节点是 -1），
+widths / heights 是节点的大小，有子节点的节点（文件夹）的大小由排列结果决定，其他节点的大小不变。
+先序展开中一棵子树占据连续的一段下标，所以子树可以直接切片交给工作进程。
+排列结果是每个节点相对于父节点左上角的偏移，根节点的偏移是相对于它排列前的左上角的。
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Callable, Optional
+
+from tools.cancel_token import CancelToken, raise_if_cancelled
+from tools.layout_memo import LayoutMemo, get_layout_key, pack_locations
+
+# 一个任务至少包含多少个节点，太小的任务花在进程间传递数据上的时间比排列本身还多
+DEFAULT_TASK_SIZE = 2000
+# 等待工作进程时最多等多久就检查一次取消
+_CANCEL_CHECK_INTERVAL = 0.05
+
+# (parents, widths, heights)，parents 中的下标是相对于这一段的开头的
+_Segment = tuple[list[int], list[float], list[float]]
+# (widths, heights, offsets_x, offsets_y, 排列了的文件夹数量)
+_SegmentResult = tuple[list[float], list[float], list[float], list[float], int]
+
+
+def layout_flat_tree(
+    parents: list[int],
+    widths: list[float],
+    heights: list[float],
+    margin: float,
+    padding: float,
+    executor: Optional[Executor] = None,
+    task_size: int = DEFAULT_TASK_SIZE,
+    cancel_token: Optional[CancelToken] = None,
+    on_packed: Optional[Callable[[int], None]] = None,
+    memo: Optional[LayoutMemo] = None,
+) -> tuple[list[float], list[float]]:
+    """
+    排列一棵先序展开的树，结果和逐个文件夹后序排列完全一样
+    :param parents: 每个节点的父节点下标，节点按先序排列，第0个是根节点
+    :param widths: 每个节点的大小，有子节点的节点排列后原地更新为新的大小
+    :param heights:
+    :param margin: 第一层子节点之间的间隔
+    :param padding: 文件夹边框和第一层子节点之间的内边距
+    :param executor: 进程池，为None时在当前进程里串行排列
+    :param task_size: 交给进程池的每个任务至少包含的节点数量，比这还小的树直接在当前进程里排列
+    :param cancel_token: 被取消时抛出 OperationCancelled，已经提交的任务会被丢弃
+    :param on_packed: 每排列完一批文件夹调用一次，参数是这一批的文件夹数量
+    :param memo: 排列缓存，能完全用缓存排列好的子树不再交给进程池，
+    工作进程新排列的结果也会记录进来
+    :return: (offsets_x, offsets_y)
+    """
+    count = len(parents)
+    offsets_x = [0.0] * count
+    offsets_y = [0.0] * count
+    if count == 0:
+        return offsets_x, offsets_y
+    # 每个节点的子树包含的节点数量（包括自身），先序中子树是 [i, i + subtree_sizes[i])
+    subtree_sizes = [1] * count
+    for i in range(count - 1, 0, -1):
+        subtree_sizes[parents[i]] += subtree_sizes[i]
+
+    # 不超过 task_size 的最大子树交给进程池，其余的（上层的大文件夹）留在当前进程里
+    # 相邻的小子树合并成一个任务，凑够 task_size 再提交
+    local_folders: list[int] = []
+    tasks: list[list[int]] = []
+    current_task: list[int] = []
+    current_task_size = 0
+    i = 0
+    while i < count:
+        size = subtree_sizes[i]
+        if size == 1:
+            i += 1
+            continue
+        if executor is None or size > task_size:
+            local_folders.append(i)
+            i += 1
+            continue
+        current_task.append(i)
+        current_task_size += size
+        if current_task_size >= task_size:
+            tasks.append(current_task)
+            current_task = []
+            current_task_size = 0
+        i += size
+    if current_task:
+        tasks.append(current_task)
+
+    if len(tasks) == 1 and not local_folders:
+        # 整棵树就是一个任务，交给别的进程也只是多了传递数据的开销
+        local_folders = [i for i in range(count) if subtree_sizes[i] > 1]
+        tasks = []
+
+    def merge(start: int, result: _SegmentResult):
+        end = start + subtree_sizes[start]
+        widths[start:end] = result[0]
+        heights[start:end] = result[1]
+        offsets_x[start:end] = result[2]
+        offsets_y[start:end] = result[3]
+        if on_packed is not None:
+            on_packed(result[4])
+
+    futures: dict[Future, list[int]] = {}
+    try:
+        for task in tasks:
+            raise_if_cancelled(cancel_token)
+            starts = []
+            segments = []
+            for start in task:
+                segment = _slice_segment(
+                    parents, widths, heights, start, subtree_sizes[start]
+                )
+                # 先试试只用缓存能不能排列好，能的话就不用交给进程池了
+                result = None
+                if memo is not None and memo.is_enabled:
+                    result = _pack_segment(segment, margin, padding, memo, True)
+                if result is not None:
+                    memo.hit_count += result[4]
+                    merge(start, result)
+                else:
+                    starts.append(start)
+                    segments.append(segment)
+            if segments:
+                future = executor.submit(
+                    _pack_segments,
+                    segments,
+                    margin,
+                    padding,
+                    memo is not None and memo.is_enabled,
+                )
+                futures[future] = starts
+        pending = set(futures)
+        while pending:
+            raise_if_cancelled(cancel_token)
+            done, pending = wait(
+                pending, timeout=_CANCEL_CHECK_INTERVAL, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                results, records, hit_count, miss_count = future.result()
+                for start, result in zip(futures[future], results):
+                    merge(start, result)
+                if memo is not None:
+                    memo.update(records)
+                    memo.hit_count += hit_count
+                    memo.miss_count += miss_count
+    finally:
+        for future in futures:
+            future.cancel()
+
+    # 剩下的文件夹从深到浅排列，先序的逆序保证子节点总在父节点之前
+    for folder in reversed(local_folders):
+        raise_if_cancelled(cancel_token)
+        children = []
+        child = folder + 1
+        end = folder + subtree_sizes[folder]
+        while child < end:
+            children.append(child)
+            child += subtree_sizes[child]
+        _pack_folder(
+            folder,
+            children,
+            widths,
+            heights,
+            offsets_x,
+            offsets_y,
+            margin,
+            padding,
+            memo,
+        )
+        if on_packed is not None:
+            on_packed(1)
+    return offsets_x, offsets_y
+
+
+def _slice_segment(
+    parents: list[int],
+    widths: list[float],
+    heights: list[float],
+    start: int,
+    size: int,
+) -> _Segment:
+    """
+    切出一棵子树，父节点下标改为相对于子树根节点的
+    """
+    end = start + size
+    return (
+        [-1] + [parent - start for parent in parents[start + 1 : end]],
+        widths[start:end],
+        heights[start:end],
+    )
+
+
+def _pack_segments(
+    segments: list[_Segment], margin: float, padding: float, is_memo_enabled: bool
+) -> tuple[list[_SegmentResult], dict[bytes, bytes], int, int]:
+    """
+    在工作进程里排列若干棵子树
+    :return: 各棵子树的排列结果，新记录的排列缓存，以及缓存命中和未命中的数量
+    """
+    memo = LayoutMemo()
+    memo.is_enabled = is_memo_enabled
+    results = [_pack_segment(segment, margin, padding, memo) for segment in segments]
+    return results, memo.new_records, memo.hit_count, memo.miss_count
+
+
+def _pack_segment(
+    segment: _Segment,
+    margin: float,
+    padding: float,
+    memo: Optional[LayoutMemo],
+    is_lookup_only: bool = False,
+) -> Optional[_SegmentResult]:
+    """
+    排列一棵子树，会原地修改 segment 中的大小
+    :param is_lookup_only: 只用缓存排列，有一个文件夹没有缓存就放弃
+    :return: 放弃时返回None
+    """
+    parents, widths, heights = segment
+    count = len(parents)
+    children: list[list[int]] = [[] for _ in range(count)]
+    for i in range(1, count):
+        children[parents[i]].append(i)
+    offsets_x = [0.0] * count
+    offsets_y = [0.0] * count
+    folder_count = 0
+    for folder in range(count - 1, -1, -1):
+        if children[folder]:
+            if not _pack_folder(
+                folder,
+                children[folder],
+                widths,
+                heights,
+                offsets_x,
+                offsets_y,
+                margin,
+                padding,
+                memo,
+                is_lookup_only,
+            ):
+                return None
+            folder_count += 1
+    return widths, heights, offsets_x, offsets_y, folder_count
+
+
+def _pack_folder(
+    folder: int,
+    children: list[int],
+    widths: list[float],
+    heights: list[float],
+    offsets_x: list[float],
+    offsets_y: list[float],
+    margin: float,
+    padding: float,
+    memo: Optional[LayoutMemo] = None,
+    is_lookup_only: bool = False,
+) -> bool:
+    """
+    排列一个文件夹的第一层，子节点的大小应该已经确定了
+    和 EntityFolder 一样：第一层排列好之后，文件夹收缩到恰好包住第一层再加上内边距
+    :param is_lookup_only: 只用缓存排列，没有缓存时什么都不做
+    :return: 是否排列了
+    """
+    child_widths = [widths[i] for i in children]
+    child_heights = [heights[i] for i in children]
+    if is_lookup_only:
+        locations = memo.lookup(get_layout_key(child_widths, child_heights, margin))
+        if locations is None:
+            return False
+    else:
+        locations = pack_locations(child_widths, child_heights, margin, memo)
+    left = min(x for x, _ in locations)
+    top = min(y for _, y in locations)
+    right = max(x + w for (x, _), w in zip(locations, child_widths))
+    bottom = max(y + h for (_, y), h in zip(locations, child_heights))
+    for i, (x, y) in zip(children, locations):
+        offsets_x[i] = x - left + padding
+        offsets_y[i] = y - top + padding
+    widths[folder] = right - left + padding * 2
+    heights[folder] = bottom - top + padding * 2
+    offsets_x[folder] = left - padding
+    offsets_y[folder] = top - padding
+    return True
@@ -1,7 +1,9 @@
 import math
-from typing import List
+from bisect import bisect_left, insort
+from typing import List, Optional
 from data_struct.rectangle import Rectangle
 from data_struct.number_vector import NumberVector
+from tools.cancel_token import CancelToken, raise_if_cancelled
 
 
 """
@@ -61,11 +63,14 @@ def sort_rectangle_fast(rectangles: list[Rectangle], margin: float) -> list[Rect
 
 
 def sort_rectangle_greedy(
-    rectangles: list[Rectangle], margin: float
+    rectangles: list[Rectangle],
+    margin: float,
+    cancel_token: Optional[CancelToken] = None,
 ) -> list[Rectangle]:
     """
     贪心策略
     O(N^2)
+    每放一个矩形检查一次 cancel_token，被取消时抛出 OperationCancelled
     """
     if len(rectangles) == 0:
         return []
@@ -124,6 +129,7 @@ def sort_rectangle_greedy(
     width = rectangles[0].width
     height = rectangles[0].height
     for i in range(1, len(rectangles)):
+        raise_if_cancelled(cancel_token)
         min_space_score = -1
         min_shape_score = -1
         min_rect = None
@@ -158,69 +164,262 @@ def sort_rectangle_greedy(
     return ret
 
 
-def sort_rectangle_many_files_less_folders(
-    rectangles: List[Rectangle], margin: float
+# 矩形不超过这么多个时，天际线和贪心策略都排列一次，取外接矩形面积小的
+# 原来不到 100 个子实体的文件夹都用贪心策略，这样排出来的结果不会比原来松散；
+# 贪心策略偶尔更紧凑（比如能利用悬空部分下面的空位），但它的开销随数量增长得很快，更多时只用天际线
+_GREEDY_MAX_RECTANGLES = 99
+# 尝试的带宽，相对于所有矩形（连同间隔）总面积的平方根
+_SKYLINE_STRIP_WIDTH_FACTORS = tuple(0.7 + 0.1 * k for k in range(14))
+# 矩形很多时，带子里的空隙相对很小，用带宽 = 总面积的平方根 就已经接近正方形，少试几种
+_SKYLINE_MANY_RECTANGLES = 1000
+_SKYLINE_MANY_STRIP_WIDTH_FACTORS = (1.0, 1.1)
+# 外接矩形的长宽比不超过这个值时才算形状合格，合格的结果中取面积最小的
+_SKYLINE_MAX_ASPECT_RATIO = 2
+
+
+def sort_rectangle_compact(
+    rectangles: list[Rectangle],
+    margin: float,
+    cancel_token: Optional[CancelToken] = None,
 ) -> list[Rectangle]:
     """
-    多文件,少文件夹的情况
-    文件夹排在左上角，只拍成一行
-    文件另起一行以矩阵形式排列
+    天际线装箱，矩形很少时再用贪心策略排列一次，取外接矩形面积小的那个
+    每放一个矩形检查一次 cancel_token，被取消时抛出 OperationCancelled
     """
-    # 如何判定一个文件是文件夹还是文件？矩形的高度=100是文件，>100是文件夹
-    files = [r for r in rectangles if r.height <= 100]
-    folders = [r for r in rectangles if r.height > 100]
-    files = sort_rectangle_all_files(files, margin)
-    folders = sort_rectangle_all_files(folders, margin)
-    # 找到文件夹列表中最靠左下角的那个文件夹矩形的左下角坐标
-    min_x = min(folders, key=lambda r: r.location_left_top.x).location_left_top.x
-
-    max_bottom_folder = max(folders, key=lambda r: r.bottom())
-
-    max_y = max_bottom_folder.bottom() + margin
-    for file in files:
-        file.location_left_top.x += min_x
-        file.location_left_top.y += max_y
-    # 看似没排，其实是排好了
+    if len(rectangles) > _GREEDY_MAX_RECTANGLES:
+        return sort_rectangle_skyline(rectangles, margin, cancel_token)
+    greedy_rectangles = sort_rectangle_greedy(
+        [rectangle.clone() for rectangle in rectangles], margin, cancel_token
+    )
+    sort_rectangle_skyline(rectangles, margin, cancel_token)
+    if _get_bounding_area(greedy_rectangles) < _get_bounding_area(rectangles):
+        for rectangle, greedy_rectangle in zip(rectangles, greedy_rectangles):
+            rectangle.location_left_top.x = greedy_rectangle.location_left_top.x
+            rectangle.location_left_top.y = greedy_rectangle.location_left_top.y
     return rectangles
-    pass
 
 
-def sort_rectangle_all_files(
-    rectangles: List[Rectangle], margin: float
+def _get_bounding_area(rectangles: list[Rectangle]) -> float:
+    if len(rectangles) == 0:
+        return 0.0
+    left = min(r.left() for r in rectangles)
+    top = min(r.top() for r in rectangles)
+    right = max(r.right() for r in rectangles)
+    bottom = max(r.bottom() for r in rectangles)
+    return (right - left) * (bottom - top)
+
+
+def sort_rectangle_skyline(
+    rectangles: list[Rectangle],
+    margin: float,
+    cancel_token: Optional[CancelToken] = None,
 ) -> list[Rectangle]:
     """
-    专门解决一个文件夹里面全都是小文件的情况的矩形摆放位置的情况。
-    注：这种情况只适用于全是文件，没有文件夹的情况。
+    天际线（skyline）装箱
+    在一条固定宽度、高度不限的带子里，按高度从高到低依次放置矩形，
+    每个矩形放在能放下它的最低位置（同样低时放在最左边），已放置的矩形的上边缘连成一条天际线，
+    放置时只需要在天际线的线段上找位置，不需要和所有已放置的矩形做碰撞检测，
+    而且只需要试比找到的位置更低的线段，以后谁都放不进去的缝隙会被填平
+    尝试多种带宽，取外接矩形长宽比合格并且面积最小的结果，都不合格时取面积最小的
+    每放一个矩形检查一次 cancel_token，被取消时抛出 OperationCancelled
     """
     if len(rectangles) == 0:
         return []
+    # 每个矩形右边和下边带上间隔一起放，矩形之间自然隔开
+    widths = [r.width + margin for r in rectangles]
+    heights = [r.height + margin for r in rectangles]
+    order = sorted(range(len(rectangles)), key=lambda i: (-heights[i], -widths[i]))
+    total_area = sum(w * h for w, h in zip(widths, heights))
+    min_strip_width = max(widths)
+
+    best_locations: list[tuple[float, float]] | None = None
+    best_score: tuple[bool, float] | None = None
+    tried_strip_widths = set()
+    factors = (
+        _SKYLINE_MANY_STRIP_WIDTH_FACTORS
+        if len(rectangles) > _SKYLINE_MANY_RECTANGLES
+        else _SKYLINE_STRIP_WIDTH_FACTORS
+    )
+    for factor in factors:
+        strip_width = max(min_strip_width, math.sqrt(total_area) * factor)
+        if strip_width in tried_strip_widths:
+            continue
+        tried_strip_widths.add(strip_width)
+        locations = _skyline_pack(widths, heights, order, strip_width, cancel_token)
+        used_width = max(locations[i][0] + widths[i] for i in order) - margin
+        used_height = max(locations[i][1] + heights[i] for i in order) - margin
+        aspect_ratio = max(used_width, used_height) / max(
+            min(used_width, used_height), 1e-9
+        )
+        score = (aspect_ratio > _SKYLINE_MAX_ASPECT_RATIO, used_width * used_height)
+        if best_score is None or score < best_score:
+            best_score = score
+            best_locations = locations
+
+    assert best_locations is not None
+    for rectangle, (x, y) in zip(rectangles, best_locations):
+        rectangle.location_left_top.x = x
+        rectangle.location_left_top.y = y
+    return rectangles
 
-    # 先找到所有矩形中最宽的矩形宽度
-    max_width = 0
-    for r in rectangles:
-        if r.width > max_width:
-            max_width = r.width
-
-    # 再找到所有矩形中最高的矩形高度
-    max_height = 0
-    for r in rectangles:
-        if r.height > max_height:
-            max_height = r.height
-
-    # 假设按照正方形摆放，不管宽高比例，边上的数量
-    count_in_side = math.ceil(len(rectangles) ** 0.5)
-    y_index = 0
-    x_index = 0
 
-    for rectangle in rectangles:
-        if x_index > count_in_side - 1:
-            x_index = 0
-            y_index += 1
-        rectangle.location_left_top.x = x_index * (max_width + margin)
-        rectangle.location_left_top.y = y_index * (max_height + margin)
-        x_index += 1
+def _skyline_pack(
+    widths: list[float],
+    heights: list[float],
+    order: list[int],
+    strip_width: float,
+    cancel_token: Optional[CancelToken],
+) -> list[tuple[float, float]]:
+    """
+    按 order 的顺序把矩形放进宽度为 strip_width 的带子里
+    :return: 每个矩形左上角的位置，和 widths 一一对应
+    """
+    # 还没放的矩形中最窄的宽度，order[k:] 中的最小值
+    min_widths = [math.inf] * (len(order) + 1)
+    for k in range(len(order) - 1, -1, -1):
+        min_widths[k] = min(min_widths[k + 1], widths[order[k]])
+    skyline = _Skyline(strip_width)
+    locations: list[tuple[float, float]] = [(0.0, 0.0)] * len(widths)
+    for k, i in enumerate(order):
+        raise_if_cancelled(cancel_token)
+        start, y = skyline.find(widths[i])
+        locations[i] = (skyline.xs[start], y)
+        skyline.cover(start, widths[i], y + heights[i], min_widths[k + 1])
+    return locations
+
+
+class _Skyline:
+    """
+    天际线：从左到右首尾相接的线段，连起来正好覆盖整个带宽，相邻线段高度不同
+    另外按 (高度, 左端) 从低到高记下所有线段。矩形从某条线段的左端开始放时，
+    能放的高度不会比这条线段更低，所以从最低的线段开始试，找到一个位置之后，
+    比这个位置还高的线段都不用再试了，不需要每次都扫描整条天际线
+    """
 
-    return rectangles
+    def __init__(self, strip_width: float):
+        self.strip_width = strip_width
+        # 各条线段的左端、高度、宽度
+        self.xs: list[float] = [0.0]
+        self.ys: list[float] = [0.0]
+        self.widths: list[float] = [strip_width]
+        # 所有线段的 (高度, 左端)，从低到高
+        self.lows: list[tuple[float, float]] = [(0.0, 0.0)]
+
+    def find(self, width: float) -> tuple[int, float]:
+        """
+        找放下宽为 width 的矩形的最低位置，同样低时放在最左边
+        :return: (从哪条线段的左端开始放, 能放的高度)
+        """
+        xs = self.xs
+        ys = self.ys
+        count = len(xs)
+        best_y = math.inf
+        best_x = math.inf
+        best_start = 0
+        for low_y, x in self.lows:
+            if low_y > best_y:
+                break
+            start = bisect_left(xs, x)
+            right = x + width
+            if right > self.strip_width and start > 0:
+                continue
+            # 矩形底下压着的所有线段中最高的就是能放的高度
+            y = low_y
+            end = start + 1
+            while end < count and xs[end] < right:
+                if ys[end] > y:
+                    y = ys[end]
+                    if y > best_y:
+                        break
+                end += 1
+            if y < best_y or (y == best_y and x < best_x):
+                best_y = y
+                best_x = x
+                best_start = start
+        return best_start, best_y
+
+    def cover(self, start: int, width: float, y: float, min_width: float):
+        """
+        从第 start 条线段的左端开始盖上一条宽为 width 高为 y 的新线段
+        :param min_width: 之后要放的矩形中最窄的宽度，用来填平以后谁都用不上的缝隙
+        """
+        xs = self.xs
+        ys = self.ys
+        widths = self.widths
+        x = xs[start]
+        right = x + width
+        end = start
+        # 完全被盖住的线段去掉，只盖住一部分的线段剩下右边的部分
+        while end < len(xs) and xs[end] + widths[end] <= right:
+            self._remove_low(end)
+            end += 1
+        if end < len(xs) and xs[end] < right:
+            self._remove_low(end)
+            widths[end] -= right - xs[end]
+            xs[end] = right
+            insort(self.lows, (ys[end], right))
+        xs[start:end] = [x]
+        ys[start:end] = [y]
+        widths[start:end] = [width]
+        insort(self.lows, (y, x))
+        start = self._merge_neighbors(start)
+        for index in (start + 1, start, start - 1):
+            if 0 <= index < len(xs):
+                self._fill_gap(index, min_width)
+
+    def _merge_neighbors(self, index: int) -> int:
+        """
+        和高度相同的邻居合并，保持线段数量尽量少
+        :return: 合并后这条线段的下标
+        """
+        xs = self.xs
+        ys = self.ys
+        widths = self.widths
+        if index + 1 < len(xs) and ys[index + 1] == ys[index]:
+            self._remove_low(index + 1)
+            widths[index] += widths[index + 1]
+            del xs[index + 1], ys[index + 1], widths[index + 1]
+        if index > 0 and ys[index - 1] == ys[index]:
+            self._remove_low(index)
+            widths[index - 1] += widths[index]
+            del xs[index], ys[index], widths[index]
+            index -= 1
+        return index
+
+    def _fill_gap(self, index: int, min_width: float):
+        """
+        填平以后不可能从它的左端开始放矩形的线段，并和邻居合并
+        比最窄的矩形还窄的线段，从它开始放一定会压到右边的线段；
+        离带子右边不到一个最窄矩形的线段，从它开始放会超出带宽。
+        压到这条线段的放法一定也压到了左边的线段（或者从它开始放时压到了右边的线段），
+        所以把它抬高到这个高度，任何放法能放的高度都不会变，排列结果和不填平完全一样，
+        而天际线的线段少了，找位置时要试的线段也少了
+        """
+        xs = self.xs
+        ys = self.ys
+        while len(xs) > 1:
+            x = xs[index]
+            # 和 find 中一样用左端加宽度来判断，不用线段的宽度，免得浮点误差让两边的结论不一致
+            right = x + min_width
+            if right > self.strip_width and index > 0:
+                y = ys[index - 1]
+            elif index + 1 < len(xs) and xs[index + 1] < right:
+                if index == 0:
+                    y = ys[1]
+                else:
+                    y = min(ys[index - 1], ys[index + 1])
+            else:
+                return
+            if y <= ys[index]:
+                return
+            self._remove_low(index)
+            ys[index] = y
+            insort(self.lows, (y, x))
+            index = self._merge_neighbors(index)
+
+    def _remove_low(self, index: int):
+        lows = self.lows
+        del lows[bisect_left(lows, (self.ys[index], self.xs[index]))]
 
 
 def sort_rectangle_right_bottom(
@@ -0,0 +1,206 @@
+"""
+扫描缓存
+把每个目录排除之后的列表结果、目录自身的修改时间存成一个紧凑的二进制文件，按根目录区分，
+下次打开同一个根目录时，修改时间没变的目录直接用缓存，不再重新列出，
+打开大文件夹就从完整遍历变成了每个目录一次stat的校验。
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+import zlib
+from typing import NamedTuple, Optional
+
+from tools.dir_scanner import ScanEntry
+
+# 缓存格式变化时修改这个版本号，旧的缓存文件会被直接忽略
+_CACHE_FORMAT_VERSION = 2
+# marshal 的格式和python版本有关，所以文件头里也带上python版本
+_CACHE_HEADER = (
+    f"VFSC{_CACHE_FORMAT_VERSION}-{sys.version_info[0]}.{sys.version_info[1]}\n"
+).encode("ascii")
+
+
+class CachedListing(NamedTuple):
+    """
+    命中缓存时得到的结果
+    """
+
+    # 目录下.gitignore的修改时间，没有用到.gitignore则为None
+    gitignore_mtime_ns: Optional[int]
+    # 排除之后的列表结果
+    entries: list[ScanEntry]
+
+
+def get_cache_dir() -> str:
+    """
+    获取缓存文件存放的文件夹
+    :return:
+    """
+    if os.name == "nt":
+        base_dir = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base_dir, "visual-file").replace("\\", "/")
+
+
+class ScanCache:
+    """
+    一个根目录的扫描缓存
+    lookup 和 store 可以在多个扫描线程中同时调用（只是对字典单个键的读写）
+    """
+
+    def __init__(self, root_path: str, settings_fingerprint: str):
+        """
+        :param root_path: 根目录
+        :param settings_fingerprint: 排除设置的指纹，排除设置变了缓存就整体作废
+        """
+        self.root_path = root_path
+        self.settings_fingerprint = settings_fingerprint
+        # 目录路径 -> (mtime_ns, inode, .gitignore的mtime_ns, 上层.gitignore的签名,
+        #              ((名字, 是否文件夹, 大小), ...))
+        # 上一次保存的
+        self._old_records: dict[str, tuple] = {}
+        # 这一次扫描用到的，保存时只保存这些，已经不存在的目录自然就被淘汰了
+        self._new_records: dict[str, tuple] = {}
+
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @property
+    def record_count(self) -> int:
+        """
+        上一次扫描到的目录数量，可以用来估计这一次扫描的总量
+        """
+        return len(self._old_records)
+
+    @property
+    def file_path(self) -> str:
+        digest = hashlib.sha1(self.root_path.encode("utf-8")).hexdigest()
+        return f"{get_cache_dir()}/scan_{digest}.bin"
+
+    @staticmethod
+    def load(root_path: str, settings_fingerprint: str) -> "ScanCache":
+        """
+        读取缓存文件，文件不存在、损坏或者版本、设置对不上时，得到一个空缓存
+        :param root_path:
+        :param settings_fingerprint:
+        :return:
+        """
+        cache = ScanCache(root_path, settings_fingerprint)
+        try:
+            with open(cache.file_path, "rb") as f:
+                content = f.read()
+            if not content.startswith(_CACHE_HEADER):
+                return cache
+            data = marshal.loads(zlib.decompress(content[len(_CACHE_HEADER) :]))
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return cache
+        if (
+            isinstance(data, tuple)
+            and len(data) == 3
+            and data[0] == root_path
+            and data[1] == settings_fingerprint
+            and isinstance(data[2], dict)
+        ):
+            cache._old_records = data[2]
+        return cache
+
+    def lookup(
+        self,
+        full_path: str,
+        stat: os.stat_result,
+        inherited_gitignore_signature: tuple,
+    ) -> Optional[CachedListing]:
+        """
+        查找某个目录的缓存，目录（以及其中的.gitignore）修改时间没变，
+        并且上层的.gitignore也都没有变化才算命中
+        :param full_path: 目录路径
+        :param stat: 目录自身当前的stat
+        :param inherited_gitignore_signature: 上层所有.gitignore的 (路径, 修改时间)
+        :return: 命中时返回排除之后的列表结果，否则返回None
+        """
+        record = self._old_records.get(full_path)
+        if (
+            record is None
+            or record[0] != stat.st_mtime_ns
+            or record[1] != stat.st_ino
+            or record[3] != inherited_gitignore_signature
+        ):
+            self.miss_count += 1
+            return None
+        gitignore_mtime_ns = record[2]
+        if gitignore_mtime_ns is not None:
+            # .gitignore 原地修改不会改变目录的修改时间，要单独检查
+            try:
+                if (
+                    os.stat(os.path.join(full_path, ".gitignore")).st_mtime_ns
+                    != gitignore_mtime_ns
+                ):
+                    self.miss_count += 1
+                    return None
+            except OSError:
+                self.miss_count += 1
+                return None
+        self.hit_count += 1
+        self._new_records[full_path] = record
+        return CachedListing(
+            gitignore_mtime_ns,
+            [
+                ScanEntry(
+                    name,
+                    os.path.join(full_path, name).replace("\\", "/"),
+                    is_dir,
+                    size,
+                )
+                for name, is_dir, size in record[4]
+            ],
+        )
+
+    def store(
+        self,
+        full_path: str,
+        stat: os.stat_result,
+        gitignore_mtime_ns: Optional[int],
+        inherited_gitignore_signature: tuple,
+        entries: list[ScanEntry],
+    ):
+        """
+        记录某个目录排除之后的列表结果
+        :param full_path: 目录路径
+        :param stat: 列目录之前获取的目录自身的stat
+        :param gitignore_mtime_ns: 排除时用到的.gitignore的修改时间，没有用到则为None
+        :param inherited_gitignore_signature: 排除时用到的上层所有.gitignore的 (路径, 修改时间)
+        :param entries:
+        :return:
+        """
+        self._new_records[full_path] = (
+            stat.st_mtime_ns,
+            stat.st_ino,
+            gitignore_mtime_ns,
+            inherited_gitignore_signature,
+            tuple((entry.name, entry.is_dir, entry.size) for entry in entries),
+        )
+
+    def save(self, keep_unused_records: bool = False):
+        """
+        把这一次扫描用到的记录写入缓存文件，先写临时文件再替换，防止写到一半的文件被读到
+        :param keep_unused_records: 这一次只扫描了一部分目录（按需扫描）时为True，
+        没用到的旧记录也一起保留，而不是当作已经不存在的目录淘汰掉
+        :return:
+        """
+        records = self._new_records
+        if keep_unused_records:
+            records = {**self._old_records, **self._new_records}
+        os.makedirs(get_cache_dir(), exist_ok=True)
+        content = _CACHE_HEADER + zlib.compress(
+            marshal.dumps(
+                (self.root_path, self.settings_fingerprint, records)
+            ),
+            1,
+        )
+        temp_file_path = self.file_path + ".tmp"
+        with open(temp_file_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_file_path, self.file_path)
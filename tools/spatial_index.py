@@ -0,0 +1,202 @@
+"""
+静态的空间索引（R树），用于快速找出和某个矩形区域相交的矩形
+用 STR（Sort-Tile-Recursive）一次性批量建树：先按中心x坐标切成若干竖条，
+每个竖条内再按中心y坐标分组，每组就是一个叶子节点，再对节点重复同样的过程直到只剩一个根节点。
+建好之后不支持插入删除，内容变化时整体重建；整体平移时只记录偏移量，不需要重建。
+查询时只深入和查询区域相交的节点，开销和树高加上结果数量成正比，而不是和矩形总数成正比。
+"""
+
+import math
+from typing import Sequence
+
+# 每个节点最多容纳的子项数量
+_NODE_CAPACITY = 16
+
+# (left, top, right, bottom)
+Box = tuple[float, float, float, float]
+
+
+class SpatialIndex:
+    """
+    元素用它在建树时传入的列表中的下标来表示，查询结果也是下标，并且按下标从小到大排列，
+    这样调用者可以保持原来的先后顺序（比如绘制顺序）
+    边界相接也算相交，调用者需要更精确的判断时在查询结果上再判断一次
+    """
+
+    def __init__(self, boxes: Sequence[Box]):
+        self._boxes: list[Box] = list(boxes)
+        # 整体平移的累计偏移量，查询时反向平移查询区域
+        self._offset_x = 0.0
+        self._offset_y = 0.0
+        # 从叶子层到根，每一层是 (各节点的包围盒, 各节点的子项下标)
+        # 叶子层节点的子项是元素下标，其他层节点的子项是下一层的节点下标
+        self._levels: list[tuple[list[Box], list[list[int]]]] = []
+
+        item_boxes = self._boxes
+        while item_boxes:
+            node_boxes, node_children = _pack_level(item_boxes)
+            self._levels.append((node_boxes, node_children))
+            if len(node_boxes) == 1:
+                break
+            item_boxes = node_boxes
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def translate(self, dx: float, dy: float):
+        """
+        所有元素整体平移
+        :param dx:
+        :param dy:
+        :return:
+        """
+        self._offset_x += dx
+        self._offset_y += dy
+
+    @property
+    def offset(self) -> tuple[float, float]:
+        """整体平移的累计偏移量"""
+        return self._offset_x, self._offset_y
+
+    def is_item_intersecting(self, item: int, box: Box) -> bool:
+        """
+        判断某个元素是否和矩形区域相交
+        :param item: 元素下标
+        :param box: (left, top, right, bottom)
+        :return:
+        """
+        item_box = self._boxes[item]
+        return not (
+            item_box[0] + self._offset_x > box[2]
+            or item_box[2] + self._offset_x < box[0]
+            or item_box[1] + self._offset_y > box[3]
+            or item_box[3] + self._offset_y < box[1]
+        )
+
+    def query(self, left: float, top: float, right: float, bottom: float) -> list[int]:
+        """
+        查询和矩形区域相交的所有元素
+        :return: 元素下标，从小到大排列
+        """
+        if not self._levels:
+            return []
+        left -= self._offset_x
+        right -= self._offset_x
+        top -= self._offset_y
+        bottom -= self._offset_y
+
+        result: list[int] = []
+        # (层号, 节点下标)，从根节点开始
+        stack = [(len(self._levels) - 1, 0)]
+        while stack:
+            level, node = stack.pop()
+            node_boxes, node_children = self._levels[level]
+            box = node_boxes[node]
+            if box[0] > right or box[2] < left or box[1] > bottom or box[3] < top:
+                continue
+            if level == 0:
+                for item in node_children[node]:
+                    item_box = self._boxes[item]
+                    if not (
+                        item_box[0] > right
+                        or item_box[2] < left
+                        or item_box[1] > bottom
+                        or item_box[3] < top
+                    ):
+                        result.append(item)
+            else:
+                stack.extend((level - 1, child) for child in node_children[node])
+        result.sort()
+        return result
+
+
+class RangeQueryTracker:
+    """
+    在同一个索引上连续做范围查询，每次查询区域只变化一点（比如正在拖动的框选框）时，
+    只查询新旧区域不重叠的那部分，开销和结果的变化量成正比，而不是每次都从头查询
+    """
+
+    def __init__(self, index: SpatialIndex):
+        self.index = index
+        # 上一次的查询区域，以及和它相交的元素
+        self._box: Box | None = None
+        self._items: set[int] = set()
+        # 上一次查询时索引的偏移量，索引平移过之后上一次的结果就不能再用了
+        self._offset = index.offset
+
+    def update(self, left: float, top: float, right: float, bottom: float) -> list[int]:
+        """
+        更新查询区域
+        :return: 和新区域相交的所有元素下标，从小到大排列
+        """
+        new_box = (left, top, right, bottom)
+        old_box = self._box
+        self._box = new_box
+        offset = self.index.offset
+        if old_box is None or offset != self._offset:
+            self._offset = offset
+            self._items = set(self.index.query(*new_box))
+            return sorted(self._items)
+        # 新进入的元素一定和 新区域-旧区域 相交，离开的元素一定和 旧区域-新区域 相交
+        for part in _box_difference(new_box, old_box):
+            for item in self.index.query(*part):
+                if self.index.is_item_intersecting(item, new_box):
+                    self._items.add(item)
+        for part in _box_difference(old_box, new_box):
+            for item in self.index.query(*part):
+                if not self.index.is_item_intersecting(item, new_box):
+                    self._items.discard(item)
+        return sorted(self._items)
+
+
+def _box_difference(a: Box, b: Box) -> list[Box]:
+    """
+    用至多四个矩形覆盖 a 中不属于 b 的部分，矩形可以和 b 的边界重叠
+    """
+    if a[0] > b[2] or a[2] < b[0] or a[1] > b[3] or a[3] < b[1]:
+        return [a]
+    result: list[Box] = []
+    if a[1] < b[1]:
+        result.append((a[0], a[1], a[2], b[1]))
+    if a[3] > b[3]:
+        result.append((a[0], b[3], a[2], a[3]))
+    middle_top = max(a[1], b[1])
+    middle_bottom = min(a[3], b[3])
+    if a[0] < b[0]:
+        result.append((a[0], middle_top, b[0], middle_bottom))
+    if a[2] > b[2]:
+        result.append((b[2], middle_top, a[2], middle_bottom))
+    return result
+
+
+def _pack_level(boxes: list[Box]) -> tuple[list[Box], list[list[int]]]:
+    """
+    把一层的矩形按 STR 的方式分组，每组成为上一层的一个节点
+    :param boxes:
+    :return: (各节点的包围盒, 各节点包含的 boxes 下标)
+    """
+    count = len(boxes)
+    node_count = math.ceil(count / _NODE_CAPACITY)
+    slice_count = math.ceil(math.sqrt(node_count))
+    slice_size = slice_count * _NODE_CAPACITY
+
+    order = sorted(range(count), key=lambda i: boxes[i][0] + boxes[i][2])
+    node_boxes: list[Box] = []
+    node_children: list[list[int]] = []
+    for slice_start in range(0, count, slice_size):
+        strip = sorted(
+            order[slice_start : slice_start + slice_size],
+            key=lambda i: boxes[i][1] + boxes[i][3],
+        )
+        for group_start in range(0, len(strip), _NODE_CAPACITY):
+            group = strip[group_start : group_start + _NODE_CAPACITY]
+            node_boxes.append(
+                (
+                    min(boxes[i][0] for i in group),
+                    min(boxes[i][1] for i in group),
+                    max(boxes[i][2] for i in group),
+                    max(boxes[i][3] for i in group),
+                )
+            )
+            node_children.append(group)
+    return node_boxes, node_children
@@ -12,3 +12,19 @@ def get_width_by_file_name(file_name: str) -> int:
         else:
             res += 24
     return res
+
+
+def format_file_size(size: int) -> str:
+    """
+    把字节数转换成便于阅读的文字，例如 1536 -> "1.5 KB"
+    :param size: 字节数
+    :return:
+    """
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if value < 1024:
+            if unit == "B":
+                return f"{size} B"
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} PB"
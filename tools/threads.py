@@ -1,13 +1,72 @@
 from PyQt5.QtCore import QThread, pyqtSignal
 
+from entity.entity_folder import EntityFolder
 from file_observer import FileObserver
+from tools.cancel_token import CancelToken, OperationCancelled
+from tools.open_progress import OpenProgress
 
 
 class OpenFolderThread(QThread):
-    def __init__(self, observer: FileObserver, directory, parent=None):
+    # 打开进度变化，参数是 OpenProgressSnapshot，最多每0.1秒发出一次
+    progress_changed = pyqtSignal(object)
+
+    def __init__(
+        self, observer: FileObserver, directory, is_streaming=False, parent=None
+    ):
         super(OpenFolderThread, self).__init__(parent)
         self._observer = observer
         self._directory = directory
+        # 流式打开时，扫描好的顶层子树会边扫描边交给UI线程显示
+        self._is_streaming = is_streaming
+        self._cancel_token = CancelToken()
+        # 线程结束后，表示这次打开是否是被取消的
+        self.is_cancelled = False
+
+    def cancel(self):
+        """
+        可以在任意线程调用，扫描和排列会在下一次检查时停下，线程随后结束
+        :return:
+        """
+        self._cancel_token.cancel()
+
+    def run(self):
+        progress = OpenProgress(self.progress_changed.emit)
+        try:
+            if self._is_streaming:
+                self._observer.open_folder_streaming(
+                    self._directory, self._cancel_token, progress
+                )
+            else:
+                self._observer.update_file_path(
+                    self._directory, self._cancel_token, progress
+                )
+        except OperationCancelled:
+            print("打开文件夹已取消")
+            self.is_cancelled = True
+
+
+class LoadLazyFoldersThread(QThread):
+    """
+    按需扫描时，在后台扫描并排列还没有扫描的文件夹
+    结束之后由UI线程把 result 交给 FileObserver.attach_lazy_folders
+    """
+
+    def __init__(
+        self, observer: FileObserver, folders: list[EntityFolder], parent=None
+    ):
+        super(LoadLazyFoldersThread, self).__init__(parent)
+        self._observer = observer
+        self._folders = folders
+        self._cancel_token = CancelToken()
+        self.result: list[tuple[EntityFolder, EntityFolder]] = []
+
+    def cancel(self):
+        self._cancel_token.cancel()
 
     def run(self):
-        self._observer.update_file_path(self._directory)
+        try:
+            self.result = self._observer.load_lazy_folders(
+                self._folders, self._cancel_token
+            )
+        except OperationCancelled:
+            self.result = []
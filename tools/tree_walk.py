@@ -0,0 +1,77 @@
+"""
+通用的树遍历工具，用显式的栈代替递归
+python 的递归调用开销大，而且树很深时会超出递归深度限制，甚至把C栈撑爆导致进程崩溃，
+所有需要遍历整棵文件夹树的地方都用这里的函数，树再深也只是栈（列表）变长而已。
+
+get_children 返回一个节点的子节点，没有子节点（或者不想继续深入）时返回空序列。
+先序遍历中，get_children 是在调用者处理完这个节点、要取下一个节点时才调用的，
+所以调用者可以根据处理这个节点时的结果，让 get_children 返回空序列来剪掉整棵子树。
+"""
+
+from typing import Callable, Iterable, Iterator, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def iter_preorder(root: T, get_children: Callable[[T], Sequence[T]]) -> Iterator[T]:
+    """
+    先序遍历，顺序和递归写法完全一致：先节点本身，再按顺序依次遍历每个子节点的子树
+    :param root:
+    :param get_children:
+    :return:
+    """
+    for node, _ in iter_preorder_with_depth(root, get_children):
+        yield node
+
+
+def iter_preorder_with_depth(
+    root: T, get_children: Callable[[T], Sequence[T]]
+) -> Iterator[tuple[T, int]]:
+    """
+    先序遍历，同时给出相对于 root 的深度，root 的深度为0
+    :param root:
+    :param get_children:
+    :return:
+    """
+    stack: list[tuple[T, int]] = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield node, depth
+        children = get_children(node)
+        if children:
+            child_depth = depth + 1
+            # 倒序压栈，这样先弹出的是第一个子节点
+            stack.extend((child, child_depth) for child in reversed(children))
+
+
+def iter_postorder(root: T, get_children: Callable[[T], Iterable[T]]) -> Iterator[T]:
+    """
+    后序遍历，顺序和递归写法完全一致：先按顺序依次遍历每个子节点的子树，最后是节点本身
+    :param root:
+    :param get_children:
+    :return:
+    """
+    # 每一项是 (节点, 还没遍历的子节点迭代器)
+    stack: list[tuple[T, Iterator[T]]] = [(root, iter(get_children(root)))]
+    while stack:
+        node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield node
+        else:
+            stack.append((child, iter(get_children(child))))
+
+
+def max_depth(root: T, get_children: Callable[[T], Sequence[T]]) -> int:
+    """
+    树的最大深度，只有 root 一个节点时为1
+    :param root:
+    :param get_children:
+    :return:
+    """
+    result = 0
+    for _, depth in iter_preorder_with_depth(root, get_children):
+        if depth + 1 > result:
+            result = depth + 1
+    return result
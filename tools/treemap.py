@@ -0,0 +1,96 @@
+"""
+矩形树图（treemap）的划分
+把一个矩形按权重切分成若干小矩形，每个小矩形的面积和权重成正比。
+使用 squarified 算法（Bruls, Huizing, van Wijk）：权重从大到小，沿着剩余区域的短边一行一行地摆，
+当前行再加一个就会让行里最细长的矩形变得更细长时，这一行就结束，剩余区域缩小后继续。
+这样得到的小矩形尽量接近正方形，容易看清也容易点中。
+"""
+
+from typing import Sequence
+
+from tools.spatial_index import Box
+
+
+def squarify(
+    weights: Sequence[float], left: float, top: float, width: float, height: float
+) -> list[Box]:
+    """
+    :param weights: 每一项的权重，不能为负
+    :param left: 要切分的矩形
+    :param top:
+    :param width:
+    :param height:
+    :return: 每一项分到的矩形 (left, top, right, bottom)，和 weights 一一对应。
+    权重为0的项，或者要切分的矩形没有面积时，分到的是一个没有面积的矩形
+    """
+    count = len(weights)
+    total_weight = sum(weights)
+    if count == 0:
+        return []
+    if total_weight <= 0 or width <= 0 or height <= 0:
+        return [(left, top, left, top)] * count
+
+    area_per_weight = width * height / total_weight
+    order = sorted(range(count), key=lambda i: weights[i], reverse=True)
+    areas = [weights[i] * area_per_weight for i in order]
+    result: list[Box] = [(left, top, left, top)] * count
+
+    x, y, w, h = left, top, width, height
+    start = 0
+    while start < count:
+        side = min(w, h)
+        # 当前行：[start, end)，以及行面积之和、行里最大最小的面积
+        end = start + 1
+        row_area = areas[start]
+        worst = _worst_ratio(row_area, areas[start], areas[start], side)
+        while end < count:
+            new_row_area = row_area + areas[end]
+            # 面积从大到小排列，新加的一定是最小的
+            new_worst = _worst_ratio(new_row_area, areas[start], areas[end], side)
+            if new_worst > worst:
+                break
+            row_area = new_row_area
+            worst = new_worst
+            end += 1
+
+        is_last_row = end == count
+        if w >= h:
+            # 短边是高，这一行是最左边的一列
+            thickness = w if is_last_row else (row_area / h if h > 0 else 0.0)
+            cursor = y
+            for k in range(start, end):
+                length = areas[k] / thickness if thickness > 0 else 0.0
+                bottom = y + h if k == end - 1 else cursor + length
+                result[order[k]] = (x, cursor, x + thickness, bottom)
+                cursor = bottom
+            x += thickness
+            w = max(0.0, w - thickness)
+        else:
+            # 短边是宽，这一行是最上面的一行
+            thickness = h if is_last_row else (row_area / w if w > 0 else 0.0)
+            cursor = x
+            for k in range(start, end):
+                length = areas[k] / thickness if thickness > 0 else 0.0
+                right = x + w if k == end - 1 else cursor + length
+                result[order[k]] = (cursor, y, right, y + thickness)
+                cursor = right
+            y += thickness
+            h = max(0.0, h - thickness)
+        start = end
+    return result
+
+
+def _worst_ratio(
+    row_area: float, max_area: float, min_area: float, side: float
+) -> float:
+    """
+    一行矩形沿着长度为 side 的边摆放时，其中最细长的那个的长宽比（>=1）
+    """
+    if min_area <= 0 or row_area <= 0 or side <= 0:
+        return float("inf")
+    side_squared = side * side
+    row_area_squared = row_area * row_area
+    return max(
+        side_squared * max_area / row_area_squared,
+        row_area_squared / (side_squared * min_area),
+    )
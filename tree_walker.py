@@ -0,0 +1,200 @@
+"""
+文件夹树的遍历扫描器
+列目录主要是在等待磁盘/网络的IO，兄弟文件夹之间互不依赖，
+所以可以放在线程池里同时列出，树结构的修改只在调用 walk 的线程里进行。
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from entity.entity_file import EntityFile
+from entity.entity_folder import EntityFolder
+from tools.cancel_token import CancelToken, OperationCancelled, raise_if_cancelled
+from tools.dir_scanner import DirListing
+from tools.open_progress import OpenProgress
+from tools.scan_cache import ScanCache
+
+# 和 ThreadPoolExecutor 的默认值保持一致，IO密集型任务线程数可以比核心数多
+DEFAULT_SCAN_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# 等待工作线程时最多等多久就检查一次取消，单个目录列得很慢（比如网络盘）时也能及时取消
+_CANCEL_CHECK_INTERVAL = 0.05
+
+
+class TreeWalker:
+    """
+    扫描文件夹树结构，workers <= 1 时就是普通的串行递归扫描
+    无论串行还是并行，得到的树结构（包括子节点顺序）是完全一样的
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_SCAN_WORKERS,
+        scan_cache: Optional[ScanCache] = None,
+        cancel_token: Optional[CancelToken] = None,
+        progress: Optional[OpenProgress] = None,
+        max_depth: Optional[int] = None,
+        is_size_needed: bool = False,
+    ):
+        self.workers = max(1, workers)
+        # 扫描缓存，没有变化的目录直接用缓存中的结果
+        self.scan_cache = scan_cache
+        # 每列完一个目录检查一次，被取消时 walk 抛出 OperationCancelled
+        self.cancel_token = cancel_token
+        # 扫描进度，每列完一个目录累加一次
+        self.progress = progress
+        # 按需扫描的深度，相对于 walk 的根文件夹（根文件夹的子项深度为1），
+        # 处在这个深度的文件夹不再列出内容，只标记为 is_lazy_pending，None表示不限制
+        self.max_depth = None if max_depth is None else max(1, max_depth)
+        # 是否在列目录的同时获取每个文件的大小（按大小排列时需要）
+        self.is_size_needed = is_size_needed
+        self._root_deep_level = 0
+
+    def walk(
+        self,
+        root_folder: EntityFolder,
+        on_subtree_done: Optional[Callable[[EntityFolder | EntityFile], None]] = None,
+    ):
+        """
+        扫描并更新 root_folder 下的整个树结构，不更新显示位置大小
+        :param root_folder:
+        :param on_subtree_done: root_folder 的某个直接子项（连同它内部的所有内容）扫描完毕时回调，
+        扫描完毕之后这个子树不会再被修改。回调通常要排列整个子树，开销很大，
+        所以扫描完的子树先排进队列，由另一个线程按扫描完的顺序逐个回调，扫描同时继续进行，
+        walk 等所有回调都执行完才返回，回调抛出的异常由 walk 抛出
+        :return:
+        :raises OperationCancelled: 被取消时，此时树结构只扫描了一部分
+        """
+        self._root_deep_level = root_folder.deep_level
+        if on_subtree_done is None:
+            self._walk(root_folder, None)
+            return
+        with ThreadPoolExecutor(max_workers=1) as callback_pool:
+            futures: list[Future[None]] = []
+
+            def enqueue(entity: EntityFolder | EntityFile):
+                futures.append(callback_pool.submit(on_subtree_done, entity))
+
+            try:
+                self._walk(root_folder, enqueue)
+            except BaseException:
+                # 还没轮到的子树不再回调，正在回调的等它结束
+                callback_pool.shutdown(wait=True, cancel_futures=True)
+                raise
+            for future in futures:
+                future.result()
+
+    def _walk(
+        self,
+        root_folder: EntityFolder,
+        on_subtree_done: Optional[Callable[[EntityFolder | EntityFile], None]],
+    ):
+        if self.workers == 1:
+            self._walk_serial(root_folder, on_subtree_done)
+        else:
+            self._walk_parallel(root_folder, on_subtree_done)
+
+    def _walk_serial(
+        self,
+        root_folder: EntityFolder,
+        on_subtree_done: Optional[Callable[[EntityFolder | EntityFile], None]],
+    ):
+        if on_subtree_done is None:
+            self._walk_subtree_serial(root_folder)
+            return
+        raise_if_cancelled(self.cancel_token)
+        sub_folders = self._apply(root_folder, self._scan(root_folder))
+        for child in root_folder.children:
+            # 文件，以及按需扫描中先不深入的文件夹，本身就是完整的子树
+            if isinstance(child, EntityFile) or child.is_lazy_pending:
+                on_subtree_done(child)
+        for child_folder in sub_folders:
+            self._walk_subtree_serial(child_folder)
+            on_subtree_done(child_folder)
+
+    def _walk_subtree_serial(self, folder: EntityFolder):
+        stack = [folder]
+        while stack:
+            raise_if_cancelled(self.cancel_token)
+            current = stack.pop()
+            stack.extend(self._apply(current, self._scan(current)))
+
+    def _scan(self, folder: EntityFolder) -> DirListing:
+        return folder.scan_entries(
+            scan_cache=self.scan_cache, is_size_needed=self.is_size_needed
+        )
+
+    def _apply(self, folder: EntityFolder, listing: DirListing) -> list[EntityFolder]:
+        """
+        合并一个目录的扫描结果，并累加进度
+        :return: 还需要继续扫描的子文件夹
+        """
+        sub_folders = folder.apply_entries(listing)
+        if self.progress is not None and listing.entries is not None:
+            self.progress.add_scanned(
+                1, sum(1 for entry in listing.entries if not entry.is_dir)
+            )
+        if (
+            self.max_depth is not None
+            and folder.deep_level - self._root_deep_level + 1 >= self.max_depth
+        ):
+            # 子文件夹已经到了按需扫描的深度，先不深入
+            for child_folder in sub_folders:
+                child_folder.is_lazy_pending = True
+            return []
+        return sub_folders
+
+    def _walk_parallel(
+        self,
+        root_folder: EntityFolder,
+        on_subtree_done: Optional[Callable[[EntityFolder | EntityFile], None]],
+    ):
+        # 每个文件夹属于哪个顶层子文件夹，以及每个顶层子文件夹还有多少个目录没列完
+        top_folder_of: dict[EntityFolder, EntityFolder] = {}
+        remaining_count: dict[EntityFolder, int] = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+
+            def scan(folder: EntityFolder) -> Future[DirListing]:
+                return pool.submit(self._scan, folder)
+
+            pending: dict[Future[DirListing], EntityFolder] = {
+                scan(root_folder): root_folder
+            }
+
+            def check_cancelled():
+                if self.cancel_token is not None and self.cancel_token.is_cancelled:
+                    # 还没开始的直接丢掉，正在列的目录等它列完
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise OperationCancelled()
+
+            while pending:
+                check_cancelled()
+                done, _ = wait(
+                    pending, timeout=_CANCEL_CHECK_INTERVAL, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    check_cancelled()
+                    folder = pending.pop(future)
+                    # 合并结果只在当前线程里做，工作线程只负责列目录
+                    sub_folders = self._apply(folder, future.result())
+                    for child_folder in sub_folders:
+                        pending[scan(child_folder)] = child_folder
+
+                    if on_subtree_done is None:
+                        continue
+                    if folder is root_folder:
+                        for child in folder.children:
+                            if isinstance(child, EntityFile) or child.is_lazy_pending:
+                                on_subtree_done(child)
+                        for child_folder in sub_folders:
+                            top_folder_of[child_folder] = child_folder
+                            remaining_count[child_folder] = 1
+                        continue
+                    top_folder = top_folder_of.pop(folder)
+                    for child_folder in sub_folders:
+                        top_folder_of[child_folder] = top_folder
+                    remaining_count[top_folder] += len(sub_folders) - 1
+                    if remaining_count[top_folder] == 0:
+                        del remaining_count[top_folder]
+                        on_subtree_done(top_folder)